@@ -39,6 +39,13 @@ automata is simply a directed graph.
 
 """
 
+from array import array
+from itertools import chain, izip
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from inferdtd.Graph import Graph
 
 class EmptyNode(object):
@@ -53,20 +60,129 @@ class EmptyNode(object):
 StartNode = EmptyNode("StartNode")
 EndNode = EmptyNode("EndNode")
 
-def infer_automata(sequences):
+def infer_automata(sequences, symbols=None):
+    """
+    Returns the 2T-INF automata for the `sequences`.
+
+    If a `DOM.SymbolTable` is given as `symbols`, the sequences are taken
+    to be encoded by it (e.g. `array('i')` objects) and a fast path is
+    used: the edges are collected as pairs of integers, and the graph is
+    built at once with the names decoded from `symbols`. When NumPy is
+    available, the sequences are a list holding more than `BULK` symbols
+    and the alphabet is small enough (see `DENSE`), the edges are
+    extracted by `__infer_bulk__` instead.
+    """
+    if symbols is not None:
+        # Iterators are not turned into lists, since they may be read from
+        # disk (see `DOM.SampleStore.itersequences`)
+        if numpy is not None and (len(symbols) + 2) ** 2 <= DENSE and \
+           isinstance(sequences, (list, tuple)) and \
+           sum(len(x) for x in sequences) > BULK:
+            return __infer_bulk__(sequences, symbols)
+        return __infer_encoded__(sequences, symbols)
+
     __graph__ = Graph([StartNode, EndNode], [])
 
     for sequence in sequences:
-        last = StartNode
-        for item in sequence:
-            __graph__.addnode(item)
-            __graph__.createedge(last, item)
-            last = item
-
-        __graph__.createedge(last, EndNode)
+        extend_automata(__graph__, sequence)
 
     return __graph__
 
+# Integers standing for `StartNode` and `EndNode` in encoded sequences
+START, END = -1, -2
+
+# The number of symbols above which NumPy is used, if available: from
+# there on it is 1.4 to 3 times faster than `__infer_encoded__` (the
+# least with large alphabets and few samples)
+BULK = 10000
+
+# The largest number of possible edges (i.e. entries in the table built by
+# `__infer_bulk__`) for which NumPy is used
+DENSE = 1 << 22
+
+def __infer_encoded__(sequences, symbols):
+    '''The fast path of `infer_automata` for encoded sequences'''
+    seen = set()
+    edges = []
+    start, end = (START,), (END,)
+    for sequence in sequences:
+        for edge in izip(chain(start, sequence), chain(sequence, end)):
+            if edge not in seen:
+                seen.add(edge)
+                edges.append(edge)
+    return __build__(edges, symbols)
+
+def __infer_bulk__(sequences, symbols):
+    '''
+    The fast path of `infer_automata` for large samples, using NumPy.
+
+    All the sequences are laid out in a single buffer, each one between a
+    START and an END sentinel. Every pair of adjacent items is an edge,
+    except the (END, START) pairs between sequences; each edge is packed
+    into a single integer indexing a table of all the possible edges, where
+    the position at which each edge first appears is recorded. The edges
+    are then sorted by that position, so the graph is the same
+    `__infer_encoded__` builds.
+
+    The table has (len(symbols) + 2) ** 2 entries; for larger alphabets than
+    `DENSE` allows, sorting all the keys is slower than the pure Python
+    path, so `infer_automata` doesn't call this function.
+    '''
+    buffer = array('i')
+    for sequence in sequences:
+        buffer.append(START)
+        buffer.extend(sequence)
+        buffer.append(END)
+    if not buffer:
+        return __build__([], symbols)
+    items = numpy.frombuffer(buffer, dtype=numpy.intc).astype(numpy.int64)
+    source, target = items[:-1], items[1:]
+    inside = source != END
+    # Shifted by 2 so the sentinels are non-negative too
+    width = len(symbols) + 2
+    keys = (source[inside] + 2) * width + (target[inside] + 2)
+    # A table with the first position of every possible edge. Assigned
+    # backwards, so the first position of each edge is written last; but
+    # NumPy doesn't promise the order of the writes to repeated indices,
+    # so any edge found before the position kept gets the smallest one
+    # with `minimum.at` (exact, but unbuffered and much slower)
+    positions = numpy.arange(len(keys))
+    first = numpy.empty(width * width, dtype=numpy.int64)
+    first.fill(len(keys))
+    first[keys[::-1]] = positions[::-1]
+    earlier = positions < first[keys]
+    if earlier.any():
+        numpy.minimum.at(first, keys[earlier], positions[earlier])
+    keys = numpy.flatnonzero(first < len(keys))
+    keys = keys[numpy.argsort(first[keys])]
+    return __build__(zip((keys // width - 2).tolist(),
+                         (keys % width - 2).tolist()), symbols)
+
+def __build__(edges, symbols):
+    '''Returns the automata with the given `edges` (pairs of integers, in
+    the order they were found)'''
+    nodes = {START: StartNode, END: EndNode}
+    order = [StartNode, EndNode]
+    for source, target in edges:
+        if target not in nodes:
+            nodes[target] = symbols.name(target)
+            order.append(nodes[target])
+    return Graph.build(order, [(nodes[source], nodes[target])
+                               for source, target in edges])
+
+def extend_automata(graph, sequence):
+    '''Adds the nodes and edges needed to accept `sequence` to the
+    automata `graph`. Returns True if the graph was changed.'''
+    size = len(graph.nodes), len(graph.edges)
+    last = StartNode
+    for item in sequence:
+        graph.addnode(item)
+        graph.createedge(last, item)
+        last = item
+
+    graph.createedge(last, EndNode)
+    return size != (len(graph.nodes), len(graph.edges))
+
 
 if __name__=="__main__":
     # These are the strings in Figure 2 of [1]
@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+# -*- coding: utf-8 -*-
 
 #
 #    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
@@ -23,6 +24,20 @@
 This module implements the "abstract" CRX algorithm as described in
 [Bex2006]
 
+CRX infers a chain regular expression (CHARE): a sequence of factors, where
+every factor is a disjunction of symbols, optionally with a multiplicity:
+
+    f1 f2 ... fk        fi = (a1|...|an)  or  (a1|...|an)?, +, *
+
+The factors come from the strongly connected components of the 2T-INF
+graph: the components are peeled off in topological order, all the
+components that have no remaining predecessors making up the next factor.
+Symbols that occur together in a cycle end up in the same, repeated factor.
+
+Unlike iDTD (`InferDTD.infer_soa`) there are no repair rounds, so the time
+taken is roughly linear in the size of the graph; the expressions are less
+precise, though.
+
 [Bex2006]
     Geert Jan Bex, Frank Neven, Thomas Schwentick & Karl Tuyls.
     "Inference of concise dtds from xml data."
@@ -30,6 +45,135 @@ This module implements the "abstract" CRX algorithm as described in
     Volume 32. 2006.
 """
 
+from inferdtd.RE import Repeat
+from inferdtd.RE import Kleene
+from inferdtd.RE import Optional
+from inferdtd.RE import Conjunction
+from inferdtd.RE import Disjunction
+from inferdtd.AutomataInferrer import infer_automata
+from inferdtd.AutomataInferrer import EmptyNode
+from inferdtd.AutomataInferrer import StartNode
+from inferdtd.AutomataInferrer import EndNode
+
+
+def __factors__(GFA):
+    '''Returns the factors of the CHARE for the 2T-INF graph `GFA`, as a
+    list of lists of symbols, in order'''
+    symbols = [node for node in GFA.nodes if not isinstance(node, EmptyNode)]
+    components = GFA.components(symbols)
+    component = {}
+    for i, members in enumerate(components):
+        for node in members:
+            component[node] = i
+    # Edges between components, and how many of them go into each one
+    successors = [set() for members in components]
+    indegree = [0] * len(components)
+    for source, target in GFA.edges:
+        if source in component and target in component:
+            a, b = component[source], component[target]
+            if a != b and b not in successors[a]:
+                successors[a].add(b)
+                indegree[b] += 1
+    # `findcomponents` lists them in reverse topological order; peeling off
+    # in topological order the components with no predecessors left
+    ready = [i for i in reversed(xrange(len(components))) if not indegree[i]]
+    order = dict((node, i) for i, node in enumerate(symbols))
+    factors = []
+    while ready:
+        factors.append(sorted((node for i in ready for node in components[i]),
+                              key=order.get))
+        following = []
+        for i in ready:
+            for j in successors[i]:
+                indegree[j] -= 1
+                if not indegree[j]:
+                    following.append(j)
+        ready = sorted(following, reverse=True)
+    return factors
+
+
+def __expression__(factors, multiplicities):
+    '''Builds the regular expression for the given `factors` with the
+    given `multiplicities` ("", "?", "+" or "*")'''
+    wrappers = {"": lambda x: x, "?": Optional, "+": Repeat, "*": Kleene}
+    result = []
+    for factor, multiplicity in zip(factors, multiplicities):
+        if len(factor) == 1:
+            base = factor[0]
+        else:
+            base = Disjunction(factor)
+        result.append(wrappers[multiplicity](base))
+    if not result:
+        return None
+    elif len(result) == 1:
+        return result[0]
+    else:
+        return Conjunction(result)
+
+
+def __multiplicity__(optional, repeated):
+    return {(False, False): "", (True, False): "?",
+            (False, True): "+", (True, True): "*"}[optional, repeated]
+
+
+def infer_crx(GFA):
+    """
+    Infers a chain regular expression from the 2T-INF graph `GFA` (as
+    returned by `AutomataInferrer.infer_automata`). `GFA` is not modified.
+
+    Since there are no samples to count occurrences from, a factor is made
+    optional when some edge skips it, and repeated when there is an edge
+    between two of its symbols. Returns None if `GFA` has no symbols.
+    """
+    factors = __factors__(GFA)
+    position = {StartNode: -1, EndNode: len(factors)}
+    for i, factor in enumerate(factors):
+        for node in factor:
+            position[node] = i
+    optional = [False] * len(factors)
+    repeated = [False] * len(factors)
+    for source, target in GFA.edges:
+        a, b = position[source], position[target]
+        if a == b:
+            repeated[a] = True
+        for i in xrange(a + 1, b):
+            optional[i] = True
+    return __expression__(factors, [__multiplicity__(*x)
+                                    for x in zip(optional, repeated)])
+
+
+def CRX(samples, symbols=None):
+    """
+    Infers a chain regular expression from the `samples` (sequences of
+    symbols). Returns None if there are no symbols in the samples.
+
+    The multiplicity of each factor is taken from the samples: a factor is
+    optional if some sample has none of its symbols, and repeated if some
+    sample has more than one.
 
-def CRX(samples):
-    pass
+    If a `DOM.SymbolTable` is given as `symbols`, the samples are taken to
+    be encoded by it: the automaton is built on the integers (see
+    `AutomataInferrer.infer_automata`), and so are the occurrences counted;
+    only the expression has the names.
+    """
+    samples = list(samples)
+    factors = __factors__(infer_automata(samples, symbols))
+    position = {}
+    for i, factor in enumerate(factors):
+        for node in factor:
+            if symbols is not None:
+                node = symbols.intern(node)
+            position[node] = i
+    optional = [False] * len(factors)
+    repeated = [False] * len(factors)
+    for sample in samples:
+        counts = [0] * len(factors)
+        for symbol in sample:
+            counts[position[symbol]] += 1
+        for i, count in enumerate(counts):
+            if count == 0:
+                optional[i] = True
+            elif count > 1:
+                repeated[i] = True
+    return __expression__(factors, [__multiplicity__(*x)
+                                    for x in zip(optional, repeated)])
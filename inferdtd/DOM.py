@@ -42,10 +42,23 @@ inference as described in [Bex2006]_
           Data Bases Volume 32. 2006.
 """
 
+import os
+import sys
 import types
+import shutil
+import marshal
 import weakref
+import tempfile
+from array import array
+from itertools import chain, izip
+from collections import OrderedDict
 from xml.parsers import expat
 from copy import copy, deepcopy
+from hashlib import sha1
+
+from inferdtd.ExternalSort import write_run
+from inferdtd.ExternalSort import read_run
+from inferdtd.ExternalSort import merge_files
 
 
 class DOMElement(object):
@@ -71,18 +84,350 @@ class DOMElement(object):
     def __str__(self):
         return "<Children: \n\t%s\nAttributes:\n\t%s>\n" % ([x.name for x in self.children], self.attributes)
 
+class AttributeStats(object):
+    """
+    Attribute counters for a single element type.
+
+    Keeps how many times the element type occurred and how many of those
+    occurrences carried each attribute. An attribute is `#REQUIRED` iff
+    it was present in every occurrence; otherwise it's `#IMPLIED`.
+    """
+    def __init__(self):
+        self.occurrences = 0
+        self.attributes = {}
+
+    def update(self, attributes, count=1):
+        'Accounts for `count` occurrences carrying the `attributes` names'
+        self.occurrences += count
+        counters = self.attributes
+        for name in attributes:
+            counters[name] = counters.get(name, 0) + count
+
+    def merge(self, other):
+        'Adds the counters of `other` to this object'
+        self.occurrences += other.occurrences
+        counters = self.attributes
+        for name, count in other.attributes.iteritems():
+            counters[name] = counters.get(name, 0) + count
+
+    def isrequired(self, name):
+        'Tests whether the attribute `name` appeared in every occurrence'
+        return self.occurrences > 0 and \
+               self.attributes.get(name, 0) == self.occurrences
+
+    def __repr__(self):
+        return "<AttributeStats: %d occurrences, %s>" % (self.occurrences,
+                                                        self.attributes)
+
+class SymbolTable(object):
+    """
+    Interns element names as small integers.
+
+    The first name interned gets 0, the next one 1, and so on. Sequences of
+    names are encoded as `array('i')` buffers, which take 4 bytes per
+    symbol instead of a reference to a string object.
+    """
+    def __init__(self):
+        self.__ids__ = {}
+        self.__names__ = []
+
+    def __len__(self):
+        return len(self.__names__)
+
+    def __contains__(self, name):
+        return name in self.__ids__
+
+    def intern(self, name):
+        'Returns the integer for `name`, assigning a new one if needed'
+        result = self.__ids__.get(name)
+        if result is None:
+            result = self.__ids__[name] = len(self.__names__)
+            self.__names__.append(name)
+        return result
+
+    def name(self, symbol):
+        'Returns the name interned as the integer `symbol`'
+        return self.__names__[symbol]
+
+    def encode(self, names):
+        'Returns the `array(\'i\')` encoding the sequence of `names`'
+        return array('i', [self.intern(name) for name in names])
+
+    def decode(self, symbols):
+        'Returns the list of names encoded by the integers in `symbols`'
+        names = self.__names__
+        return [names[symbol] for symbol in symbols]
+
+
+# The bytes returned by `ExemplarIndex.excerpt` by default
+EXCERPT = 200
+
+# The bytes taken by a sequence in a `SampleStore` besides its key: its
+# count and its entry in the dict
+ENTRY = 64
+
+
+class SampleStore(object):
+    """
+    The child sequences of each element type, along with their counts.
+
+    This is a compact form of the samples: for each element type, only the
+    names of the children of each sample are kept, and equal sequences are
+    stored once with the number of samples they account for. Unlike
+    `DOMElement`s, a `SampleStore` can be pickled, so it's what parallel
+    workers hand back.
+
+    If a `SymbolTable` is given, the child sequences are interned: they're
+    kept as the packed bytes of their `array('i')` encoding, `add` also
+    takes sequences already encoded as `array('i')`, and `sequences`
+    returns `array('i')` objects (decode them with `symbols`).
+
+    If a memory `budget` (in bytes) is given, the size of the distinct
+    sequences kept is estimated as they're added. Once it goes over the
+    budget, the element types that got a new sequence least recently are
+    spilled: their sequences are written, sorted and with their counts, to
+    a new run file (see `ExternalSort`) in `directory` (a temporary one by
+    default), and dropped from memory until the store is at half its
+    budget. The attribute statistics are never spilled.
+
+    The sequences of a spilled element type are read back with
+    `itercounts`, which first merges its runs (and whatever is in memory)
+    into a single run of distinct sequences, and then reads it
+    sequentially: only one sequence is in memory at a time. `counts` and
+    `sequences` do the same, but return them all at once. The files are
+    removed by `close`.
+    """
+    def __init__(self, symbols=None, budget=None, directory=None):
+        self.symbols = symbols
+        self.budget = budget
+        self.directory = directory
+        self.size = 0
+        self.spills = 0
+        self.__samples__ = {}
+        self.__attributes__ = {}
+        # The estimated size, the run files and the last growth of each
+        # element type, when there's a budget
+        self.__sizes__ = {}
+        self.__runs__ = {}
+        self.__distinct__ = {}
+        self.__grown__ = {}
+        self.__clock__ = 0
+        self.__temporary__ = None
+
+    def __len__(self):
+        return len(self.__samples__)
+
+    def __contains__(self, name):
+        return name in self.__samples__
+
+    def __key__(self, children):
+        'Returns the key under which the sequence `children` is counted'
+        if self.symbols is None:
+            return tuple(children)
+        if not isinstance(children, array):
+            children = self.symbols.encode(children)
+        return children.tostring()
+
+    def add(self, name, children, attributes=(), count=1):
+        '''Adds `count` samples of the element type `name` with the
+        given `children` names and `attributes` names'''
+        samples = self.__samples__.get(name)
+        if samples is None:
+            samples = self.__samples__[name] = {}
+            self.__attributes__[name] = AttributeStats()
+        key = self.__key__(children)
+        found = samples.get(key)
+        if found is None:
+            samples[key] = count
+            if self.budget is not None:
+                self.__grow__(name, key)
+        else:
+            samples[key] = found + count
+        if attributes:
+            self.__attributes__[name].update(attributes, count)
+        else:
+            self.__attributes__[name].occurrences += count
+
+    def __grow__(self, name, key):
+        '''Accounts for the new sequence `key` of the element type `name`,
+        spilling element types if the store goes over its budget'''
+        size = sys.getsizeof(key) + ENTRY
+        self.__sizes__[name] = self.__sizes__.get(name, 0) + size
+        self.size += size
+        self.__clock__ += 1
+        self.__grown__[name] = self.__clock__
+        if self.size > self.budget:
+            self.__spill__()
+
+    def __spill__(self):
+        '''Spills the element types that grew least recently until the
+        store is at half its budget'''
+        self.spills += 1
+        for name in sorted(self.__sizes__, key=self.__grown__.get):
+            if self.size <= self.budget // 2:
+                break
+            if self.__samples__[name]:
+                self.__flush__(name)
+
+    def __runfile__(self):
+        '''Returns the path of a new, empty run file in `directory`, which
+        may be shared with other stores'''
+        if self.directory is None:
+            self.__temporary__ = tempfile.mkdtemp(prefix='inferdtd-')
+            self.directory = self.__temporary__
+        descriptor, run = tempfile.mkstemp(suffix='.run', dir=self.directory)
+        os.close(descriptor)
+        return run
+
+    def __flush__(self, name):
+        '''Moves the sequences of the element type `name` in memory to a
+        new run file'''
+        run = self.__runfile__()
+        records = write_run(run, sorted(self.__samples__[name].iteritems()))
+        runs = self.__runs__.setdefault(name, [])
+        runs.append(run)
+        if len(runs) == 1:
+            self.__distinct__[name] = records
+        else:
+            self.__distinct__.pop(name, None)
+        self.__samples__[name] = {}
+        self.size -= self.__sizes__.pop(name, 0)
+
+    def __compact__(self, name):
+        '''Merges all the sequences of the spilled element type `name` into
+        a single run of distinct sequences'''
+        if self.__samples__[name]:
+            self.__flush__(name)
+        runs = self.__runs__[name]
+        if len(runs) > 1 or name not in self.__distinct__:
+            run = self.__runfile__()
+            self.__distinct__[name] = merge_files(runs, run, remove=True)
+            self.__runs__[name] = [run]
+
+    def spilled(self):
+        'Returns the element types with sequences spilled to disk'
+        return self.__runs__.keys()
+
+    def close(self):
+        '''Removes the run files, and the sequences spilled in them. A
+        temporary directory made for them is removed too'''
+        for runs in self.__runs__.itervalues():
+            for run in runs:
+                if os.path.exists(run):
+                    os.remove(run)
+        self.__runs__ = {}
+        self.__distinct__ = {}
+        if self.__temporary__ is not None:
+            shutil.rmtree(self.__temporary__, True)
+            self.directory = self.__temporary__ = None
+
+    def __getstate__(self):
+        # The runs are local to this process: the pickle takes all the
+        # sequences
+        state = self.__dict__.copy()
+        state['__samples__'] = dict((name, self.counts(name))
+                                    for name in self.__samples__)
+        state['__runs__'] = {}
+        state['__distinct__'] = {}
+        state['__temporary__'] = None
+        return state
+
+    def update(self, elements):
+        '''Adds the samples in `elements`, the dict of `DOMElement`s
+        returned by `XmlParser.parse`'''
+        for name, samples in elements.iteritems():
+            for sample in samples:
+                self.add(name, [child.name for child in sample.children],
+                         sample.attributes)
+
+    def merge(self, other):
+        '''Adds the samples of `other` to this store. The sequences are
+        re-encoded if the stores don't share their `SymbolTable`'''
+        for name in other.__samples__:
+            if name not in self.__samples__:
+                self.__samples__[name] = {}
+                self.__attributes__[name] = AttributeStats()
+            mine = self.__samples__[name]
+            for key, count in other.itercounts(name):
+                if other.symbols is not self.symbols:
+                    key = self.__key__(other.__decodekey__(key))
+                found = mine.get(key)
+                if found is None:
+                    mine[key] = count
+                    if self.budget is not None:
+                        self.__grow__(name, key)
+                        # The element type may have been spilled
+                        mine = self.__samples__[name]
+                else:
+                    mine[key] = found + count
+            self.__attributes__[name].merge(other.__attributes__[name])
+
+    def __decodekey__(self, key):
+        'Returns the names of the children in the sequence counted as `key`'
+        if self.symbols is None:
+            return key
+        return self.symbols.decode(array('i', key))
+
+    def names(self):
+        'Returns the element types in the store'
+        return self.__samples__.keys()
+
+    def sequences(self, name):
+        '''Returns the distinct child sequences of the element type `name`;
+        as tuples of names, or as `array(\'i\')` if the store is interned'''
+        return list(self.itersequences(name))
+
+    def itersequences(self, name):
+        '''Yields the distinct child sequences of the element type `name`,
+        as `sequences` returns them; reading them from disk if spilled'''
+        if self.symbols is None:
+            return (key for key, count in self.itercounts(name))
+        return (array('i', key) for key, count in self.itercounts(name))
+
+    def counts(self, name):
+        '''Returns a dict mapping each child sequence of `name` to its
+        count. If the store is interned, the keys are the packed bytes of
+        the sequences. For element types spilled to disk, the dict is a
+        new one, read from their run'''
+        if name not in self.__runs__:
+            return self.__samples__[name]
+        return dict(self.itercounts(name))
+
+    def itercounts(self, name):
+        '''Yields each distinct child sequence of `name` (as a key of
+        `counts`) along with its count. The sequences of spilled element
+        types are read sequentially from a single run, in order'''
+        if name not in self.__runs__:
+            return self.__samples__[name].iteritems()
+        self.__compact__(name)
+        return read_run(self.__runs__[name][0])
+
+    def distinct(self, name):
+        'Returns the number of distinct child sequences of `name`'
+        if name not in self.__runs__:
+            return len(self.__samples__[name])
+        self.__compact__(name)
+        return self.__distinct__[name]
+
+    def attributes(self, name):
+        'Returns the `AttributeStats` of the element type `name`'
+        return self.__attributes__[name]
+
 class Document(object):
     """ The Document object representing a whole XML document"""
     # The root element name (ns, localname)
     __root__ = ""
     # The elements represented by `DOMElement`s
     __elements__ = {}
+    # The `AttributeStats` for each element type
+    __attributes__ = {}
 
     def __init__(self, data = ""):
         assert type(data) in types.StringTypes
         if data != "":
             parser = XmlParser()
             self.__root__, self.__elements__ = parser.parse(data)
+            self.__attributes__ = parser.attributes
 
     def __str__(self):
         return "Root: %s\n%s" % (self.__root__, self.__elements__)
@@ -109,6 +454,12 @@ def mergedocs(document1, document2):
                 result.__elements__[elem].extend(document2.__elements__[elem])
             else:
                 result.__elements__[elem] = copy(document2.__elements__[elem])
+        result.__attributes__ = {}
+        for document in (document1, document2):
+            for elem, stats in document.__attributes__.iteritems():
+                if elem not in result.__attributes__:
+                    result.__attributes__[elem] = AttributeStats()
+                result.__attributes__[elem].merge(stats)
         return result
     else:
         raise UnmergeableDocuments, "Cannot merge documents with different roots"
@@ -157,10 +508,18 @@ class XmlParser(object):
     - The root element has only one sample
     - Leaves elements contains empty samples
     - Namespaces are considered
+
+    While parsing, an `AttributeStats` object is kept for each element
+    type (see the `attributes` property), so attribute declarations can be
+    inferred without walking the samples again.
     """
 
     def __init__(self):
+        self.__reset__()
+
+    def __reset__(self):
         self.__DOM__ = {}
+        self.__attributes__ = {}
         self.__parser__ = expat.ParserCreate(namespace_separator=" ")
         self.__parser__.StartElementHandler = self.start_handler
         self.__parser__.EndElementHandler = self.end_handler
@@ -170,21 +529,31 @@ class XmlParser(object):
     def parse(self, stream):
         'Parses a `stream` into a DOM'
         stream = stream.strip()
-        self.__DOM__ = {}
-        self.__parser__ = expat.ParserCreate(namespace_separator=" ")
-        self.__parser__.StartElementHandler = self.start_handler
-        self.__parser__.EndElementHandler = self.end_handler
-        self.__parent__ = None
-        self.__root__ = None
+        self.__reset__()
         self.__parser__.Parse(stream, 1)
         return (self.__root__, self.__DOM__)
 
+    def parsefile(self, file):
+        '''Parses the open `file` into a DOM. The file is read in chunks,
+        so the XML text is never held in memory as a whole'''
+        self.__reset__()
+        self.__parser__.ParseFile(file)
+        return (self.__root__, self.__DOM__)
+
+    @property
+    def attributes(self):
+        'The `AttributeStats` of each element type found by the last parse'
+        return self.__attributes__
+
     def start_handler(self, name, attrs):
         '''This is called every time an opening tag markup is found
         by the parser'''
         if not self.__DOM__.has_key(name):
             self.__DOM__[name] = []
-        elem = DOMElement(name, attributes=attrs, children=[])
+            self.__attributes__[name] = AttributeStats()
+        self.__attributes__[name].update(attrs)
+        # The values are not kept: `AttributeStats` has the counts
+        elem = DOMElement(name, attributes=list(attrs), children=[])
         self.__DOM__[name].append(elem)
         if self.__parent__ != None:
             self.__parent__.addchild(elem)
@@ -198,6 +567,553 @@ class XmlParser(object):
         if self.__parent__ != None:
             self.__parent__ = self.__parent__.parent
 
+class __Counted__(object):
+    'Counts the `bytes` read from a `file`'
+    def __init__(self, file):
+        self.file = file
+        self.bytes = 0
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.bytes += len(data)
+        return data
+
+
+class SampleCollector(object):
+    """
+    Streams the samples of XML documents to a `sink`.
+
+    Unlike `XmlParser` no DOM is built: every time an element is closed,
+    `sink.add(name, children, attributes)` is called with the element name,
+    the list of the names of its children and the names of its attributes;
+    nothing else is kept. A `SampleStore` is a sink, but any object with
+    such an `add` method will do.
+
+    If a `SymbolTable` is given as `symbols`, element names are interned as
+    they are found and the children are handed over as an `array(\'i\')`
+    (a `SampleStore` with the same table takes them as they are).
+
+    The root element type of the last document parsed is kept in `root`.
+
+    The parser is tuned for throughput: expat interns the element and
+    attribute names (in a dict kept across documents, so every name is
+    a single string object), attributes are reported as a flat list
+    instead of a dict, character data is never reported, and the open
+    elements are kept on a list of tuples instead of a tree.
+
+    If a `saturation` threshold is given, the collector keeps, for each
+    element type, the 2T-INF edges of its samples (along with the sets of
+    attribute names found) and the number of samples since the last one
+    that brought anything new. Once that number reaches the threshold the
+    element type is `saturated`: its samples are no longer handed to the
+    sink, and its children are not even recorded (they are counted in
+    `skipped`). The sink thus ends up with the same automata, but not with
+    the real counts of the samples. The saturation state is kept across
+    documents.
+
+    With `stop`, the parsing stops as soon as every element type closed so
+    far is saturated, and `stopped` is set. The elements still open (the
+    root, at least) are handed to the sink with the children found until
+    then.
+
+    If a `SkeletonSet` is given as `skeletons`, the `skeleton` of every
+    document is worked out as it is parsed, from the distinct subtrees (see
+    `subtrees`, which `skeletons` implies), and looked up there when the
+    root is closed: the samples of the documents with a skeleton already
+    in the set are dropped, and the documents just counted in
+    `duplicates`. The set may be shared by several collectors. The digest
+    of the last document is kept in `skeleton`.
+
+    With `subtrees`, equal subtrees of a document are only handed to the
+    sink once. Every element closed is identified by its name, the names
+    of its attributes and the identifiers of its children (a Merkle-like
+    hash, but with the dict of the identifiers of the document resolving
+    the collisions), and only the number of times each identifier is found
+    is kept; when the root is closed, `sink.add` is called once for each
+    distinct subtree with that number as the `count`. The sink gets the
+    same samples and counts, but a listing with thousands of equal records
+    costs a few dict lookups per element instead of a call to the sink.
+    The samples reach the sink (and the saturation state is updated) only
+    at the end of each document, so `stop` can't stop in the middle of
+    one.
+
+    A document can also be given chunk by chunk, as it arrives, with
+    `feed` and `close`.
+
+    If an `ExemplarIndex` is given as `exemplars`, the position (byte
+    offset and line) of the start tag of every sample is recorded there
+    for each edge of its sequence not found before. With `subtrees`, only
+    the first of the equal subtrees of a document is recorded.
+
+    The elements closed are counted in `elements`. If a `Metrics.Registry`
+    is given as `metrics`, the documents, bytes and elements read are
+    counted there as each document ends (the documents with a known
+    skeleton too).
+    """
+
+    def __init__(self, sink, symbols=None, saturation=None, stop=False,
+                 skeletons=None, subtrees=False, exemplars=None,
+                 metrics=None):
+        self.sink = sink
+        self.symbols = symbols
+        self.root = None
+        self.saturation = saturation
+        self.stop = stop
+        self.stopped = False
+        self.skipped = 0
+        self.saturated = set()
+        self.skeletons = skeletons
+        self.duplicates = 0
+        self.subtrees = subtrees
+        self.exemplars = exemplars
+        self.elements = 0
+        self.metrics = metrics
+        if metrics is not None:
+            self.__documents__ = metrics.counter('idtd_documents_total',
+                                                 "Documents read")
+            self.__bytes__ = metrics.counter('idtd_bytes_total',
+                                             "Bytes of the documents read")
+            self.__elements__ = metrics.counter('idtd_elements_total',
+                                                "Elements read")
+        # The elements already counted in the metrics, and the bytes fed
+        # of the current document
+        self.__counted__ = 0
+        self.__fed__ = 0
+        # The edges of each element type, and the samples since a new one
+        self.__edges__ = {}
+        self.__since__ = {}
+        self.__names__ = {}
+        self.__feeding__ = False
+        self.__reset__()
+
+    def __reset__(self):
+        self.__parser__ = expat.ParserCreate(namespace_separator=" ",
+                                             intern=self.__names__)
+        self.__parser__.ordered_attributes = True
+        if self.subtrees or self.skeletons is not None:
+            self.__parser__.StartElementHandler = self.start_subtree_handler
+            self.__parser__.EndElementHandler = self.end_subtree_handler
+        else:
+            self.__parser__.StartElementHandler = self.start_handler
+            self.__parser__.EndElementHandler = self.end_handler
+        self.__stack__ = []
+        self.skeleton = None
+        # The distinct subtrees of the document, by identifier, and the
+        # times each one was found
+        self.__ids__ = {}
+        self.__nodes__ = []
+        self.__counts__ = []
+        # The positions of the open elements (and the first one of each
+        # distinct subtree), for the exemplars; and the bytes and lines
+        # stripped from the start of the document
+        self.__positions__ = []
+        self.__where__ = []
+        self.__offset__ = (0, 0)
+
+    def __position__(self):
+        'Returns the byte offset and line of the current event'
+        parser = self.__parser__
+        offset, lines = self.__offset__
+        return (parser.CurrentByteIndex + offset,
+                parser.CurrentLineNumber + lines)
+
+    def parse(self, data):
+        'Parses the document in the string `data`'
+        self.__reset__()
+        stripped = data.strip()
+        if stripped and self.exemplars is not None:
+            offset = data.index(stripped[0])
+            self.__offset__ = (offset, data.count("\n", 0, offset))
+        try:
+            self.__parser__.Parse(stripped, 1)
+        except Saturated:
+            self.__flush__()
+        if self.metrics is not None:
+            self.__count__(len(data))
+
+    def parsefile(self, file):
+        'Parses the document in the open `file`, reading it in chunks'
+        self.__reset__()
+        if self.metrics is not None:
+            file = __Counted__(file)
+        try:
+            self.__parser__.ParseFile(file)
+        except Saturated:
+            self.__flush__()
+        if self.metrics is not None:
+            self.__count__(file.bytes)
+
+    def feed(self, data):
+        '''Parses the next chunk `data` of a document; the first chunk
+        starts a new one. Chunks are ignored once the collector is
+        `stopped`'''
+        if self.stopped:
+            return
+        if not self.__feeding__:
+            self.__reset__()
+            self.__feeding__ = True
+            self.__fed__ = 0
+        self.__fed__ += len(data)
+        try:
+            self.__parser__.Parse(data, 0)
+        except Saturated:
+            self.__flush__()
+        except:
+            self.__feeding__ = False
+            raise
+
+    def close(self):
+        '''Ends the document given to `feed`. Raises `expat.ExpatError`
+        if it was not complete'''
+        if not self.__feeding__:
+            return
+        self.__feeding__ = False
+        if not self.stopped:
+            try:
+                self.__parser__.Parse('', 1)
+            except Saturated:
+                self.__flush__()
+        if self.metrics is not None:
+            self.__count__(self.__fed__)
+
+    def __count__(self, size):
+        '''Counts a document of `size` bytes, and the elements closed since
+        the last one, in the `metrics`'''
+        self.__documents__.inc()
+        self.__bytes__.inc(size)
+        self.__elements__.inc(self.elements - self.__counted__)
+        self.__counted__ = self.elements
+
+    def __flush__(self):
+        '''Hands the elements still open to the sink, once the parsing is
+        stopped'''
+        self.stopped = True
+        while self.__stack__:
+            name, children, attributes = self.__stack__.pop()
+            if children is not None:
+                self.sink.add(name, children, attributes)
+
+    def start_handler(self, name, attrs):
+        '''This is called every time an opening tag markup is found
+        by the parser. `attrs` is the list of attribute names and values'''
+        stack, symbols = self.__stack__, self.symbols
+        if stack:
+            children = stack[-1][1]
+            if children is None:
+                pass
+            elif symbols is None:
+                children.append(name)
+            else:
+                children.append(symbols.intern(name))
+        else:
+            self.root = name
+        if name in self.saturated:
+            stack.append((name, None, None))
+        elif symbols is None:
+            stack.append((name, [], attrs[::2]))
+        else:
+            stack.append((name, array('i'), attrs[::2]))
+        if self.exemplars is not None:
+            self.__positions__.append(self.__position__())
+
+    def end_handler(self, name):
+        '''This is called every time a closing tag markup is found
+        by the parser'''
+        name, children, attributes = self.__stack__.pop()
+        self.elements += 1
+        if self.exemplars is not None:
+            position = self.__positions__.pop()
+            if children is not None:
+                self.exemplars.record(name, children, position)
+        if children is None:
+            self.skipped += 1
+            return
+        self.sink.add(name, children, attributes)
+        if self.saturation is not None:
+            self.__track__(name, children, attributes)
+
+    def start_subtree_handler(self, name, attrs):
+        '''Like `start_handler`, when equal subtrees are shared: the
+        children are recorded when they are closed'''
+        stack = self.__stack__
+        if not stack:
+            self.root = name
+        if name in self.saturated:
+            stack.append((name, None, None))
+        else:
+            stack.append((name, [], tuple(attrs[::2])))
+        if self.exemplars is not None:
+            self.__positions__.append(self.__position__())
+
+    def end_subtree_handler(self, name):
+        '''Like `end_handler`, when equal subtrees are shared: the element
+        is just counted under the identifier of its subtree'''
+        stack = self.__stack__
+        name, children, attributes = stack.pop()
+        if children is None:
+            self.skipped += 1
+            key = (name, None, None)
+        else:
+            key = (name, attributes, tuple(children))
+        if self.exemplars is not None:
+            position = self.__positions__.pop()
+        node = self.__ids__.get(key)
+        if node is None:
+            node = self.__ids__[key] = len(self.__nodes__)
+            self.__nodes__.append(key)
+            self.__counts__.append(1)
+            if self.exemplars is not None:
+                self.__where__.append(position)
+        else:
+            self.__counts__[node] += 1
+        if stack:
+            children = stack[-1][1]
+            if children is not None:
+                children.append(node)
+        else:
+            self.__emit__()
+
+    def __emit__(self):
+        '''Hands the distinct subtrees of the document to the sink, each
+        one with the number of times it was found'''
+        nodes, counts, where = self.__nodes__, self.__counts__, self.__where__
+        self.__ids__, self.__nodes__, self.__counts__ = {}, [], []
+        self.__where__ = []
+        self.elements += sum(counts)
+        if self.skeletons is not None:
+            # The distinct subtrees, in the order they were first closed,
+            # are the same for every document with the same skeleton
+            self.skeleton = sha1(marshal.dumps(nodes, 0)).digest()
+            if self.skeletons.get(self.skeleton) is not None:
+                self.duplicates += 1
+                return
+            self.skeletons.add(self.skeleton, self.root)
+        add, symbols = self.sink.add, self.symbols
+        saturated = None
+        for node, ((name, attributes, children), count) in \
+                enumerate(izip(nodes, counts)):
+            if children is None:
+                continue
+            children = [nodes[child][0] for child in children]
+            if symbols is not None:
+                children = symbols.encode(children)
+            add(name, children, attributes, count)
+            if self.exemplars is not None:
+                self.exemplars.record(name, children, where[node])
+            if self.saturation is not None:
+                try:
+                    self.__track__(name, children, attributes)
+                except Saturated, saturated:
+                    pass
+        if saturated is not None:
+            raise saturated
+
+    def __track__(self, name, children, attributes):
+        '''Updates the saturation state of the element type `name` with a
+        sample'''
+        edges = self.__edges__.get(name)
+        if edges is None:
+            edges = self.__edges__[name] = set()
+            self.__since__[name] = 0
+        found = set(izip(chain((None,), children), chain(children, (None,))))
+        found.add(frozenset(attributes))
+        if found <= edges:
+            self.__since__[name] += 1
+            if self.__since__[name] >= self.saturation:
+                self.saturated.add(name)
+                if self.stop and len(self.saturated) == len(self.__edges__):
+                    raise Saturated(name)
+        else:
+            edges |= found
+            self.__since__[name] = 0
+
+
+def skeleton(data):
+    """
+    Returns a digest (SHA-1) of the skeleton of the XML document in `data`:
+    the sequence of its start and end tags, with the element names and the
+    attribute names, as expat reports them to a `SampleCollector`.
+    Documents with the same skeleton yield the same samples, so only those
+    of one of them are needed. It's the digest a `SampleCollector` with
+    `skeletons` works out for each document it parses.
+
+    The names are resolved to their namespaces, so equal prefixes bound to
+    different namespaces yield different skeletons, and the entities and
+    default attributes of an internal DTD subset are taken into account.
+    Returns None if the document is not well formed.
+    """
+    collector = SampleCollector(SampleStore(), skeletons=SkeletonSet(1))
+    try:
+        collector.parse(data)
+    except expat.ExpatError:
+        return None
+    return collector.skeleton
+
+
+class SkeletonSet(object):
+    """
+    A bounded set of document skeletons (see `skeleton`), each with the
+    root element type of its documents.
+
+    It holds at most `size` skeletons; when full, the one seen least
+    recently is forgotten. `hits` counts the lookups that found their
+    skeleton.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.__seen__ = OrderedDict()
+
+    def __len__(self):
+        return len(self.__seen__)
+
+    def __contains__(self, skeleton):
+        return skeleton in self.__seen__
+
+    def get(self, skeleton):
+        '''Returns the root element type of the documents with the given
+        `skeleton`, or None if it's not in the set'''
+        root = self.__seen__.pop(skeleton, None)
+        if root is not None:
+            # Put back at the end, as the most recently seen
+            self.__seen__[skeleton] = root
+            self.hits += 1
+        return root
+
+    def add(self, skeleton, root):
+        '''Adds `skeleton`, the skeleton of documents with the `root`
+        element type'''
+        if skeleton is None or root is None:
+            return
+        self.__seen__[skeleton] = root
+        if len(self.__seen__) > self.size:
+            self.__seen__.popitem(last=False)
+
+
+class ExemplarIndex(object):
+    """
+    Where each edge of the 2T-INF automaton of each element type was first
+    found.
+
+    The `SampleCollector`s given the index call `record` with each sample
+    and the position of its start tag, and only the edges not seen before
+    are kept, along with the file they came from (see `begin`) and that
+    position: the index grows with the automata, not with the corpus. An
+    edge is the pair of adjacent children `(prev, next)`, where None stands
+    for the start (as `prev`) and the end (as `next`) of the sequence.
+
+    If the collectors intern the names in a `SymbolTable`, it must be given
+    as `symbols`; `locate` and `excerpt` still take names.
+    """
+    def __init__(self, symbols=None):
+        self.symbols = symbols
+        self.files = []
+        self.current = None
+        self.__edges__ = {}
+
+    def __len__(self):
+        'Returns the number of edges recorded'
+        return sum(len(edges) for edges in self.__edges__.itervalues())
+
+    def begin(self, path):
+        '''Makes `path` the file of the samples recorded next. Returns its
+        identifier'''
+        self.current = len(self.files)
+        self.files.append(path)
+        return self.current
+
+    def record(self, name, children, position):
+        '''Records the edges of the sample of `name` with the given
+        `children` which are new, as found at `position`: a tuple with the
+        byte offset and the line of its start tag'''
+        edges = self.__edges__.get(name)
+        if edges is None:
+            edges = self.__edges__[name] = {}
+        for edge in izip(chain((None,), children), chain(children, (None,))):
+            if edge not in edges:
+                edges[edge] = (self.current,) + position
+
+    def __encode__(self, name):
+        'Returns the symbol under which the child `name` is recorded'
+        if name is None or self.symbols is None:
+            return name
+        return self.symbols.intern(name)
+
+    def __decode__(self, symbol):
+        'Returns the name of a child recorded as `symbol`'
+        if symbol is None or self.symbols is None:
+            return symbol
+        return self.symbols.name(symbol)
+
+    def locate(self, name, prev, next):
+        '''Returns `(path, offset, line)`, the first place where `next`
+        was found after `prev` among the children of `name`, or None if it
+        never was'''
+        found = self.__edges__.get(name, {}).get((self.__encode__(prev),
+                                                  self.__encode__(next)))
+        if found is None:
+            return None
+        fileid, offset, line = found
+        return self.files[fileid], offset, line
+
+    def excerpt(self, name, prev, next, size=EXCERPT):
+        '''Returns the first `size` bytes of the sample of `name` where
+        the edge `(prev, next)` was first found, read from its file; or
+        None if the edge was never found, or found in the standard input
+        ("-"), which can't be read again'''
+        found = self.locate(name, prev, next)
+        if found is None or found[0] == '-':
+            return None
+        path, offset, line = found
+        file = open(path, 'rb')
+        try:
+            file.seek(offset)
+            return file.read(size)
+        finally:
+            file.close()
+
+    def edges(self):
+        '''Yields `(name, prev, next, path, offset, line)` for every edge
+        recorded'''
+        for name, edges in self.__edges__.iteritems():
+            for (prev, next), (fileid, offset, line) in edges.iteritems():
+                yield (name, self.__decode__(prev), self.__decode__(next),
+                       self.files[fileid], offset, line)
+
+    def merge(self, other):
+        '''Adds the edges of `other` not recorded here; those recorded in
+        both keep the position recorded here'''
+        fileids = {}
+        for name, prev, next, path, offset, line in other.edges():
+            edges = self.__edges__.setdefault(name, {})
+            edge = (self.__encode__(prev), self.__encode__(next))
+            if edge not in edges:
+                if path not in fileids:
+                    fileids[path] = len(self.files)
+                    self.files.append(path)
+                edges[edge] = (fileids[path], offset, line)
+
+    def dump(self, file):
+        '''Writes the edges to `file`, a line each with the tab separated
+        element name, previous and next children ("" for the start or the
+        end), path, offset and line. The names are encoded in UTF-8, and
+        the paths are written as they are (encoded in the file system
+        encoding, if given as unicode)'''
+        encoding = sys.getfilesystemencoding() or 'utf-8'
+        for record in sorted(self.edges()):
+            name, prev, next, path, offset, line = record
+            if isinstance(path, unicode):
+                path = path.encode(encoding)
+            names = u"%s\t%s\t%s" % (name, prev or u"", next or u"")
+            file.write("%s\t%s\t%d\t%d\n" % (names.encode('utf-8'), path,
+                                              offset, line))
+
+
+class Saturated(Exception):
+    '''Exception raised by the handlers of `SampleCollector` to stop the
+    parsing once every element type is saturated'''
+    pass
+
 
 if __name__ == "__main__":
     d1 = Document("""
@@ -26,15 +26,296 @@ This module is a high-level front-end for the iDTD algorithm.
 It provides objects that take XML samples and infer the DTD
 """
 
+from inferdtd.RE import Operator
+from inferdtd.RE import Repeat
+from inferdtd.RE import Kleene
+from inferdtd.RE import Optional
+from inferdtd.RE import Conjunction
+from inferdtd.RE import Disjunction
+from inferdtd.AutomataInferrer import infer_automata
+from inferdtd.AutomataInferrer import extend_automata
+from inferdtd.AutomataInferrer import EmptyNode
+from inferdtd.AutomataInferrer import StartNode
+from inferdtd.AutomataInferrer import EndNode
+from inferdtd.Graph import Graph
+from inferdtd.InferDTD import infer_soa
+from inferdtd.CRX import CRX
+from inferdtd.CRX import infer_crx
+from inferdtd.Matcher import Matcher
+from inferdtd.DOM import SampleStore
+from inferdtd.DOM import AttributeStats
 
-import types
-from Rewrite import rewrite
-from AutomataInferrer import infer_automata
-from InferDTD import infer_soa
-from threading import RLock
-from DOM import Document, mergedocs
-
-def inter_dtd(samples):
-    for sample in samples:
-        pass
-    pass
+
+def localname(name):
+    '''Returns the local part of an element or attribute `name` as
+    reported by the parser, i.e. strips the namespace URI'''
+    return name.split(" ")[-1]
+
+
+def extract_re(GFA):
+    'Returns the regular expression labelling the only node of a final `GFA`'
+    nodes = [node for node in GFA.nodes if not isinstance(node, EmptyNode)]
+    assert len(nodes) == 1
+    return nodes[0]
+
+
+# The inference engines `infer_contentmodel` can use
+ENGINES = ('soa', 'crx')
+
+
+def infer_contentmodel(sequences, stats=None, engine='soa', symbols=None):
+    """
+    Infers the content model of an element type from the child `sequences`
+    of its samples.
+
+    Returns the regular expression for the content model, or None if all
+    the samples are empty.
+
+    The `engine` is either "soa" (iDTD, see `InferDTD.infer_soa`) or "crx"
+    (see `CRX.CRX`). CRX takes roughly linear time, so it's a predictable
+    choice for huge or noisy element types, but yields less precise
+    expressions. When iDTD cannot find a SORE, the content model falls
+    back to `(a|b|...)*` over the children found.
+
+    If a `DOM.SymbolTable` is given as `symbols`, the `sequences` are taken
+    to be encoded by it (see `AutomataInferrer.infer_automata`).
+
+    If a `Profile.RuleStats` object is given as `stats`, the time spent
+    building the automaton is recorded as the "automaton" phase, along with
+    everything `infer_soa` records; CRX is recorded as the "crx" phase.
+    """
+    assert engine in ENGINES
+    if engine == 'crx':
+        if stats is None:
+            return CRX(sequences, symbols)
+        return stats.timed('crx', CRX, sequences, symbols)
+    # The sequences are only iterated once, so they may be read from disk
+    if stats is None:
+        GFA = infer_automata(sequences, symbols)
+    else:
+        GFA = stats.timed('automaton', infer_automata, sequences, symbols)
+    alphabet = [node for node in GFA.nodes if not isinstance(node, EmptyNode)]
+    if not alphabet:
+        return None
+    if infer_soa(GFA, stats):
+        return extract_re(GFA)
+    return __fallback__(alphabet)
+
+
+def __fallback__(alphabet):
+    '''Returns the content model `(a|b|...)*` for the given `alphabet`'''
+    alphabet = sorted(alphabet)
+    if len(alphabet) == 1:
+        return Kleene(alphabet[0])
+    return Kleene(Disjunction(alphabet))
+
+
+def infer_graphmodel(GFA, stats=None, engine='soa'):
+    """
+    Infers a content model from the 2T-INF graph `GFA`, which is left
+    untouched. Works as `infer_contentmodel` does, but CRX has to take the
+    multiplicities from the graph (see `CRX.infer_crx`).
+    """
+    assert engine in ENGINES
+    alphabet = [node for node in GFA.nodes if not isinstance(node, EmptyNode)]
+    if not alphabet:
+        return None
+    if engine == 'crx':
+        if stats is None:
+            return infer_crx(GFA)
+        return stats.timed('crx', infer_crx, GFA)
+    GFA = GFA.copy()
+    if infer_soa(GFA, stats):
+        return extract_re(GFA)
+    return __fallback__(alphabet)
+
+
+def __particle__(expression, namer):
+    '''Renders `expression` as a DTD content particle'''
+    def suffixed(target, suffix):
+        particle = __particle__(target, namer)
+        if particle[-1] in "?*+":
+            particle = "(%s)" % particle
+        return particle + suffix
+
+    kind = type(expression)
+    if kind is Repeat:
+        return suffixed(expression.__target__, "+")
+    elif kind is Kleene:
+        return suffixed(expression.__target__, "*")
+    elif kind is Optional:
+        return suffixed(expression.__target__, "?")
+    elif kind is Conjunction:
+        return "(%s)" % ",".join(__particle__(x, namer)
+                                 for x in expression.__targets__)
+    elif kind is Disjunction:
+        return "(%s)" % "|".join(__particle__(x, namer)
+                                 for x in expression.__targets__)
+    else:
+        assert not isinstance(expression, Operator)
+        return namer(expression)
+
+
+def render_contentmodel(expression, namer=localname):
+    '''Renders the content model `expression` as it goes in an ELEMENT
+    declaration.
+
+    A None `expression` (no children at all) is rendered as `(#PCDATA)`
+    which accepts both empty and text content, since character data is not
+    recorded by the parser.'''
+    if expression is None:
+        return "(#PCDATA)"
+    particle = __particle__(expression, namer)
+    if not particle.startswith("("):
+        particle = "(%s)" % particle
+    return particle
+
+
+def render_dtd(root, store, models, namer=localname):
+    """
+    Renders the DTD for the element types in `store` (a `SampleStore`).
+
+    `models` maps each element type to its content model as returned by
+    `infer_contentmodel`. The `root` element type is declared first.
+    """
+    names = sorted(store.names(), key=lambda name: (name != root, namer(name)))
+    lines = []
+    for name in names:
+        lines.append("<!ELEMENT %s %s>" % (namer(name),
+                                           render_contentmodel(models[name],
+                                                               namer)))
+        stats = store.attributes(name)
+        if stats.attributes:
+            declarations = ["%s CDATA %s" % (namer(attribute),
+                                             stats.isrequired(attribute) and
+                                                "#REQUIRED" or "#IMPLIED")
+                            for attribute in sorted(stats.attributes)]
+            lines.append("<!ATTLIST %s %s>" % (namer(name),
+                                               " ".join(declarations)))
+    return "\n".join(lines) + "\n"
+
+
+def infer_dtd(documents, engines=None, default='soa'):
+    """
+    Infers the DTD for the given `documents` (`DOM.Document` objects).
+
+    The root element type is taken from the first document. `engines` may
+    map element types to the engine used to infer their content model
+    (see `infer_contentmodel`); the rest use the `default` engine.
+    """
+    engines = engines or {}
+    store = SampleStore()
+    root = None
+    for document in documents:
+        if root is None:
+            root = document.__root__
+        store.update(document.__elements__)
+    models = dict((name, infer_contentmodel(store.sequences(name),
+                                            engine=engines.get(name, default)))
+                  for name in store.names())
+    return render_dtd(root, store, models)
+
+
+class IncrementalInferrer(object):
+    """
+    Keeps the content models of a stream of samples up to date.
+
+    Samples are handed to `add` (so an `IncrementalInferrer` can be the
+    sink of a `DOM.SampleCollector`). Each one is first checked against a
+    `Matcher` for the current content model of its element type: samples
+    that already conform are only counted. The rest update the 2T-INF
+    graph of the element type, which is then marked as pending until
+    `reinfer` is called.
+
+    In steady state almost every sample conforms, so ingestion becomes a
+    validation pass and iDTD only runs for the element types that changed.
+
+    `engines` may map element types (with or without namespace) to the
+    engine used to infer their content models; the rest use `engine`.
+    `accepted` and `rejected` count the samples that did and did not
+    conform. It also has the `names` and `attributes` methods of a
+    `DOM.SampleStore`, so it can be handed to `render_dtd`.
+    """
+    def __init__(self, engine='soa', engines=None):
+        self.engine = engine
+        self.engines = engines or {}
+        self.pending = set()
+        self.accepted = 0
+        self.rejected = 0
+        self.__graphs__ = {}
+        self.__models__ = {}
+        self.__matchers__ = {}
+        self.__attributes__ = {}
+
+    def add(self, name, children, attributes=(), count=1):
+        '''Adds `count` samples of the element type `name`. Returns True if
+        they conform to the current content model of `name`'''
+        stats = self.__attributes__.get(name)
+        if stats is None:
+            stats = self.__attributes__[name] = AttributeStats()
+            self.__graphs__[name] = Graph([StartNode, EndNode], [])
+        stats.update(attributes, count)
+        matcher = self.__matchers__.get(name)
+        if matcher is not None and matcher.matches(children):
+            self.accepted += count
+            return True
+        self.rejected += count
+        if extend_automata(self.__graphs__[name], children):
+            self.pending.add(name)
+        return False
+
+    def reinfer(self, stats=None):
+        '''Infers again the content models of the pending element types,
+        taking each one out of `pending` once installed. Returns the names
+        of the element types re-inferred. The memory
+        used by each one is recorded if `stats` has a `MemoryStats`.'''
+        names = sorted(self.pending)
+        for name in names:
+            graph, engine = self.job(name)
+            if stats is not None and stats.memory is not None:
+                model = stats.memory.elementtype(name, infer_graphmodel,
+                                                 graph, stats, engine)
+            else:
+                model = infer_graphmodel(graph, stats, engine)
+            self.install(name, model)
+            self.pending.discard(name)
+        return names
+
+    def job(self, name):
+        '''Returns `(graph, engine)`: what `infer_graphmodel` needs to infer
+        the content model of the element type `name`, maybe in another
+        process (see `install`)'''
+        return self.__graphs__[name], self.engines.get(name,
+                                          self.engines.get(localname(name),
+                                                           self.engine))
+
+    def install(self, name, model):
+        '''Makes `model` the content model of the element type `name`. The
+        element type is not taken out of `pending`'''
+        self.__models__[name] = model
+        self.__matchers__[name] = Matcher(model)
+
+    def names(self):
+        'Returns the element types seen so far'
+        return self.__graphs__.keys()
+
+    def attributes(self, name):
+        'Returns the `AttributeStats` of the element type `name`'
+        return self.__attributes__[name]
+
+    def graph(self, name):
+        'Returns the 2T-INF graph of the element type `name`'
+        return self.__graphs__[name]
+
+    def model(self, name):
+        '''Returns the current content model of the element type `name`.
+        Pending element types are re-inferred first.'''
+        if self.pending:
+            self.reinfer()
+        return self.__models__[name]
+
+    def dtd(self, root):
+        'Renders the current DTD, with `root` as the root element type'
+        if self.pending:
+            self.reinfer()
+        return render_dtd(root, self, self.__models__)
@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+# $Id$
+
+"""
+A resident inference daemon, serving a Unix socket.
+
+Usage::
+
+    python -m inferdtd.Daemon [options] PATH
+
+The daemon keeps an `IncrementalInferrer` alive: the 2T-INF graphs and the
+content models of the element types stay in memory between requests, so
+each document sent only costs its parsing plus the inference of the
+element types whose samples didn't conform. With `--jobs N` that inference
+is handed to a pool of N worker processes, forked when the daemon starts,
+while the daemon goes on reading documents.
+
+Every connection carries a single request: a command line, maybe followed
+by data, and then the reply of the daemon until it closes the connection.
+The commands are:
+
+SUBMIT
+    The rest of the connection (until the client shuts down its side) is
+    a document, parsed as it arrives. The reply is "OK" or "ERROR" and the
+    reason the document was rejected.
+
+DTD
+    The reply is the DTD of the documents submitted, encoded in UTF-8.
+    Nothing is inferred to answer it: the DTD is just rendered, and only
+    if a document was submitted since it last was. While the workers are
+    busy with the content models of the last documents, the reply is the
+    DTD rendered before them.
+
+STATUS
+    The reply has a "name value" line for each of the counters of the
+    daemon.
+
+With `--metrics TARGET` the daemon also exports live metrics in the
+Prometheus text format, to a file or over HTTP (see `Metrics.exporter`):
+the documents, bytes and elements read, the element types pending
+inference, and the duration of each phase and `infer_soa` call.
+
+`request` is a client for these commands.
+"""
+
+import sys
+import socket
+import signal
+import asynchat
+from optparse import OptionParser
+from xml.parsers import expat
+
+from inferdtd.Feeder import FeedServer
+from inferdtd.Profile import RuleStats
+from inferdtd.Metrics import Registry
+from inferdtd.Metrics import INTERVAL
+from inferdtd.Metrics import exporter
+from inferdtd.DTDInferrer import ENGINES
+from inferdtd.DTDInferrer import infer_graphmodel
+from inferdtd.DTDInferrer import IncrementalInferrer
+
+
+def __infer__(job):
+    '''Infers a content model in a worker process. `job` is the tuple
+    `(name, graph, engine, metrics)`. Returns the name, the content model
+    and the `RuleStats` of the inference (with a `Metrics.Registry` of the
+    time taken if `metrics` is True)'''
+    name, graph, engine, metrics = job
+    stats = RuleStats(metrics=metrics and Registry() or None)
+    return name, infer_graphmodel(graph, stats, engine), stats
+
+
+class Session(asynchat.async_chat):
+    '''Serves a request sent through the socket `sock` to the `daemon`'''
+    def __init__(self, sock, daemon, map):
+        asynchat.async_chat.__init__(self, sock, map)
+        self.daemon = daemon
+        self.collector = None
+        self.finished = False
+        self.__command__ = []
+        self.set_terminator('\n')
+
+    def collect_incoming_data(self, data):
+        if self.collector is None:
+            self.__command__.append(data)
+        elif not self.finished:
+            try:
+                self.collector.feed(data)
+            except expat.ExpatError, error:
+                self.__reply__("ERROR %s\n" % error)
+                self.daemon.handle_document(self.collector, error)
+
+    def found_terminator(self):
+        command = "".join(self.__command__).strip().upper()
+        if command == 'SUBMIT':
+            self.collector = self.daemon.__collector__()
+            self.collector.feed('')
+            self.set_terminator(None)
+        elif command == 'DTD':
+            self.__reply__(self.daemon.dtd().encode('utf-8'))
+        elif command == 'STATUS':
+            self.__reply__("".join("%s %s\n" % item
+                                   for item in self.daemon.status()))
+        else:
+            self.__reply__("ERROR unknown command %r\n" % command)
+
+    def __reply__(self, data):
+        'Sends `data` and closes the connection once it is sent'
+        self.finished = True
+        self.push(data)
+        self.close_when_done()
+
+    def readable(self):
+        return not self.finished and asynchat.async_chat.readable(self)
+
+    def handle_close(self):
+        if self.finished:
+            self.close()
+        elif self.collector is None:
+            # Closed before the command was complete
+            self.finished = True
+            self.close()
+        else:
+            try:
+                self.collector.close()
+            except expat.ExpatError, error:
+                self.__reply__("ERROR %s\n" % error)
+                self.daemon.handle_document(self.collector, error)
+            else:
+                self.__reply__("OK\n")
+                self.daemon.handle_document(self.collector, None)
+
+
+class InferenceDaemon(FeedServer):
+    """
+    A `FeedServer` answering the requests described in the module, with
+    an `IncrementalInferrer` as its sink.
+
+    With `jobs` > 1 the content models are inferred by a pool of that many
+    worker processes: as each document ends, the pending element types
+    are sent to the pool (but those already being inferred, which wait for
+    their results). Otherwise they are inferred as each document ends.
+
+    `stats` is the `RuleStats` of all the inference done. If a
+    `Metrics.Registry` is given as `metrics`, the documents read, the
+    element types pending and the time taken are recorded there.
+    """
+    def __init__(self, address, jobs=1, engine='soa', engines=None,
+                 metrics=None):
+        self.pool = None
+        if jobs > 1:
+            from multiprocessing import Pool
+            # Forked before the socket is open, so workers don't hold it
+            self.pool = Pool(jobs)
+        FeedServer.__init__(self, IncrementalInferrer(engine, engines),
+                            address, subtrees=True, metrics=metrics)
+        self.stats = RuleStats(metrics=metrics)
+        self.queries = 0
+        self.__running__ = {}
+        self.__queued__ = set()
+        self.__dtd__ = ""
+        self.__changed__ = False
+        if metrics is not None:
+            metrics.gauge('idtd_pending_types',
+                          "Element types pending (re-)inference",
+                          function=self.pending)
+
+    def pending(self):
+        '''Returns the number of element types whose content models are
+        waiting to be inferred, or being inferred'''
+        return (len(self.sink.pending) + len(self.__queued__) +
+                len(self.__running__))
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            Session(pair[0], self, self.__map__)
+
+    def handle_document(self, collector, error):
+        FeedServer.handle_document(self, collector, error)
+        self.__changed__ = True
+        self.__dispatch__()
+
+    def __dispatch__(self):
+        '''Infers the content models of the pending element types, or sends
+        them to the pool'''
+        inferrer = self.sink
+        if not inferrer.pending and not self.__queued__:
+            return
+        if self.pool is None:
+            inferrer.reinfer(self.stats)
+            return
+        self.__queued__ |= inferrer.pending
+        inferrer.pending.clear()
+        for name in self.__queued__ - set(self.__running__):
+            self.__queued__.discard(name)
+            graph, engine = inferrer.job(name)
+            # The pool pickles the job later, on a thread of its own, while
+            # the sessions go on growing the graph: send a plain copy
+            job = (name, graph.copy(), engine,
+                   self.stats.metrics is not None)
+            self.__running__[name] = self.pool.apply_async(__infer__, (job,))
+
+    def __collect__(self):
+        '''Installs the content models the pool has finished, and sends the
+        element types waiting for them'''
+        for name, result in self.__running__.items():
+            if result.ready():
+                del self.__running__[name]
+                try:
+                    name, model, stats = result.get()
+                except Exception, error:
+                    self.log_info("inference of %s failed: %s"
+                                  % (name, error), 'error')
+                    continue
+                self.sink.install(name, model)
+                self.stats.merge(stats)
+        self.__dispatch__()
+
+    def settled(self):
+        'Tests whether no content model is being inferred'
+        return not self.__running__ and not self.__queued__
+
+    def dtd(self):
+        '''Returns the DTD of the documents submitted, rendered again only
+        if the content models are settled and changed since. Returns the
+        empty string if no document was submitted yet'''
+        self.queries += 1
+        if self.__changed__ and self.settled() and self.root is not None:
+            self.__dtd__ = self.sink.dtd(self.root)
+            self.__changed__ = False
+        return self.__dtd__
+
+    def status(self):
+        'Returns a list of the `(name, value)` counters of the daemon'
+        return [('documents', self.documents),
+                ('malformed', len(self.errors)),
+                ('queries', self.queries),
+                ('accepted', self.sink.accepted),
+                ('rejected', self.sink.rejected),
+                ('running', len(self.__running__)),
+                ('queued', len(self.__queued__)),
+                ('settled', int(self.settled()))]
+
+    def poll(self, timeout=0.0):
+        # Look for the results of the pool often while they're due
+        if self.__running__:
+            timeout = min(timeout, 0.01)
+        FeedServer.poll(self, timeout)
+        if self.__running__:
+            self.__collect__()
+
+    def close(self):
+        FeedServer.close(self)
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+def request(address, command, data=None):
+    '''Sends the `command` (with `data`, if given) to the daemon listening
+    on the Unix socket `address`, and returns its reply'''
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(address)
+        client.sendall(command + "\n")
+        if data is not None:
+            client.sendall(data)
+        client.shutdown(socket.SHUT_WR)
+        reply = []
+        while True:
+            chunk = client.recv(1 << 16)
+            if not chunk:
+                break
+            reply.append(chunk)
+        return "".join(reply)
+    finally:
+        client.close()
+
+
+def main(arguments=None):
+    'Runs the daemon from the command line'
+    options = OptionParser(usage="%prog [options] PATH")
+    options.add_option("-j", "--jobs", type="int", default=1,
+                       help="number of worker processes [default: %default]")
+    options.add_option("-e", "--engine", type="choice", choices=ENGINES,
+                       default="soa",
+                       help="default inference engine: %s [default: %%default]"
+                            % ", ".join(ENGINES))
+    options.add_option("--crx", metavar="NAME", action="append", default=[],
+                       help="use CRX for the element type NAME")
+    options.add_option("--metrics", metavar="TARGET",
+                       help="export live metrics in the Prometheus text "
+                            "format to the file TARGET, or over HTTP if "
+                            "TARGET is HOST:PORT or :PORT")
+    options.add_option("--metrics-interval", metavar="SECONDS",
+                       type="float", default=INTERVAL,
+                       help="seconds between two writes of the --metrics "
+                            "file [default: %default]")
+    parser = options
+    options, arguments = options.parse_args(arguments)
+    if len(arguments) != 1:
+        parser.error("the path of the socket is required")
+
+    metrics = None
+    if options.metrics:
+        metrics = Registry()
+    daemon = InferenceDaemon(arguments[0], options.jobs, options.engine,
+                             dict((name, 'crx') for name in options.crx),
+                             metrics)
+    # Stop cleanly (removing the socket) when terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    exported = None
+    try:
+        if metrics is not None:
+            # Started after the workers are forked, so they don't hold its
+            # socket
+            exported = exporter(metrics, options.metrics,
+                                options.metrics_interval)
+        try:
+            daemon.serve()
+        except KeyboardInterrupt:
+            pass
+    finally:
+        daemon.close()
+        if exported is not None:
+            exported.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
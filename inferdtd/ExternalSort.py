@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+# $Id$
+
+"""
+Sorted run files of counted child sequences, merged in external memory.
+
+A run is a file of `(sequence, count)` records sorted by sequence, each
+one written with `marshal` (the sequences are the keys of a
+`DOM.SampleStore`: packed `array('i')` bytes or tuples of names). Runs are
+written from memory with `write_run` and read back sequentially with
+`read_run`.
+
+`merge_runs` merges any number of runs into a single stream of distinct
+sequences, adding up the counts of equal ones; only one record per run is
+in memory at a time. `merge_files` writes that stream to a new run (in
+several passes if there are more than `FANIN` runs), which can then be
+read sequentially by the next stage.
+"""
+
+import os
+import heapq
+import marshal
+from itertools import groupby
+from operator import itemgetter
+
+# The runs merged at once by `merge_files`, so no more files than these
+# are open at the same time
+FANIN = 64
+
+
+def write_run(path, items):
+    '''Writes the `(sequence, count)` `items`, which must be sorted by
+    sequence, to the run file `path`. Returns the number of records'''
+    file = open(path, 'wb')
+    dump = marshal.dump
+    records = 0
+    try:
+        for item in items:
+            dump(item, file, 2)
+            records += 1
+    finally:
+        file.close()
+    return records
+
+
+def read_run(path):
+    'Yields the `(sequence, count)` records of the run file `path`'
+    file = open(path, 'rb')
+    load = marshal.load
+    try:
+        while True:
+            try:
+                yield load(file)
+            except EOFError:
+                break
+    finally:
+        file.close()
+
+
+def merge_runs(paths):
+    '''Yields the distinct sequences in the run files `paths`, in order,
+    each with the sum of its counts'''
+    merged = heapq.merge(*[read_run(path) for path in paths])
+    for sequence, items in groupby(merged, itemgetter(0)):
+        yield sequence, sum(count for key, count in items)
+
+
+def merge_files(paths, path, fanin=FANIN, remove=False):
+    """
+    Merges the run files `paths` into the run file `path`, where each
+    sequence is found once. Returns the number of sequences written.
+
+    At most `fanin` runs are read at once: when there are more, they are
+    merged by groups into intermediate runs first. With `remove`, the runs
+    in `paths` are removed once merged.
+    """
+    paths = list(paths)
+    originals = set(paths)
+    def discard(runs):
+        for run in runs:
+            if remove or run not in originals:
+                os.remove(run)
+    passes = 0
+    while len(paths) > fanin:
+        merged = []
+        for i in xrange(0, len(paths), fanin):
+            target = "%s.%d.%d" % (path, passes, i)
+            write_run(target, merge_runs(paths[i:i + fanin]))
+            discard(paths[i:i + fanin])
+            merged.append(target)
+        paths = merged
+        passes += 1
+    records = write_run(path + ".tmp", merge_runs(paths))
+    discard(paths)
+    os.rename(path + ".tmp", path)
+    return records
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+# $Id$
+
+"""
+Collects the samples of many XML streams at once, in a single thread.
+
+Each stream (a socket or a pipe) carries one document, from its first
+byte until the producer closes it. Every stream gets its own
+`DOM.SampleCollector`, and every chunk read is fed to it as soon as it
+arrives: documents are never buffered whole, and a slow producer only
+costs the state of its expat parser. All the collectors hand their samples
+to the same sink, usually an `IncrementalInferrer`.
+
+The streams are multiplexed with `asyncore`, so there's no thread per
+producer: a `FeedServer` listens on a socket and attaches a `StreamFeeder`
+to each connection accepted, and `PipeFeeder` does the same for pipes.
+"""
+
+import os
+import socket
+import asyncore
+from xml.parsers import expat
+
+from inferdtd.DOM import SampleCollector
+
+# The bytes read from a stream at a time
+CHUNK = 1 << 16
+
+# The connections waiting to be accepted by a `FeedServer`
+BACKLOG = 128
+
+
+class StreamFeeder(asyncore.dispatcher):
+    """
+    Feeds the document read from the socket `source` to a `collector`.
+
+    When the stream ends (or the document turns out to be malformed) the
+    socket is closed and `done(collector, error)` is called, where `error`
+    is the `expat.ExpatError` raised, or None if the document was fine.
+    """
+    def __init__(self, source, collector, done=None, map=None):
+        self.__attach__(source, map)
+        self.collector = collector
+        self.done = done
+        self.finished = False
+        # Start the document, so an empty stream is an error too
+        collector.feed('')
+
+    def __attach__(self, source, map):
+        asyncore.dispatcher.__init__(self, source, map)
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        data = self.recv(CHUNK)
+        if data and not self.finished:
+            try:
+                self.collector.feed(data)
+            except expat.ExpatError, error:
+                self.__finish__(error)
+
+    def handle_close(self):
+        if not self.finished:
+            try:
+                self.collector.close()
+            except expat.ExpatError, error:
+                self.__finish__(error)
+            else:
+                self.__finish__(None)
+
+    def __finish__(self, error):
+        'Closes the stream and reports the document as done'
+        self.finished = True
+        self.close()
+        if self.done is not None:
+            self.done(self.collector, error)
+
+
+class PipeFeeder(StreamFeeder, asyncore.file_dispatcher):
+    '''A `StreamFeeder` reading from the pipe (or any file descriptor that
+    can be polled) `source`'''
+    def __attach__(self, source, map):
+        asyncore.file_dispatcher.__init__(self, source, map)
+
+
+class FeedServer(asyncore.dispatcher):
+    """
+    Accepts the connections of the producers on `address`, and feeds the
+    document sent through each one to a new `SampleCollector` of `sink`.
+
+    `address` is the path of a Unix socket unless another `family` is
+    given; the `options` are handed to every `SampleCollector`. Pipes can
+    be added with `addpipe`.
+
+    `documents` counts the documents read and `errors` keeps the
+    `expat.ExpatError` of each malformed one; `root` is the root element
+    type of the first document read. Subclasses may override
+    `handle_document`, which is called as each stream ends.
+    """
+    def __init__(self, sink, address, family=socket.AF_UNIX, **options):
+        self.__map__ = {}
+        asyncore.dispatcher.__init__(self, map=self.__map__)
+        self.sink = sink
+        self.options = options
+        self.documents = 0
+        self.errors = []
+        self.root = None
+        self.create_socket(family, socket.SOCK_STREAM)
+        if family != socket.AF_UNIX:
+            self.set_reuse_addr()
+        self.bind(address)
+        self.listen(BACKLOG)
+        # The address actually bound (a TCP port may have been chosen)
+        self.address = self.socket.getsockname()
+
+    def __len__(self):
+        'Returns the number of streams being read'
+        return len(self.__map__) - 1
+
+    def writable(self):
+        return False
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            StreamFeeder(pair[0], self.__collector__(),
+                         self.handle_document, self.__map__)
+
+    def addpipe(self, fd):
+        'Reads another document from the pipe (or file descriptor) `fd`'
+        PipeFeeder(fd, self.__collector__(), self.handle_document,
+                   self.__map__)
+
+    def __collector__(self):
+        return SampleCollector(self.sink, **self.options)
+
+    def handle_document(self, collector, error):
+        '''Called when a stream ends, with its `collector` and the
+        `expat.ExpatError` raised if the document was malformed'''
+        if error is not None:
+            self.errors.append(error)
+            return
+        self.documents += 1
+        if self.root is None:
+            self.root = collector.root
+
+    def poll(self, timeout=0.0):
+        '''Waits up to `timeout` seconds for any stream to be ready, and
+        reads the ones that are'''
+        asyncore.loop(timeout, True, self.__map__, 1)
+
+    def serve(self, documents=None, timeout=1.0):
+        '''Reads the streams until `documents` of them have ended (or
+        forever, if `documents` is None)'''
+        while documents is None or \
+              self.documents + len(self.errors) < documents:
+            self.poll(timeout)
+
+    def close(self):
+        'Closes the server socket, along with the streams still open'
+        for dispatcher in self.__map__.values():
+            if dispatcher is not self:
+                dispatcher.close()
+        asyncore.dispatcher.close(self)
+        if self.family_and_type[0] == socket.AF_UNIX and \
+           os.path.exists(self.address):
+            os.unlink(self.address)
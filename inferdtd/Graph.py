@@ -54,6 +54,10 @@ try:
     from functools import partial
 except ImportError:
     partial = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 from inferdtd.RE import matchesemptystring
@@ -61,9 +65,124 @@ from inferdtd.RE import matchesemptystring
 get_target = lambda edge: edge[1]
 get_source = lambda edge: edge[0]
 
+# The smallest and largest number of nodes, and the smallest ratio of edges
+# to nodes squared, of the graphs whose Pred and Succ sets are computed
+# with NumPy (see `Graph.extents`)
+DENSE_MIN, DENSE_MAX = 8, 1024
+DENSITY = 0.1
+
+def findcomponents(nodes, callback):
+    '''
+    Finds the strongly connected components among `nodes`, where
+    `callback` returns the nodes reached from a given node through a single
+    edge (it should not return nodes outside `nodes`).
+
+    Returns a list of components (each a list of nodes) in reverse
+    topological order: every edge between two components goes from a
+    component to one listed before it.
+
+    This is Tarjan's algorithm, without recursion so long chains don't hit
+    the recursion limit.
+    '''
+    index, lowlink = {}, {}
+    stack, onstack = [], set()
+    result = []
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        onstack.add(root)
+        work = [(root, iter(callback(root)))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    onstack.add(child)
+                    work.append((child, iter(callback(child))))
+                    break
+                elif child in onstack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    which = None
+                    while which is not node:
+                        which = stack.pop()
+                        onstack.discard(which)
+                        component.append(which)
+                    result.append(component)
+    return result
+
+def extentsets(nodes, neighbours, nullable):
+    '''
+    Returns a dict mapping each of the `nodes` to the frozen set of the
+    nodes it reaches through a path of one or more edges where every node
+    but the last is in `nullable`. `neighbours` maps each node to the nodes
+    it has an edge to; with the edges reversed that's the `Pred` set of the
+    node, and otherwise its `Succ` set.
+
+    The strongly connected components of the subgraph of the `nullable`
+    nodes are found first: every node in a component reaches the same
+    nodes, and a component reaches the nodes its own nodes have an edge to
+    plus those reached by the components they have an edge to, which come
+    before it in the reverse topological order `findcomponents` returns.
+    So the set of each component is computed once, from the sets computed
+    before, and shared by its nodes.
+    '''
+    callback = lambda node: [x for x in neighbours[node] if x in nullable]
+    reached = {}
+    for component in findcomponents([x for x in nodes if x in nullable],
+                                    callback):
+        result = set()
+        for node in component:
+            for which in neighbours[node]:
+                result.add(which)
+                if which in reached:
+                    result |= reached[which]
+        result = frozenset(result)
+        for node in component:
+            reached[node] = result
+    extents = {}
+    for node in nodes:
+        if node in reached:
+            extents[node] = reached[node]
+        else:
+            result = set(neighbours[node])
+            for which in neighbours[node]:
+                if which in reached:
+                    result |= reached[which]
+            extents[node] = frozenset(result)
+    return extents
+
 class Graph:
-    'Simple graph implementation for the iDTD algorithm'
+    """
+    Simple graph implementation for the iDTD algorithm.
+
+    Changes can be undone: `savepoint` starts an undo log where every node
+    and edge added or removed is recorded along with its position, and
+    `rollback` undoes the changes made since a savepoint in reverse order.
+    Thus the graph gets back to the very same state (the order of `nodes`
+    and `edges` included) in time proportional to the changes made rather
+    than to the size of the graph.
+
+    `version` is increased by every change (rolled back ones included), so
+    whatever is computed from the graph can be cached along with it.
+    """
     def __init__(self, nodes=None, edges=None):
+        # The undo log, None unless there's a savepoint, and the open
+        # savepoints, innermost last
+        self.__log__ = None
+        self.__savepoints__ = []
+        self.version = 0
+        # The Pred and Succ sets, with the version they were computed for
+        self.__extents__ = None
         if nodes:
             self.nodes = [node for node in nodes]
         else:
@@ -77,45 +196,217 @@ class Graph:
         return len(self.nodes)
 
     @staticmethod
-    def __findextentset__(node, callback):
-        '''
-        Searches in the direction given by `callback` the node set with an
-        "empty" path in from `node`.
-
-        This is useful for both Pred and Succ calculations:
+    def build(nodes, edges):
+        '''Returns the graph with the given `nodes` and `edges`, which are
+        trusted to be distinct and consistent, so nothing is checked'''
+        result = Graph()
+        result.nodes = list(nodes)
+        result.edges = list(edges)
+        return result
 
-        -   If `callback` returns the ingoing nodes to a given node, then
-            this function will return the Pred set.
+    def copy(self):
+        'Returns a copy of the graph; nodes are shared, not copied'
+        return Graph.build(self.nodes, self.edges)
+
+    def savepoint(self):
+        '''Starts recording the changes made to the graph. Returns the
+        savepoint to hand to `rollback` or `release`. Savepoints may be
+        nested.'''
+        if self.__log__ is None:
+            self.__log__ = []
+        self.__savepoints__.append(len(self.__log__))
+        return len(self.__log__)
+
+    def rollback(self, savepoint):
+        'Undoes the changes made since `savepoint`'
+        log = self.__log__
+        assert log is not None and savepoint <= len(log)
+        while len(log) > savepoint:
+            items, index, item, added = log.pop()
+            if added:
+                del items[index]
+            else:
+                items.insert(index, item)
+            self.version += 1
+        self.__close__(savepoint)
+
+    def release(self, savepoint):
+        '''Keeps the changes made since `savepoint`; they can still be
+        undone by rolling back to an earlier savepoint'''
+        assert self.__log__ is not None and savepoint <= len(self.__log__)
+        self.__close__(savepoint)
+
+    def __close__(self, savepoint):
+        '''Closes `savepoint` (and the savepoints opened after it, if still
+        open). The log is dropped once the outermost one is closed'''
+        savepoints = self.__savepoints__
+        while savepoints and savepoints[-1] > savepoint:
+            savepoints.pop()
+        assert savepoints and savepoints[-1] == savepoint
+        savepoints.pop()
+        if not savepoints:
+            self.__log__ = None
+
+    def __append__(self, items, item):
+        'Appends `item` to `items` (`nodes` or `edges`), logging it'
+        items.append(item)
+        self.version += 1
+        if self.__log__ is not None:
+            self.__log__.append((items, len(items) - 1, item, True))
+
+    def __remove__(self, items, item):
+        'Removes `item` from `items` (`nodes` or `edges`), logging it'
+        index = items.index(item)
+        del items[index]
+        self.version += 1
+        if self.__log__ is not None:
+            self.__log__.append((items, index, item, False))
+
+    def isdense(self):
+        '''Tests whether the Pred and Succ sets are worth computing with
+        NumPy'''
+        size = len(self.nodes)
+        return numpy is not None and DENSE_MIN <= size <= DENSE_MAX and \
+               len(self.edges) >= DENSITY * size * size
+
+    def cached(self):
+        'Tests whether the Pred and Succ sets are computed for this version'
+        return self.__extents__ is not None and \
+               self.__extents__[0] == self.version
+
+    def extents(self):
+        '''
+        Returns `(pred, succ)`: two dicts mapping every node to the frozen
+        sets `Pred(node)` and `Succ(node)`.
+
+        They're computed for all the nodes at once (see `isdense`,
+        `__closure__` and `extentsets`) and shared by every call until the
+        graph changes, so a rule asking for the sets of every node costs a
+        single traversal of the graph. Use `pred` and `succ` to get a set
+        that can be modified.
+        '''
+        return self.__computed__()
+
+    def __computed__(self):
+        'Returns the `(pred, succ)` dicts of `extents`, computed if needed'
+        if not self.cached():
+            if self.isdense():
+                pred, succ = self.__closure__()
+            else:
+                pred, succ = self.__condensed__()
+            self.__extents__ = (self.version, pred, succ)
+        return self.__extents__[1:]
+
+    def __neighbours__(self):
+        '''Returns the dicts mapping every node to the list of nodes with an
+        edge into it, and to the list of nodes it has an edge to. The nodes
+        in the edges are replaced by those in `nodes` they're equal to'''
+        nodes = self.nodes
+        index = dict((node, node) for node in nodes)
+        def canonical(node):
+            # The expressions used as nodes don't hash as they compare
+            found = index.get(node)
+            if found is None:
+                found = nodes[nodes.index(node)]
+            return found
+        into = dict((node, []) for node in nodes)
+        outof = dict((node, []) for node in nodes)
+        for source, target in self.edges:
+            source, target = canonical(source), canonical(target)
+            into[target].append(source)
+            outof[source].append(target)
+        return into, outof
+
+    def __condensed__(self):
+        'Returns the `(pred, succ)` dicts of `extents` using `extentsets`'
+        into, outof = self.__neighbours__()
+        nullable = set(node for node in self.nodes
+                       if matchesemptystring(node))
+        return (extentsets(self.nodes, into, nullable),
+                extentsets(self.nodes, outof, nullable))
+
+    def __closure__(self):
+        '''
+        Returns the `(pred, succ)` dicts of `extents` using NumPy.
 
-        -   If `callback` returns the outgoing nodes to a given node, then
-            this function will return the Succ set.
+        With the adjacency matrix `A` and the matrix `M` of the edges between
+        nullable nodes, the matrix with `[i, j]` set if node `j` is in
+        `Succ(i)` (so node `i` is in `Pred(j)`) is `A + A[:, N] * M* * A[N,
+        :]`, where `N` are the nullable nodes and `M*` is the reflexive and
+        transitive closure of `M`, found by squaring.
         '''
-        queue = set(callback(node))
-        result = queue.copy()
-        trash = set([])
-        while len(queue) > 0:
-            which = queue.pop()
-            trash.add(which)
-            if matchesemptystring(which):
-                extent = set(callback(which))
-                result |= extent
-                queue |= extent - trash
-        return result
+        nodes = self.nodes
+        index = dict((node, i) for i, node in enumerate(nodes))
+        size = len(nodes)
+        adjacency = numpy.zeros((size, size), dtype=numpy.float32)
+        into, outof = self.__neighbours__()
+        for target, sources in into.iteritems():
+            if sources:
+                adjacency[[index[x] for x in sources], index[target]] = 1
+        nullable = [i for i, node in enumerate(nodes)
+                    if matchesemptystring(node)]
+        matrix = adjacency > 0
+        if nullable:
+            closure = adjacency[numpy.ix_(nullable, nullable)]
+            closure[numpy.diag_indices(len(nullable))] = 1
+            while True:
+                squared = (numpy.dot(closure, closure) > 0) \
+                            .astype(numpy.float32)
+                if (squared == closure).all():
+                    break
+                closure = squared
+            paths = numpy.dot(numpy.dot(adjacency[:, nullable], closure),
+                              adjacency[nullable, :])
+            matrix |= paths > 0
+        pred = dict((node, frozenset(nodes[j] for j in
+                                     numpy.flatnonzero(matrix[:, i])))
+                    for i, node in enumerate(nodes))
+        succ = dict((node, frozenset(nodes[j] for j in
+                                     numpy.flatnonzero(matrix[i])))
+                    for i, node in enumerate(nodes))
+        return pred, succ
+
+    def __extentset__(self, extents, node):
+        'Returns a copy of the set of `node` in the `extents` dict'
+        found = extents.get(node)
+        if found is None:
+            # Maybe an equal expression, or a node not in the graph
+            if node not in self.nodes:
+                return set()
+            found = extents[self.nodes[self.nodes.index(node)]]
+        return set(found)
 
     def pred(self, node):
         'Returns the set `Pred(node)`'
-        callback = lambda node: [origin for (origin, target) in self.getedgesintonode(node)]
-        return Graph.__findextentset__(node, callback)
+        return self.__extentset__(self.__computed__()[0], node)
 
     def succ(self, node):
         'Returns the set `Succ(node)`'
-        callback = lambda node: [target for (origin, target) in self.getedgesoutofnode(node)]
-        return Graph.__findextentset__(node, callback)
+        return self.__extentset__(self.__computed__()[1], node)
+
+    def successors(self):
+        '''Returns a dict mapping every node to the list of nodes it has
+        an edge to'''
+        result = dict((node, []) for node in self.nodes)
+        for source, target in self.edges:
+            result[source].append(target)
+        return result
+
+    def components(self, nodes=None):
+        '''Returns the strongly connected components of the subgraph
+        induced by `nodes` (all the nodes by default), as `findcomponents`
+        does'''
+        if nodes is None:
+            nodes = self.nodes
+        successors = self.successors()
+        nodes = set(nodes)
+        callback = lambda node: [x for x in successors[node] if x in nodes]
+        return findcomponents([x for x in self.nodes if x in nodes], callback)
 
     def addnode(self, node):
         'Adds `node` to the graph'
         if node not in self.nodes:
-            self.nodes.append(node)
+            self.__append__(self.nodes, node)
 
     def createedge(self, source, target):
         'Creates an edge from `source` to `target`'
@@ -125,12 +416,12 @@ class Graph:
         'Adds the `edge`'
         assert type(edge) is tuple and len(edge) == 2 and edge[0] in self.nodes and edge[1] in self.nodes
         if edge not in self.edges:
-            self.edges.append(edge)
+            self.__append__(self.edges, edge)
 
     def removeedge(self, edge):
         'Removes the `edge`'
         if edge in self.edges:
-            self.edges.remove(edge)
+            self.__remove__(self.edges, edge)
 
     def replaceedge(self, original, new):
         'Replaces edge `original` for `new`'
@@ -153,7 +444,7 @@ class Graph:
         for edge in inedges:
             source = edge[0]
             self.replaceedge(edge, (source, new))
-        self.nodes.remove(original)
+        self.__remove__(self.nodes, original)
 
     def removenode(self, node):
         'Removes a `node` from the graph'
@@ -164,7 +455,7 @@ class Graph:
             inedges = self.getedgesintonode(node)
             for which in inedges:
                 self.removeedge(which)
-            self.nodes.remove(node)
+            self.__remove__(self.nodes, node)
 
     def getedgesoutofnode(self, node):
         'Get the list of edges comming out of a `node`'
@@ -32,6 +32,8 @@ This module implements the "abstract" iDTD algorithm as described in
     Volume 32. 2006.
 """
 
+from time import time
+
 from inferdtd.RE import Repeat
 from inferdtd.RE import Optional
 from inferdtd.RE import matchesemptystring
@@ -39,6 +41,7 @@ from inferdtd.Rewrite import rewrite
 from inferdtd.Rewrite import __disjunctionrule__
 from inferdtd.Rewrite import __concatrule__
 from inferdtd.AutomataInferrer import EmptyNode
+from inferdtd.Graph import findcomponents
 
 
 def __enable_optional_for_node__(SOA, node):
@@ -109,25 +112,50 @@ def __enable_disjunction_case_b__(SOA):
         ~  * r is not optional
         ~  * pred(r) \ne \emptyset
 
-
-    NOTE: This implementation consider only the case when `|W|=2`, so some cases
-    are not enable . For instance, the GFA obtained by the sequences "abc",
-    "bca" and "cab", is not detected, it would require `W` to be `{a, b, c}`.
+    Pairs (`|W|=2`) are tried first: every pair satisfying the condition
+    and not sharing a node with a pair found before is repaired, all in
+    the same step. If there is none, larger sets are looked for: since the
+    condition says every `r in W` has both a predecessor and a successor in
+    `W`, any strongly connected component of the `Succ` relation with more
+    than one node satisfies it, and is maximal (see
+    `__disjunction_groups__`). For instance, the GFA obtained by the
+    sequences "abc", "bca" and "cab" gets `W={a, b, c}`.
     '''
-    pairs = [(x, y) for x in SOA.nodes
-                    for y in SOA.nodes[SOA.nodes.index(x)+1:]
-                    if type(x) is not EmptyNode and type(y) is not EmptyNode]
-    i = 0
-    found = False
-    while not found and i < len(pairs):
-        candidates = pairs[i]
-        pred = SOA.pred(candidates[0]) | SOA.pred(candidates[1])
-        succ = SOA.succ(candidates[0]) | SOA.succ(candidates[1])
-        found = set(candidates) <= pred and set(candidates) <= succ
-        i += 1
-    if found:
-        __enable_disjunction_for_nodes__(SOA, candidates)
-    return found
+    nodes = [x for x in SOA.nodes if type(x) is not EmptyNode]
+    pred, succ = SOA.extents()
+    groups = []
+    used = set()
+    for i, x in enumerate(nodes):
+        for y in nodes[i+1:]:
+            if x in used:
+                break
+            if y in used:
+                continue
+            candidates = set([x, y])
+            if candidates <= pred[x] | pred[y] and \
+               candidates <= succ[x] | succ[y]:
+                groups.append([x, y])
+                used |= candidates
+    if not groups:
+        groups = __disjunction_groups__(nodes, succ)
+    for group in groups:
+        # Repairing a group may have merged nodes of the next ones
+        if all(node in SOA.nodes for node in group):
+            __enable_disjunction_for_nodes__(SOA, group)
+    return bool(groups)
+
+
+def __disjunction_groups__(nodes, succ):
+    '''
+    Returns the strongly connected components, with more than one node, of
+    the relation `x -> y iff y in succ[x]` among `nodes`. Each component is
+    a list of nodes in the order of `nodes`.
+    '''
+    order = dict((x, i) for i, x in enumerate(nodes))
+    callback = lambda x: [y for y in succ[x] if y in order]
+    return [sorted(component, key=order.get)
+            for component in findcomponents(nodes, callback)
+            if len(component) > 1]
 
 
 def __enable_disjunction_case_a__(SOA, k=2):
@@ -147,17 +175,18 @@ def __enable_disjunction_case_a__(SOA, k=2):
     pairs = [(x, y) for x in SOA.nodes
                     for y in SOA.nodes[SOA.nodes.index(x)+1:]
                     if type(x) is not EmptyNode and type(y) is not EmptyNode]
+    pred, succ = SOA.extents()
     i = 0
     found = False
     while not found and i < len(pairs):
         candidates = pairs[i]
         found = (
-            SOA.pred(candidates[0]) & SOA.pred(candidates[1]) != set() and
-            SOA.succ(candidates[0]) & SOA.succ(candidates[1]) != set() and
-            1 <= len(SOA.pred(candidates[0]) - SOA.pred(candidates[1])) <= k and
-            1 <= len(SOA.pred(candidates[1]) - SOA.pred(candidates[0])) <= k and
-            1 <= len(SOA.succ(candidates[0]) - SOA.succ(candidates[1])) <= k and
-            1 <= len(SOA.succ(candidates[1]) - SOA.succ(candidates[0])) <= k
+            pred[candidates[0]] & pred[candidates[1]] != set() and
+            succ[candidates[0]] & succ[candidates[1]] != set() and
+            1 <= len(pred[candidates[0]] - pred[candidates[1]]) <= k and
+            1 <= len(pred[candidates[1]] - pred[candidates[0]]) <= k and
+            1 <= len(succ[candidates[0]] - succ[candidates[1]]) <= k and
+            1 <= len(succ[candidates[1]] - succ[candidates[0]]) <= k
         )
         i += 1
     if found:
@@ -174,6 +203,9 @@ def __enable_optional_case_a__(SOA):
             There's at least 1 edge from a predecessor of `node` to a
             successor of `node`. We call such an edges `bypassers` of
             `node`.
+
+    Every candidate not interfering with the others is repaired (see
+    `__independent__`).
     """
     bypassers  = lambda x: [(p, s) for p in SOA.pred(x)
                                   for s in SOA.succ(x)
@@ -181,11 +213,10 @@ def __enable_optional_case_a__(SOA):
     candidates = [node for node in SOA.nodes
                        if not isinstance(node, EmptyNode) and
                           bypassers(node)]
-    if candidates:
-        __enable_optional_for_node__(SOA, candidates[0])
-        return True
-    else:
-        return False
+    for node in __independent__(SOA, candidates):
+        if bypassers(node):
+            __enable_optional_for_node__(SOA, node)
+    return bool(candidates)
 
 def __enable_optional_case_b__(SOA, k=2):
     """
@@ -197,6 +228,9 @@ def __enable_optional_case_b__(SOA, k=2):
                                      `|Succ(r')\{r, r'}| <= k`
 
         `Pred(r) = {r'}` --> the set contains an element different of `r`
+
+    Every candidate not interfering with the others is repaired (see
+    `__independent__`).
     """
     def test(node):
         edges = SOA.getedgesintonode(node)
@@ -209,10 +243,35 @@ def __enable_optional_case_b__(SOA, k=2):
     candidates = [x for x in SOA.nodes
                     if  type(x) is not EmptyNode and
                         test(x)]
-    if candidates:
-        __enable_optional_for_node__(SOA, candidates[0])
+    for node in __independent__(SOA, candidates):
+        if test(node):
+            __enable_optional_for_node__(SOA, node)
     return bool(candidates)
 
+def __independent__(SOA, candidates):
+    """
+    Returns the `candidates` for the Enable-Optional repair rule that can
+    be repaired in the same step: those whose neighbourhood (the node
+    itself, its Pred and its Succ sets, but the start and end nodes)
+    doesn't overlap with the neighbourhood of a candidate taken before.
+
+    The first candidate is always taken, so the rule does at least what it
+    did when it repaired a single node. The rest are checked again right
+    before being repaired, since only the start and end nodes may have
+    changed around them.
+    """
+    pred, succ = SOA.extents()
+    used = set()
+    result = []
+    for node in candidates:
+        neighbourhood = set(x for x in pred[node] | succ[node]
+                              if type(x) is not EmptyNode)
+        neighbourhood.add(node)
+        if not neighbourhood & used:
+            result.append(node)
+            used |= neighbourhood
+    return result
+
 def __is_final__(GFA):
     """
     An GFA is final when it has only one node (aside the start and nodes)
@@ -221,22 +280,59 @@ def __is_final__(GFA):
     return len(GFA.nodes) == 3 and len(GFA.edges) == 2
 
 
-def infer_soa(GFA):
+# The repair rules in the order `infer_soa` tries them
+REPAIRS = [__enable_disjunction_case_b__,
+           __enable_disjunction_case_a__,
+           __enable_optional_case_a__,
+           __enable_optional_case_b__]
+
+
+def __repair__(GFA, stats=None):
+    """
+    Applies the first repair rule that can be applied to `GFA`.
+    Returns True if any rule was applied.
+    """
+    for rule in REPAIRS:
+        if stats is None:
+            applied = rule(GFA)
+        else:
+            applied = stats.apply(rule, GFA)
+        if applied:
+            return True
+    return False
+
+
+def infer_soa(GFA, stats=None):
     """
     Applies Rewrite to the SOA until a final GFA is obtained
+
+    If a `Profile.RuleStats` object is given as `stats`, every rule
+    applied, every Pred/Succ computation and the time spent in the
+    "rewrite" and "repair" phases are recorded there, and the duration of
+    the whole call is observed in its ``idtd_infer_soa_seconds`` metric.
     """
-    rewrite(GFA)
-    if not __is_final__(GFA):
-        proceed = True
-        while proceed and not __is_final__(GFA):
-            proceed = (
-                    __enable_disjunction_case_b__(GFA) or
-                    __enable_disjunction_case_a__(GFA) or
-                    __enable_optional_case_a__(GFA) or
-                    __enable_optional_case_b__(GFA)
-            )
-            if proceed:
-                rewrite(GFA)
+    start = time()
+    if stats is None:
+        rewritten = lambda: rewrite(GFA)
+        repaired = lambda: __repair__(GFA)
+    else:
+        rewritten = lambda: stats.timed('rewrite', rewrite, GFA, stats)
+        repaired = lambda: stats.timed('repair', __repair__, GFA, stats)
+        instrumented = stats.instrument(GFA)
+    try:
+        rewritten()
+        if not __is_final__(GFA):
+            proceed = True
+            while proceed and not __is_final__(GFA):
+                proceed = repaired()
+                if proceed:
+                    rewritten()
+    finally:
+        if stats is not None:
+            if instrumented:
+                stats.release(GFA)
+            stats.observe('idtd_infer_soa_seconds', time() - start,
+                          "Seconds spent in each infer_soa call")
     return __is_final__(GFA)
 
 
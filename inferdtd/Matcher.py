@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+# $Id$
+
+"""
+Table-driven matchers for the regular expressions in `RE`.
+
+A `Matcher` is compiled from an expression by means of the Glushkov (or
+position) automaton: there is a state for every occurrence of a symbol in
+the expression plus an initial state, and the transitions follow the
+`first`, `last` and `follow` sets of the positions. When every symbol
+occurs once (as in SOREs and CHAREs) the automaton is deterministic, so a
+sequence is checked in a single pass with one table lookup per symbol.
+
+The transitions are kept in a flat array of integers with a row per state
+and a column per symbol. Each entry holds the offset of the row of the
+target state (or -1 if there's no transition), so the next lookup is just
+`table[state + column]`.
+"""
+
+from array import array
+
+from inferdtd.RE import Repeat
+from inferdtd.RE import Kleene
+from inferdtd.RE import Optional
+from inferdtd.RE import Conjunction
+from inferdtd.RE import Disjunction
+from inferdtd.RE import Operator
+
+
+class NonDeterministicExpression(Exception):
+    '''Exception raised when the Glushkov automaton of an expression is not
+    deterministic'''
+    pass
+
+
+def __glushkov__(expression, symbols, follow):
+    '''
+    Computes the Glushkov sets of `expression`. The symbol at each position
+    is appended to `symbols`, and the `follow` set of each position is put
+    in the `follow` list.
+
+    Returns the tuple `(nullable, first, last)`.
+    '''
+    kind = type(expression)
+    if kind is Optional:
+        nullable, first, last = __glushkov__(expression.__target__,
+                                             symbols, follow)
+        return True, first, last
+    elif kind is Repeat or kind is Kleene:
+        nullable, first, last = __glushkov__(expression.__target__,
+                                             symbols, follow)
+        for position in last:
+            follow[position] |= first
+        return nullable or kind is Kleene, first, last
+    elif kind is Conjunction:
+        nullable, first, last = True, set(), set()
+        for target in expression.__targets__:
+            tnullable, tfirst, tlast = __glushkov__(target, symbols, follow)
+            for position in last:
+                follow[position] |= tfirst
+            if nullable:
+                first = first | tfirst
+            if tnullable:
+                last = last | tlast
+            else:
+                last = tlast
+            nullable = nullable and tnullable
+        return nullable, first, last
+    elif kind is Disjunction:
+        nullable, first, last = False, set(), set()
+        for target in expression.__targets__:
+            tnullable, tfirst, tlast = __glushkov__(target, symbols, follow)
+            nullable = nullable or tnullable
+            first |= tfirst
+            last |= tlast
+        return nullable, first, last
+    else:
+        assert not isinstance(expression, Operator)
+        position = len(symbols)
+        symbols.append(expression)
+        follow.append(set())
+        return False, set([position]), set([position])
+
+
+class Matcher(object):
+    """
+    A deterministic automaton checking sequences against an expression.
+
+    The expression None stands for the empty content model, which only
+    matches the empty sequence.
+
+    `columns` maps each symbol to its column in the transition `table`;
+    `width` is the number of columns. Raises `NonDeterministicExpression`
+    if the expression has no deterministic Glushkov automaton (which
+    can only happen when some symbol occurs more than once).
+    """
+    def __init__(self, expression):
+        symbols, follow = [], []
+        if expression is None:
+            nullable, first, last = True, set(), set()
+        else:
+            nullable, first, last = __glushkov__(expression, symbols, follow)
+        self.columns = {}
+        for symbol in symbols:
+            if symbol not in self.columns:
+                self.columns[symbol] = len(self.columns)
+        self.width = width = max(len(self.columns), 1)
+        # State 0 is the initial one; position `p` is state `p + 1`
+        self.table = table = array('i', [-1]) * ((len(symbols) + 1) * width)
+        def connect(state, positions):
+            for position in positions:
+                index = state * width + self.columns[symbols[position]]
+                if table[index] != -1:
+                    raise NonDeterministicExpression(
+                        "%s occurs ambiguously in %s" % (symbols[position],
+                                                        expression))
+                table[index] = (position + 1) * width
+        connect(0, first)
+        for position, positions in enumerate(follow):
+            connect(position + 1, positions)
+        final = set((position + 1) * width for position in last)
+        if nullable:
+            final.add(0)
+        self.final = frozenset(final)
+
+    def __len__(self):
+        'Returns the number of states'
+        return len(self.table) // self.width
+
+    def matches(self, sequence):
+        'Tests whether `sequence` matches the expression'
+        table, columns = self.table, self.columns
+        state = 0
+        for symbol in sequence:
+            column = columns.get(symbol)
+            if column is None:
+                return False
+            state = table[state + column]
+            if state < 0:
+                return False
+        return state in self.final
+
+    def matchall(self, sequences):
+        '''Returns a list with the result of `matches` for each of the
+        `sequences`. Equal sequences are only checked once.'''
+        checked = {}
+        matches = self.matches
+        result = []
+        for sequence in sequences:
+            key = tuple(sequence)
+            found = checked.get(key)
+            if found is None:
+                found = checked[key] = matches(key)
+            result.append(found)
+        return result
+
+    def rejected(self, sequences):
+        'Returns the distinct `sequences` that do not match the expression'
+        seen = set()
+        matches = self.matches
+        result = []
+        for sequence in sequences:
+            key = tuple(sequence)
+            if key not in seen:
+                seen.add(key)
+                if not matches(key):
+                    result.append(sequence)
+        return result
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+# $Id$
+
+"""
+Live throughput metrics, exported in the Prometheus text format.
+
+A `Registry` holds counters, gauges and histograms by name (and labels).
+They're cheap enough to update once per document or per content model
+inferred, and are meant to be updated by a single thread. What records
+into a registry:
+
+-   a `DOM.SampleCollector` given one as `metrics`: the documents, bytes
+    and elements read (``idtd_documents_total``, ``idtd_bytes_total`` and
+    ``idtd_elements_total``);
+
+-   a `Profile.RuleStats` given one as `metrics`: the duration of every
+    phase (``idtd_phase_seconds``, labelled by phase: the automaton built
+    by `infer_automata`, and the rewrite and repair steps of `infer_soa`)
+    and of every `InferDTD.infer_soa` call (``idtd_infer_soa_seconds``).
+
+The registries of worker processes come back along with their `RuleStats`
+and are added up with `Registry.merge`.
+
+A `FileExporter` thread rewrites a file with the metrics periodically,
+and an `HTTPExporter` thread serves them to whoever asks (a Prometheus
+server, usually); `exporter` picks one given a path or an address.
+"""
+
+import os
+import time
+import threading
+import BaseHTTPServer
+from bisect import bisect_left
+
+# The upper bounds of the buckets of a histogram, in seconds by default
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+           0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# The seconds between two exports of a `FileExporter`
+INTERVAL = 10.0
+
+# The content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def __labels__(labels, extra=None):
+    '''Returns the `labels` (a tuple of `(name, value)` pairs), and the
+    `extra` one, as written after the name of a sample'''
+    if extra is not None:
+        labels = labels + (extra,)
+    if not labels:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, str(value)
+                                           .replace("\\", "\\\\")
+                                           .replace('"', '\\"')
+                                           .replace("\n", "\\n"))
+                             for name, value in labels)
+
+
+def __number__(value):
+    'Returns `value` as written in a sample'
+    if value == float('inf'):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class Counter(object):
+    'A value that only goes up'
+    kind = 'counter'
+
+    def __init__(self, name, labels=()):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, value=1):
+        'Adds `value` to the counter'
+        self.value += value
+
+    def merge(self, other):
+        self.value += other.value
+
+    def samples(self):
+        'Yields the `(name, labels, value)` of the samples to export'
+        yield self.name, __labels__(self.labels), self.value
+
+
+class Gauge(Counter):
+    '''A value that goes up and down. If a `function` is given, the value
+    is what it returns when exported'''
+    kind = 'gauge'
+
+    def __init__(self, name, labels=(), function=None):
+        Counter.__init__(self, name, labels)
+        self.function = function
+
+    def set(self, value):
+        'Sets the value of the gauge'
+        self.value = value
+
+    def merge(self, other):
+        self.value = other.value
+
+    def samples(self):
+        value = self.value
+        if self.function is not None:
+            value = self.function()
+        yield self.name, __labels__(self.labels), value
+
+    def __getstate__(self):
+        # Functions don't travel between processes
+        state = dict(vars(self))
+        state['function'] = None
+        return state
+
+
+class Histogram(object):
+    '''Counts the values observed in each of the `buckets`, given by their
+    upper bounds'''
+    kind = 'histogram'
+
+    def __init__(self, name, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # The values in each bucket (not cumulative), and above the last
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        'Records `value`'
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        assert self.buckets == other.buckets
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q):
+        '''Returns an estimate of the `q` quantile (0 <= q <= 1) of the
+        values observed, interpolating in its bucket as Prometheus does;
+        None if there are none. Values above the last bucket are estimated
+        as its upper bound'''
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = i and self.buckets[i - 1] or 0.0
+                return lower + (self.buckets[i] - lower) * \
+                               (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def samples(self):
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            yield (self.name + "_bucket",
+                   __labels__(self.labels, ('le', __number__(bound))), seen)
+        yield self.name + "_sum", __labels__(self.labels), self.sum
+        yield self.name + "_count", __labels__(self.labels), self.count
+
+
+class Registry(object):
+    """
+    The metrics of a process, by name and labels.
+
+    `counter`, `gauge` and `histogram` return the metric with the given
+    name and labels (a dict), creating it the first time; the `help` of a
+    name is the one given first.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.__metrics__ = {}
+        self.__help__ = {}
+
+    def __metric__(self, kind, name, help, labels, *args):
+        labels = tuple(sorted((labels or {}).items()))
+        metric = self.__metrics__.get((name, labels))
+        if metric is None:
+            metric = self.__metrics__[name, labels] = kind(name, labels,
+                                                           *args)
+            self.__help__.setdefault(name, help)
+        assert metric.kind == kind.kind
+        return metric
+
+    def counter(self, name, help="", labels=None):
+        'Returns the `Counter` `name` with the given `labels`'
+        return self.__metric__(Counter, name, help, labels)
+
+    def gauge(self, name, help="", labels=None, function=None):
+        '''Returns the `Gauge` `name` with the given `labels`; `function`
+        is only used when it is created'''
+        return self.__metric__(Gauge, name, help, labels, function)
+
+    def histogram(self, name, help="", labels=None, buckets=BUCKETS):
+        '''Returns the `Histogram` `name` with the given `labels`; `buckets`
+        are only used when it is created'''
+        return self.__metric__(Histogram, name, help, labels, buckets)
+
+    def metrics(self):
+        'Returns the metrics, sorted by name and labels'
+        return [self.__metrics__[key] for key in sorted(self.__metrics__)]
+
+    def merge(self, other):
+        '''Adds the counts of the metrics of `other` (from another process,
+        usually) to those here'''
+        for (name, labels), metric in other.__metrics__.iteritems():
+            mine = self.__metrics__.get((name, labels))
+            if mine is None:
+                self.__metrics__[name, labels] = metric
+                self.__help__.setdefault(name, other.__help__.get(name, ""))
+            else:
+                mine.merge(metric)
+
+    def exposition(self):
+        'Returns the metrics in the Prometheus text format'
+        lines = []
+        last = None
+        for metric in self.metrics():
+            if metric.name != last:
+                last = metric.name
+                help = self.__help__.get(last)
+                if help:
+                    lines.append("# HELP %s %s" % (last, help.replace(
+                                    "\\", "\\\\").replace("\n", "\\n")))
+                lines.append("# TYPE %s %s" % (last, metric.kind))
+            for name, labels, value in metric.samples():
+                lines.append("%s%s %s" % (name, labels, __number__(value)))
+        lines.append("# TYPE idtd_start_time_seconds gauge")
+        lines.append("idtd_start_time_seconds %s" % __number__(self.started))
+        return "\n".join(lines) + "\n"
+
+
+class FileExporter(threading.Thread):
+    '''Writes the metrics of `registry` to the file `path` every `interval`
+    seconds, and once more when stopped. The file is replaced at once, so
+    readers never see it half written'''
+    def __init__(self, registry, path, interval=INTERVAL):
+        threading.Thread.__init__(self, name="metrics")
+        self.setDaemon(True)
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.__stopped__ = threading.Event()
+
+    def export(self):
+        'Writes the metrics now'
+        temporary = "%s.%d.tmp" % (self.path, os.getpid())
+        output = open(temporary, 'w')
+        try:
+            output.write(self.registry.exposition())
+        finally:
+            output.close()
+        os.rename(temporary, self.path)
+
+    def run(self):
+        while True:
+            self.__stopped__.wait(self.interval)
+            if self.__stopped__.isSet():
+                break
+            self.export()
+
+    def stop(self):
+        'Stops the thread, writing the metrics a last time'
+        self.__stopped__.set()
+        if self.isAlive():
+            self.join()
+        self.export()
+
+
+class HTTPExporter(threading.Thread):
+    '''Serves the metrics of `registry` over HTTP at `address`, a `(host,
+    port)` tuple (port 0 picks any free one; see `address`)'''
+    def __init__(self, registry, address):
+        threading.Thread.__init__(self, name="metrics")
+        self.setDaemon(True)
+        self.registry = registry
+        exporter = self
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                data = exporter.registry.exposition()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+        self.server = BaseHTTPServer.HTTPServer(address, Handler)
+        self.address = self.server.server_address
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        'Stops serving the metrics'
+        if self.isAlive():
+            self.server.shutdown()
+            self.join()
+        self.server.server_close()
+
+
+def exporter(registry, target, interval=INTERVAL):
+    '''Returns a started exporter of the metrics in `registry`: an
+    `HTTPExporter` if `target` is an address ("HOST:PORT", or ":PORT" for
+    all the interfaces), and a `FileExporter` writing to the path `target`
+    every `interval` seconds otherwise'''
+    host, separator, port = target.rpartition(':')
+    if separator and port.isdigit() and os.sep not in host:
+        result = HTTPExporter(registry, (host, int(port)))
+    else:
+        result = FileExporter(registry, target, interval)
+    result.start()
+    return result
@@ -0,0 +1,443 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+# $Id$
+
+"""
+Instrumentation for the Rewrite and iDTD algorithms.
+
+A `RuleStats` object can be passed to `Rewrite.rewrite` and
+`InferDTD.infer_soa` to find out where the time goes: for each rule it
+records how many times it was tried, how many times it was applied and the
+wall time it took; it also counts the calls to `Graph.pred`, `Graph.succ`
+and `Graph.extents` made meanwhile, and how many of them found the sets
+already computed (the "extents" cache).
+
+When no `RuleStats` is given nothing is recorded, and the rules are called
+directly.
+
+A `MemoryStats` object given to a `RuleStats` as `memory` records the
+memory used by each phase and, if asked to, by each element type. A
+`Metrics.Registry` given as `metrics` gets histograms of the duration of
+each phase and of each `InferDTD.infer_soa` call, for live export.
+"""
+
+import os
+import sys
+from time import time
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The methods of a graph counted by `RuleStats.instrument`
+INSTRUMENTED = ('pred', 'succ', 'extents')
+
+
+def rulename(rule):
+    'Returns the name under which the `rule` function is reported'
+    return rule.__name__.strip('_')
+
+
+def __increment__(counters, key, value):
+    'Adds `value` to the `key` entry of the `counters` dict'
+    counters[key] = counters.get(key, 0) + value
+
+
+class RuleStats(object):
+    """
+    Per-rule counters and timings.
+
+    -   `attempts`, `applications` and `seconds` map each rule name to the
+        times it was tried, the times it was applied and the seconds it
+        took.
+
+    -   `calls` and `callseconds` map "pred", "succ" and "extents" to the
+        number of calls and the seconds spent in them.
+
+    -   `phases` maps each phase ("automaton", "rewrite" and "repair") to
+        the seconds spent in it.
+
+    -   `cachehits` and `cachemisses` map the name of each cache to its
+        hits and misses.
+
+    If a `Metrics.Registry` is given as `metrics`, every duration timed
+    is also observed in the ``idtd_phase_seconds`` histogram there.
+    """
+    def __init__(self, memory=None, metrics=None):
+        self.memory = memory
+        self.metrics = metrics
+        self.attempts = {}
+        self.applications = {}
+        self.seconds = {}
+        self.calls = {}
+        self.callseconds = {}
+        self.phases = {}
+        self.cachehits = {}
+        self.cachemisses = {}
+
+    def apply(self, rule, graph):
+        '''Applies the `rule` function to `graph`, recording the attempt.
+        Returns what the rule returns'''
+        name = rulename(rule)
+        start = time()
+        try:
+            result = rule(graph)
+        finally:
+            __increment__(self.seconds, name, time() - start)
+            __increment__(self.attempts, name, 1)
+        if result:
+            __increment__(self.applications, name, 1)
+        return result
+
+    def timed(self, phase, function, *args):
+        '''Calls `function` with `args` adding the time it takes to the
+        given `phase` (and its memory to `memory`, if any). Returns what
+        the function returns'''
+        if self.memory is not None:
+            function, args = self.memory.phase, (phase, function) + args
+        start = time()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time() - start
+            __increment__(self.phases, phase, elapsed)
+            if self.metrics is not None:
+                self.metrics.histogram('idtd_phase_seconds',
+                                       "Seconds spent in each phase",
+                                       {'phase': phase}).observe(elapsed)
+
+    def observe(self, name, seconds, help=""):
+        'Observes `seconds` in the histogram `name` of `metrics`, if any'
+        if self.metrics is not None:
+            self.metrics.histogram(name, help).observe(seconds)
+
+    def hit(self, cache, hit=True):
+        'Records a hit (or a miss if `hit` is False) of `cache`'
+        if hit:
+            __increment__(self.cachehits, cache, 1)
+        else:
+            __increment__(self.cachemisses, cache, 1)
+
+    def hitrate(self, cache):
+        'Returns the hit rate of `cache`, or None if it was never used'
+        hits = self.cachehits.get(cache, 0)
+        total = hits + self.cachemisses.get(cache, 0)
+        if total:
+            return float(hits) / total
+        return None
+
+    def instrument(self, graph):
+        """
+        Starts counting the calls to `pred`, `succ` and `extents` of
+        `graph`.
+
+        Returns True if the graph was instrumented by this call, and False
+        if it already was (in which case `release` should not be called).
+        """
+        if 'pred' in vars(graph):
+            return False
+        for name in INSTRUMENTED:
+            setattr(graph, name, self.__counted__(name, graph))
+        return True
+
+    def release(self, graph):
+        'Stops counting the calls made to `graph`'
+        for name in INSTRUMENTED:
+            delattr(graph, name)
+
+    def __counted__(self, name, graph):
+        calls, seconds = self.calls, self.callseconds
+        method = getattr(graph, name)
+        def counted(*args):
+            self.hit('extents', graph.cached())
+            start = time()
+            try:
+                return method(*args)
+            finally:
+                __increment__(seconds, name, time() - start)
+                __increment__(calls, name, 1)
+        return counted
+
+    def merge(self, other):
+        'Adds the counters of `other` to this object'
+        for attribute in ('attempts', 'applications', 'seconds', 'calls',
+                          'callseconds', 'phases', 'cachehits',
+                          'cachemisses'):
+            counters = getattr(self, attribute)
+            for key, value in getattr(other, attribute).iteritems():
+                __increment__(counters, key, value)
+        if other.memory is not None:
+            if self.memory is None:
+                self.memory = MemoryStats()
+            self.memory.merge(other.memory)
+        if other.metrics is not None:
+            if self.metrics is None:
+                from inferdtd.Metrics import Registry
+                self.metrics = Registry()
+            self.metrics.merge(other.metrics)
+
+    def summary(self):
+        'Returns the counters as a dict of dicts'
+        rules = {}
+        for name in self.attempts:
+            rules[name] = {'attempts': self.attempts[name],
+                           'applications': self.applications.get(name, 0),
+                           'seconds': self.seconds.get(name, 0.0)}
+        caches = {}
+        for name in set(self.cachehits) | set(self.cachemisses):
+            caches[name] = {'hits': self.cachehits.get(name, 0),
+                            'misses': self.cachemisses.get(name, 0),
+                            'rate': self.hitrate(name)}
+        calls = dict((name, {'calls': count,
+                             'seconds': self.callseconds.get(name, 0.0)})
+                     for name, count in self.calls.iteritems())
+        result = {'rules': rules, 'calls': calls,
+                  'phases': dict(self.phases), 'caches': caches}
+        if self.memory is not None:
+            result['memory'] = self.memory.summary()
+        return result
+
+    def report(self):
+        'Returns a human readable table of the counters'
+        lines = ["%-32s %9s %9s %10s" % ('rule', 'attempts', 'applied',
+                                         'seconds')]
+        for name in sorted(self.attempts, key=lambda x: -self.seconds[x]):
+            lines.append("%-32s %9d %9d %10.3f" % (
+                                name, self.attempts[name],
+                                self.applications.get(name, 0),
+                                self.seconds[name]))
+        for name in sorted(self.calls):
+            lines.append("%-32s %9d %9s %10.3f" % (
+                                name, self.calls[name], '',
+                                self.callseconds.get(name, 0.0)))
+        for name in sorted(set(self.cachehits) | set(self.cachemisses)):
+            lines.append("%-32s %9d %9d %9.1f%%" % (
+                                "cache " + name, self.cachehits.get(name, 0),
+                                self.cachemisses.get(name, 0),
+                                100 * self.hitrate(name)))
+        if self.memory is not None:
+            lines.append(self.memory.report())
+        return "\n".join(lines) + "\n"
+
+
+# The allocation sites kept by `MemoryStats` for each phase or element type
+TOP = 10
+
+# The element types listed by `MemoryStats.report`
+TYPES = 20
+
+
+def rss():
+    '''Returns the resident set size of this process in bytes, or None if
+    it can't be found out'''
+    try:
+        statm = open('/proc/self/statm')
+    except IOError:
+        return None
+    try:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    finally:
+        statm.close()
+
+
+def maxrss():
+    '''Returns the peak resident set size of this process in bytes, or
+    None if it can't be found out'''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on Mac OS X, kilobytes elsewhere
+    if sys.platform != 'darwin':
+        peak *= 1024
+    return peak
+
+
+class MemoryStats(object):
+    """
+    The memory used by each phase and element type.
+
+    `phase` and `elementtype` call a function and record, under the given
+    phase or element type name, the bytes it left allocated (`growth`)
+    and the most bytes it had allocated at once above what was allocated
+    when it was called (`peak`). `phases` and `types` map each name to a
+    dict with those keys and the number of `calls`; growths add up and
+    peaks are the largest. The calls may be nested (the phases of an
+    element type, for instance).
+
+    With `tracemalloc` (Python 3.4 and later), `start` starts tracing the
+    allocations of Python objects and the figures are exact (but for the
+    peaks before Python 3.9, which are those since tracing started); with
+    `top`, a snapshot is taken around every call and the `TOP` source
+    lines that allocated the most are kept in `sites`, by phase or element
+    type.
+
+    Otherwise, the peak and current resident set size of the process are
+    all there is: `peak` is how much a call raised the peak of the
+    process, and `growth` how much the resident set grew (if the system
+    tells, see `rss`). They include the memory not released by the
+    allocator, so they are only upper bounds.
+    """
+    def __init__(self, top=False):
+        self.top = top
+        self.tracing = tracemalloc is not None and tracemalloc.is_tracing()
+        self.phases = {}
+        self.types = {}
+        self.sites = {'phases': {}, 'types': {}}
+        # The peak reached by each call being measured (while tracing; the
+        # peak of the process when it started otherwise), innermost last
+        self.__stack__ = []
+
+    def start(self, frames=1):
+        '''Starts tracing the allocations with `tracemalloc`, if available.
+        Returns True if they are traced'''
+        if tracemalloc is not None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self.tracing = True
+        return self.tracing
+
+    def __usage__(self):
+        '''Returns the bytes allocated now and the most allocated at once
+        (since the last measurement, if `tracemalloc` can tell); traced if
+        tracing, those of the process otherwise'''
+        if self.tracing:
+            return tracemalloc.get_traced_memory()
+        return rss() or 0, maxrss() or 0
+
+    def __measure__(self, attribute, key, function, args):
+        stack = self.__stack__
+        current, peak = self.__usage__()
+        if self.tracing:
+            # The peak of the enclosing call is kept before it's reset
+            if stack:
+                stack[-1] = max(stack[-1], peak)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            peak = current
+        stack.append(peak)
+        snapshot = None
+        if self.top and self.tracing:
+            snapshot = tracemalloc.take_snapshot()
+        try:
+            return function(*args)
+        finally:
+            after, high = self.__usage__()
+            if self.tracing:
+                high = max(high, stack.pop())
+                if stack:
+                    stack[-1] = max(stack[-1], high)
+                if hasattr(tracemalloc, 'reset_peak'):
+                    tracemalloc.reset_peak()
+                high -= current
+            else:
+                # How much the call raised the peak of the process
+                high -= stack.pop()
+            record = getattr(self, attribute).get(key)
+            if record is None:
+                record = getattr(self, attribute)[key] = {
+                            'calls': 0, 'growth': 0, 'peak': 0}
+            record['calls'] += 1
+            record['growth'] += after - current
+            record['peak'] = max(record['peak'], high)
+            if snapshot is not None:
+                self.__sites__(attribute, key, snapshot)
+
+    def __sites__(self, attribute, key, before):
+        '''Adds up the bytes allocated by each source line since the
+        snapshot `before`, keeping the `TOP` lines'''
+        sites = self.sites[attribute].setdefault(key, {})
+        for difference in tracemalloc.take_snapshot().compare_to(before,
+                                                                 'lineno'):
+            if difference.size_diff > 0:
+                __increment__(sites, str(difference.traceback),
+                              difference.size_diff)
+        self.sites[attribute][key] = dict(sorted(sites.items(),
+                                                 key=lambda x: -x[1])[:TOP])
+
+    def phase(self, phase, function, *args):
+        '''Calls `function` with `args` recording its memory under the
+        given `phase`. Returns what the function returns'''
+        return self.__measure__('phases', phase, function, args)
+
+    def elementtype(self, name, function, *args):
+        '''Calls `function` with `args` recording its memory under the
+        element type `name`. Returns what the function returns'''
+        return self.__measure__('types', name, function, args)
+
+    def merge(self, other):
+        'Adds the records of `other` to this object'
+        for attribute in ('phases', 'types'):
+            counters = getattr(self, attribute)
+            for key, theirs in getattr(other, attribute).iteritems():
+                record = counters.setdefault(key, {'calls': 0, 'growth': 0,
+                                                   'peak': 0})
+                record['calls'] += theirs['calls']
+                record['growth'] += theirs['growth']
+                record['peak'] = max(record['peak'], theirs['peak'])
+        for attribute in ('phases', 'types'):
+            for key, theirs in other.sites[attribute].iteritems():
+                sites = self.sites[attribute].setdefault(key, {})
+                for site, size in theirs.iteritems():
+                    __increment__(sites, site, size)
+        self.tracing = self.tracing or other.tracing
+
+    def summary(self):
+        '''Returns the records as a dict: "phases" and "types" as in the
+        attributes, where each record also has its "sites" (a list of
+        `[line, bytes]`, largest first) if they were kept; "source" is
+        "tracemalloc" or "rusage", and "maxrss" is the peak resident set
+        size of this process'''
+        def records(attribute):
+            result = {}
+            sites = self.sites[attribute]
+            for key, record in getattr(self, attribute).iteritems():
+                result[key] = dict(record)
+                if key in sites:
+                    result[key]['sites'] = sorted(
+                        ([site, size] for site, size
+                                      in sites[key].iteritems()),
+                        key=lambda x: -x[1])[:TOP]
+            return result
+        return {'source': self.tracing and 'tracemalloc' or 'rusage',
+                'maxrss': maxrss(),
+                'phases': records('phases'),
+                'types': records('types')}
+
+    def report(self):
+        '''Returns a human readable table of the phases and the `TYPES`
+        element types with the largest peaks'''
+        megabyte = float(1 << 20)
+        lines = ["%-32s %9s %9s %10s" % (
+                    "memory (%s)" % (self.tracing and 'traced' or 'rss'),
+                    'calls', 'growth', 'peak')]
+        types = sorted(self.types.iteritems(), key=lambda x: -x[1]['peak'])
+        for name, record in sorted(self.phases.iteritems()) + \
+                            types[:TYPES]:
+            lines.append("%-32s %9d %8.1fM %9.1fM" % (
+                            name, record['calls'],
+                            record['growth'] / megabyte,
+                            record['peak'] / megabyte))
+        return "\n".join(lines)
@@ -63,11 +63,12 @@ def __optionalrule__(graph):
     def applicable(node):
         '''Tests optional rule could be applied to `node`'''
         if not isinstance(node, Optional) and not isinstance(node, EmptyNode):
-            prednodes = [which for which in graph.pred(node)]
-            succset = graph.succ(node)
+            pred, succ = graph.extents()
+            prednodes = list(pred[node])
+            succset = succ[node]
             result, i = True, 0
             while result and i < len(prednodes):
-                result = succset.issubset(graph.succ(prednodes[i]))
+                result = succset.issubset(succ[prednodes[i]])
                 i += 1
             return result
         else:
@@ -163,13 +164,15 @@ def __disjunctionrule__(graph):
     same `Pred(r)` and `Succ(r)` sets.
     Remove all nodes `r \in W`, and add the Disjunction of all.
     """
+    # The graph isn't changed until the rule is applied
+    pred, succ = graph.extents()
     def disjuntable(node1, node2):
         '''Test whether `node1` and `node2` could be disjuncted'''
         return  node1 != node2 and \
                 not isinstance(node1, EmptyNode) and \
                 not isinstance(node2, EmptyNode) and \
-                graph.pred(node1) == graph.pred(node2) and \
-                graph.succ(node1) == graph.succ(node2)
+                pred[node1] == pred[node2] and \
+                succ[node1] == succ[node2]
 
     for r1 in (which for which in graph.nodes
                       if not isinstance(which, EmptyNode)):
@@ -188,7 +191,10 @@ def __disjunctionrule__(graph):
     return False
 
 
-def rewrite(graph):
+# The rules in the order `rewrite` tries them
+RULES = [__optionalrule__, __selflooprule__, __disjunctionrule__, __concatrule__]
+
+def rewrite(graph, stats=None):
     """
     An implementation of the Rewrite algorithm described in [Bex2006]_
 
@@ -214,11 +220,23 @@ def rewrite(graph):
         Notice this makes an important assumption, though,
         you can't use this implementation with a input graph G
         if G != G*.
+
+    If a `Profile.RuleStats` object is given as `stats`, every rule
+    applied and every Pred/Succ computation is recorded there.
     """
-    proceed = True
-    while proceed and (len(graph) > 3 or len(graph.edges) > 2):
-        proceed = \
-            __optionalrule__(graph) or \
-            __selflooprule__(graph) or \
-            __disjunctionrule__(graph) or \
-            __concatrule__(graph)
+    if stats is None:
+        apply = lambda rule: rule(graph)
+    else:
+        apply = lambda rule: stats.apply(rule, graph)
+        instrumented = stats.instrument(graph)
+    try:
+        proceed = True
+        while proceed and (len(graph) > 3 or len(graph.edges) > 2):
+            proceed = False
+            for rule in RULES:
+                if apply(rule):
+                    proceed = True
+                    break
+    finally:
+        if stats is not None and instrumented:
+            stats.release(graph)
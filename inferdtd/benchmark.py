@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+# $Id$
+
+"""
+Scaling benchmarks for the hot paths of iDTD.
+
+Usage::
+
+    python -m inferdtd.benchmark [options]
+
+Every benchmark is a series: the same operation timed over inputs of
+growing size, produced by the synthetic generators below. All the inputs
+are generated from a fixed seed, so two runs measure exactly the same
+work. A series stops growing as soon as one of its measurements takes more
+than `--budget` seconds, since most of the algorithms involved are
+polynomial and the largest sizes would otherwise never finish.
+
+Results are written as JSON (see `--output`); `--compare` prints the
+ratio against the results of a previous run, so regressions show up
+between versions.
+"""
+
+import sys
+import random
+import platform
+from time import time, strftime
+from optparse import OptionParser
+try:
+    import json
+except ImportError:
+    json = None
+
+from inferdtd.Graph import Graph
+from inferdtd.AutomataInferrer import infer_automata
+from inferdtd.Rewrite import rewrite
+from inferdtd.InferDTD import infer_soa
+from inferdtd.DOM import XmlParser
+from inferdtd.DOM import SymbolTable
+from inferdtd.DOM import SampleStore
+from inferdtd.DOM import SampleCollector
+from inferdtd.DOM import SkeletonSet
+
+SEED = 2006
+
+
+def symbols(size):
+    'Returns an alphabet of `size` element names'
+    return ["e%d" % i for i in xrange(size)]
+
+
+def random_sequences(size, count=1000, length=20, seed=SEED):
+    '''Returns `count` sequences of `length` symbols drawn uniformly from an
+    alphabet of `size` symbols'''
+    generator = random.Random(seed)
+    alphabet = symbols(size)
+    return [[generator.choice(alphabet) for i in xrange(length)]
+            for j in xrange(count)]
+
+
+def encoded(sequences):
+    '''Returns the `sequences` encoded as `array('i')` along with their
+    `SymbolTable`'''
+    table = SymbolTable()
+    return [table.encode(x) for x in sequences], table
+
+
+def chain_sequences(size):
+    '''Returns samples of the chain `e0,e1,...,eN`; the last sample skips
+    `e1` so the chain is not completely trivial'''
+    chain = symbols(size)
+    return [chain, chain[:1] + chain[2:]]
+
+
+def disjunction_sequences(size):
+    'Returns samples of the wide disjunction `(e0|e1|...|eN)`'
+    return [[symbol] for symbol in symbols(size)]
+
+
+def optional_sequences(size, count=40, seed=SEED):
+    '''Returns `count` samples made of `size` blocks; block `i` is one of
+    `ai,bi,ci`, `xi,bi,yi` or `ai,ci`, so every `bi` needs to be made
+    optional by a repair rule'''
+    generator = random.Random(seed)
+    def block(i):
+        a, b, c, x, y = ["%s%d" % (name, i) for name in "abcxy"]
+        return generator.choice([[a, b, c], [x, b, y], [a, c]])
+    return [sum((block(i) for i in xrange(size)), [])
+            for j in xrange(count)]
+
+
+def deep_document(depth, breadth=2):
+    '''Returns an XML document `depth` levels deep, where every level has
+    `breadth` leaves before the element holding the next level'''
+    leaves = "".join("<leaf%d/>" % i for i in xrange(breadth))
+    return "%s%s" % ("".join("<level>%s" % leaves for i in xrange(depth)),
+                     "</level>" * depth)
+
+
+def wide_document(size, seed=SEED):
+    '''Returns an XML document listing `size` records with a random but
+    reproducible structure'''
+    generator = random.Random(seed)
+    records = []
+    for i in xrange(size):
+        fields = ["<title/>"]
+        if generator.random() < 0.5:
+            fields.append("<author/>" * generator.randint(1, 3))
+        fields.append(generator.choice(["<uri/>", "<id/>"]))
+        records.append("<record n=\"%d\">%s</record>" % (i, "".join(fields)))
+    return "<listing>%s</listing>" % "".join(records)
+
+
+def collect(data, symbols, subtrees=False):
+    '''Collects the samples of the XML `data` interning the names in
+    `symbols`, and sharing the equal subtrees if `subtrees` is True'''
+    SampleCollector(SampleStore(symbols), symbols,
+                    subtrees=subtrees).parse(data)
+
+
+def repetitive_documents(size, distinct=10):
+    '''Returns `size` small documents, with only `distinct` different
+    structures among them'''
+    return [wide_document(50, seed=i % distinct) for i in xrange(size)]
+
+
+def collect_all(documents, skeletons=None):
+    '''Collects the samples of all the `documents` with a single collector,
+    skipping repeated skeletons if a `SkeletonSet` is given'''
+    collector = SampleCollector(SampleStore(), skeletons=skeletons)
+    for document in documents:
+        collector.parse(document)
+
+
+# Each series is (name, sizes, setup, run): `setup(size)` returns the
+# arguments for `run`, and is not timed.
+SERIES = [
+    ('infer_automata/random', [10, 50, 100, 500, 1000, 5000],
+        random_sequences, infer_automata),
+    ('infer_automata/chain', [10, 100, 1000, 5000],
+        chain_sequences, infer_automata),
+    ('infer_automata/random-encoded', [10, 50, 100, 500, 1000, 5000],
+        lambda size: encoded(random_sequences(size)),
+        lambda args: infer_automata(*args)),
+    ('infer_automata/chain-encoded', [10, 100, 1000, 5000],
+        lambda size: encoded(chain_sequences(size)),
+        lambda args: infer_automata(*args)),
+    ('infer_automata/samples-encoded', [1000, 10000, 100000, 500000],
+        lambda size: encoded(random_sequences(50, count=size)),
+        lambda args: infer_automata(*args)),
+    ('rewrite/chain', [10, 50, 100, 500, 1000],
+        lambda size: infer_automata(chain_sequences(size)), rewrite),
+    ('rewrite/disjunction', [10, 50, 100, 500, 1000],
+        lambda size: infer_automata(disjunction_sequences(size)), rewrite),
+    ('infer_soa/random', [10, 20, 50, 100, 500, 1000, 5000],
+        lambda size: infer_automata(random_sequences(size, count=50)),
+        infer_soa),
+    ('infer_soa/chain', [10, 50, 100, 500, 1000],
+        lambda size: infer_automata(chain_sequences(size)), infer_soa),
+    ('infer_soa/disjunction', [10, 50, 100, 500, 1000],
+        lambda size: infer_automata(disjunction_sequences(size)), infer_soa),
+    ('infer_soa/optional', [1, 5, 10, 20, 50],
+        lambda size: infer_automata(optional_sequences(size)), infer_soa),
+    ('parse/deep', [10, 100, 1000, 10000],
+        deep_document, lambda data: XmlParser().parse(data)),
+    ('parse/wide', [100, 1000, 10000, 100000],
+        wide_document, lambda data: XmlParser().parse(data)),
+    ('collect/deep', [10, 100, 1000, 10000],
+        deep_document, lambda data: SampleCollector(SampleStore()).parse(data)),
+    ('collect/wide', [100, 1000, 10000, 100000, 1000000],
+        wide_document, lambda data: SampleCollector(SampleStore()).parse(data)),
+    ('collect/wide-interned', [100, 1000, 10000, 100000, 1000000],
+        wide_document, lambda data: collect(data, SymbolTable())),
+    ('collect/wide-subtrees', [100, 1000, 10000, 100000, 1000000],
+        wide_document, lambda data: collect(data, SymbolTable(), True)),
+    ('collect/repetitive', [100, 1000, 10000],
+        repetitive_documents, collect_all),
+    ('collect/repetitive-skeletons', [100, 1000, 10000],
+        repetitive_documents,
+        lambda documents: collect_all(documents, SkeletonSet(100))),
+]
+
+
+def measure(setup, run, size, repeat=3):
+    '''Returns the best time, in seconds, out of `repeat` runs of `run`
+    over the input built by `setup(size)`'''
+    best = None
+    for i in xrange(repeat):
+        argument = setup(size)
+        start = time()
+        run(argument)
+        elapsed = time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def runseries(series, repeat=3, budget=10.0, report=None):
+    '''Runs the benchmark `series` and returns the list of results. Each
+    result is a dict with the keys "benchmark", "size" and "seconds".'''
+    results = []
+    for name, sizes, setup, run in series:
+        for size in sizes:
+            seconds = measure(setup, run, size, repeat)
+            result = {'benchmark': name, 'size': size, 'seconds': seconds}
+            results.append(result)
+            if report is not None:
+                report(result)
+            if seconds > budget:
+                break
+    return results
+
+
+def compare(results, previous):
+    '''Yields `(benchmark, size, seconds, ratio)` for every result also found
+    in the `previous` results; ratio > 1 means slower than before'''
+    before = dict(((x['benchmark'], x['size']), x['seconds'])
+                  for x in previous)
+    for result in results:
+        key = (result['benchmark'], result['size'])
+        if key in before and before[key] > 0:
+            yield key + (result['seconds'], result['seconds'] / before[key])
+
+
+def main(arguments=None):
+    'Runs the benchmarks from the command line'
+    options = OptionParser(usage="%prog [options]")
+    options.add_option("-o", "--output", default="benchmark.json",
+                       help="file to write the results to [default: %default]")
+    options.add_option("-c", "--compare", metavar="FILE",
+                       help="compare against the results in FILE")
+    options.add_option("-k", "--select", metavar="PREFIX", action="append",
+                       help="run only the series starting with PREFIX")
+    options.add_option("-r", "--repeat", type="int", default=3,
+                       help="runs per measurement [default: %default]")
+    options.add_option("-b", "--budget", type="float", default=10.0,
+                       help="seconds after which a series stops growing "
+                            "[default: %default]")
+    parser = options
+    options, arguments = options.parse_args(arguments)
+    if json is None:
+        parser.error("the json module is required")
+
+    series = [x for x in SERIES
+                if not options.select or
+                   [p for p in options.select if x[0].startswith(p)]]
+    report = lambda result: sys.stderr.write(
+                "%(benchmark)-25s %(size)8d %(seconds)12.6fs\n" % result)
+    results = runseries(series, options.repeat, options.budget, report)
+
+    output = open(options.output, 'w')
+    try:
+        json.dump({'date': strftime("%Y-%m-%dT%H:%M:%S"),
+                   'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'seed': SEED,
+                   'repeat': options.repeat,
+                   'results': results}, output, indent=2, sort_keys=True)
+    finally:
+        output.close()
+
+    if options.compare:
+        previous = json.load(open(options.compare))['results']
+        for name, size, seconds, ratio in compare(results, previous):
+            sys.stdout.write("%-25s %8d %12.6fs %7.2fx\n" % (name, size,
+                                                             seconds, ratio))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
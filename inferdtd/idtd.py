@@ -0,0 +1,592 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+# $Id$
+
+"""
+The `idtd` command: infers a DTD from a corpus of XML documents.
+
+Usage::
+
+    idtd [options] [FILE|DIRECTORY|-]...
+
+Each file is streamed through a `DOM.SampleCollector` which interns the
+element names as integers and counts the equal subtrees of a document
+instead of handing each one over; directories are walked looking for
+"*.xml" files, and "-" (or no argument at all) stands for the standard
+input. All documents are expected to share the same root element type.
+
+With `--jobs N`, both the parsing of the files and the inference of the
+content models of the element types are spread over a pool of N worker
+processes.
+
+Content models are inferred with iDTD unless told otherwise: `--crx NAME`
+selects the (faster, less precise) CRX engine for the element type NAME,
+and `--crx-above N` selects it for every element type with more than N
+distinct child sequences.
+
+With `--incremental`, the documents are read one at a time and each
+sample is first checked against the content model inferred so far; only
+the element types with non-conforming samples are inferred again.
+
+With `--memory MB`, the distinct child sequences kept in memory are held
+to about MB megabytes: beyond that, those of the element types that least
+recently got a new one are spilled to temporary files (see
+`DOM.SampleStore`), and read back one element type at a time for the
+inference: merged into a run of distinct sequences, which is then read
+sequentially (unless with `--jobs`, whose workers get them all at once).
+
+With `--listen PATH`, the documents are not read from files: each one
+is sent through a connection to the Unix socket PATH. The connections are
+served concurrently by a `Feeder.FeedServer`, which feeds each document to
+an `IncrementalInferrer` as it arrives (the samples of each document once
+it is complete). The content models are inferred whenever no stream is
+open, and every `REINFER` seconds while some are; the DTD is
+written once `--documents N` documents were read, or when interrupted.
+
+With `--saturation N`, the samples of an element type stop being collected
+once N of them in a row add no edge to its automaton; `--stop-saturated`
+stops reading altogether when every element type is saturated. Both trade
+the exact sample counts (and, when stopping, the rest of the corpus) for
+speed. So does `--skeletons N`, which drops the samples of the documents
+with the same structure as one of the last N documents read (by each
+worker process).
+
+With `--trace-memory FILE`, the memory used by each phase and by the
+inference of each element type is written to FILE as JSON (see
+`Profile.MemoryStats`): traced with `tracemalloc` where available, and
+measured on the resident set of the processes otherwise. With
+`--trace-memory-top` too, the source lines that allocated the most in
+each phase and element type are written as well (this needs `tracemalloc`,
+and taking the snapshots is slow).
+
+With `--exemplars FILE`, the first place where each edge of the 2T-INF
+automata was found (the file, and the byte offset and line of the start
+tag of the sample) is written to FILE; see `DOM.ExemplarIndex`. Only the
+new edges are recorded, so the index is as small as the automata.
+
+Malformed documents are reported on the standard error (as "path: error")
+and skipped: the DTD of the others is written all the same, but the exit
+status is 1. Documents whose root element types differ can't be described
+by a single DTD, so they stop the run (with exit status 2) and no DTD is
+written.
+
+With `--metrics TARGET`, live throughput metrics (documents, bytes and
+elements read, element types pending inference, and the duration of each
+phase and of each `infer_soa` call) are exported in the Prometheus text
+format while the program runs; see `Metrics`. TARGET is either a file,
+rewritten every `--metrics-interval` seconds, or an address ("HOST:PORT",
+or ":PORT") served over HTTP.
+"""
+
+import os
+import sys
+from time import time
+from functools import partial
+from itertools import chain, imap
+from optparse import OptionParser
+from xml.parsers import expat
+try:
+    import json
+except ImportError:
+    json = None
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from inferdtd.DOM import SampleStore
+from inferdtd.DOM import SymbolTable
+from inferdtd.DOM import SampleCollector
+from inferdtd.DOM import SkeletonSet
+from inferdtd.DOM import ExemplarIndex
+from inferdtd.DOM import UnmergeableDocuments
+from inferdtd.Profile import RuleStats
+from inferdtd.Profile import MemoryStats
+from inferdtd.Metrics import Registry
+from inferdtd.Metrics import INTERVAL
+from inferdtd.Metrics import exporter
+from inferdtd.DTDInferrer import ENGINES
+from inferdtd.DTDInferrer import infer_contentmodel
+from inferdtd.DTDInferrer import render_dtd
+from inferdtd.DTDInferrer import localname
+from inferdtd.DTDInferrer import IncrementalInferrer
+from inferdtd.Feeder import FeedServer
+
+# The phases reported by --timing, in the order they happen
+PHASES = ('parse', 'automaton', 'rewrite', 'repair', 'crx')
+
+# The help of the gauge of the element types waiting for their inference
+PENDING = "Element types pending (re-)inference"
+
+# The seconds between inferences with --listen, while streams are read
+REINFER = 1.0
+
+
+def __sources__(arguments):
+    '''Yields the files to parse given the command line `arguments`'''
+    for argument in arguments or ['-']:
+        if os.path.isdir(argument):
+            for path, directories, files in os.walk(argument):
+                directories.sort()
+                for name in sorted(files):
+                    if name.endswith('.xml'):
+                        yield os.path.join(path, name)
+        else:
+            yield argument
+
+
+# The `SkeletonSet` of this process, by size
+__skeletonsets__ = {}
+
+def __skeletonset__(size):
+    '''Returns the `SkeletonSet` of the given `size` shared by all the
+    documents parsed in this process, or None if `size` is None'''
+    if size is None:
+        return None
+    if size not in __skeletonsets__:
+        __skeletonsets__[size] = SkeletonSet(size)
+    return __skeletonsets__[size]
+
+
+def __memorystats__(top):
+    '''Returns a `MemoryStats` for a worker, keeping the allocation sites
+    if `top` is True; or None if `top` is None, when the memory is not
+    traced'''
+    if top is None:
+        return None
+    return MemoryStats(top)
+
+
+def __parse__(source, saturation=None, stop=False, skeletons=None,
+              exemplars=False, memory=None, metrics=False):
+    '''Parses the file `source` (or the standard input if `source` is "-").
+    Returns `source`, the root element type, a `SampleStore` with the
+    samples, a
+    `RuleStats` with the time taken (and the memory used, unless `memory`
+    is None, see `__memorystats__`; and a `Metrics.Registry` of what was
+    read, if `metrics` is True) and, if `exemplars` is True, an
+    `ExemplarIndex` of the samples (or None). `saturation` and `stop` are
+    handed to the `SampleCollector`; if `skeletons` is given, the documents
+    whose skeleton is among the last `skeletons` seen by this process are
+    skipped. The last item is None, or the message of the
+    `expat.ExpatError` if the document is malformed (and then there's no
+    root, store nor index).'''
+    stats = RuleStats(__memorystats__(memory),
+                      metrics and Registry() or None)
+    store = SampleStore(SymbolTable())
+    index = None
+    if exemplars:
+        index = ExemplarIndex(store.symbols)
+        index.begin(source)
+    # Equal subtrees are only counted, unless the samples must reach the
+    # saturation state as soon as they are closed
+    collector = SampleCollector(store, store.symbols, saturation, stop,
+                                __skeletonset__(skeletons),
+                                subtrees=saturation is None,
+                                exemplars=index, metrics=stats.metrics)
+    def parse():
+        if source == '-':
+            collector.parsefile(sys.stdin)
+        else:
+            file = open(source, 'rb')
+            try:
+                collector.parsefile(file)
+            finally:
+                file.close()
+    try:
+        stats.timed('parse', parse)
+    except expat.ExpatError, error:
+        return source, None, None, stats, None, str(error)
+    root = collector.root
+    if skeletons is not None:
+        stats.hit('skeletons', collector.duplicates > 0)
+    return source, root, store, stats, index, None
+
+
+def __malformed__(errors, source, error):
+    'Reports that the document `source` is malformed, adding it to `errors`'
+    sys.stderr.write("%s: %s\n" % (source, error))
+    errors.append((source, error))
+
+
+def __checkroot__(root, source, docroot):
+    '''Returns the root element type of the documents read so far, `root`,
+    or `docroot` if it's the first one. Raises `UnmergeableDocuments` if
+    the root of `source`, `docroot`, is another one'''
+    if root is None:
+        return docroot
+    if docroot is not None and docroot != root:
+        raise UnmergeableDocuments("%s: the root element type is %s, "
+                                   "not %s" % (source, docroot, root))
+    return root
+
+
+def __infer__(job):
+    '''Infers the content model of an element type. `job` is the tuple
+    `(name, sequences, engine, symbols, memory, metrics)`. Returns the
+    name, the content model and the `RuleStats` of the inference, with the
+    memory used unless `memory` is None (see `__memorystats__`) and a
+    `Metrics.Registry` of the time taken if `metrics` is True'''
+    name, sequences, engine, symbols, memory, metrics = job
+    stats = RuleStats(__memorystats__(memory),
+                      metrics and Registry() or None)
+    if stats.memory is not None:
+        model = stats.memory.elementtype(name, infer_contentmodel, sequences,
+                                         stats, engine, symbols)
+    else:
+        model = infer_contentmodel(sequences, stats, engine, symbols)
+    return name, model, stats
+
+
+def __dumpexemplars__(path, exemplars):
+    'Writes the edges recorded in the `ExemplarIndex` `exemplars` to `path`'
+    output = open(path, 'wb')
+    try:
+        exemplars.dump(output)
+    finally:
+        output.close()
+
+
+def __batch__(options, sources, stats, errors, pool=None):
+    '''Parses all the `sources` and then infers the content models of all
+    the element types, in the worker processes of `pool` if given. Returns
+    the DTD. The malformed sources are skipped, and added to `errors`'''
+    # Lazily, so each document is merged (and its store dropped) before
+    # the next one is parsed
+    mapper = pool and pool.imap_unordered or imap
+    budget = None
+    if options.memory is not None:
+        budget = options.memory << 20
+    store = SampleStore(SymbolTable(), budget)
+    # Whether the workers keep the allocation sites, if they trace memory
+    top = None
+    if stats.memory is not None:
+        top = stats.memory.top
+    try:
+        root = None
+        exemplars = None
+        if options.exemplars:
+            exemplars = ExemplarIndex()
+        parse = partial(__parse__, saturation=options.saturation,
+                        stop=options.stop_saturated,
+                        skeletons=options.skeletons,
+                        exemplars=exemplars is not None,
+                        memory=top,
+                        metrics=stats.metrics is not None)
+        # The standard input can't be handed to a worker
+        parsed = mapper(parse, [x for x in sources if x != '-'])
+        if '-' in sources:
+            parsed = chain(parsed, imap(parse, ['-']))
+        for source, docroot, docstore, docstats, docindex, error in parsed:
+            stats.merge(docstats)
+            if error is not None:
+                __malformed__(errors, source, error)
+                continue
+            root = __checkroot__(root, source, docroot)
+            stats.timed('merge', store.merge, docstore)
+            if exemplars is not None:
+                exemplars.merge(docindex)
+        if exemplars is not None:
+            __dumpexemplars__(options.exemplars, exemplars)
+
+        def jobs():
+            # The sequences are read (from disk, if spilled) as needed; in
+            # this process, those spilled are even streamed into the
+            # inference. The others are handed over as lists, which
+            # `infer_automata` may read in bulk
+            spilled = set(store.spilled())
+            for name in store.names():
+                engine = options.engine
+                if localname(name) in options.crx or name in options.crx or \
+                   (options.crx_above is not None and
+                    store.distinct(name) > options.crx_above):
+                    engine = 'crx'
+                if pool is None and name in spilled:
+                    sequences = store.itersequences(name)
+                else:
+                    sequences = store.sequences(name)
+                yield (name, sequences, engine, store.symbols,
+                       top, stats.metrics is not None)
+        models = {}
+        pending = None
+        if stats.metrics is not None:
+            pending = stats.metrics.gauge('idtd_pending_types', PENDING)
+            pending.set(len(store.names()))
+        for name, model, jobstats in mapper(__infer__, jobs()):
+            models[name] = model
+            stats.merge(jobstats)
+            if pending is not None:
+                pending.set(len(store.names()) - len(models))
+        if options.timing and options.memory is not None:
+            sys.stderr.write("%-10s %9d\n" % ('spills', store.spills))
+    finally:
+        store.close()
+    return stats.timed('render', render_dtd, root, store, models)
+
+
+def __incremental__(options, sources, stats, errors):
+    '''Streams the `sources` one by one through an `IncrementalInferrer`,
+    so only the samples that don't conform to the content models inferred
+    so far cause any inference. Returns the DTD. The malformed sources are
+    skipped, and added to `errors` (with `--saturation` the samples closed
+    before the error was found are kept, though)'''
+    inferrer = IncrementalInferrer(options.engine,
+                                   dict((name, 'crx') for name in options.crx))
+    exemplars = None
+    if options.exemplars:
+        exemplars = ExemplarIndex()
+    collector = SampleCollector(inferrer, saturation=options.saturation,
+                                stop=options.stop_saturated,
+                                skeletons=__skeletonset__(options.skeletons),
+                                subtrees=options.saturation is None,
+                                exemplars=exemplars, metrics=stats.metrics)
+    if stats.metrics is not None:
+        stats.metrics.gauge('idtd_pending_types', PENDING,
+                            function=lambda: len(inferrer.pending))
+    root = None
+    for source in sources:
+        if collector.stopped:
+            break
+        if exemplars is not None:
+            exemplars.begin(source)
+        duplicates = collector.duplicates
+        try:
+            if source == '-':
+                stats.timed('parse', collector.parsefile, sys.stdin)
+            else:
+                file = open(source, 'rb')
+                try:
+                    stats.timed('parse', collector.parsefile, file)
+                finally:
+                    file.close()
+        except expat.ExpatError, error:
+            __malformed__(errors, source, str(error))
+        else:
+            if options.skeletons is not None:
+                stats.hit('skeletons', collector.duplicates > duplicates)
+            root = __checkroot__(root, source, collector.root)
+        inferrer.reinfer(stats)
+    if options.timing:
+        sys.stderr.write("%-10s %9d\n%-10s %9d\n" % (
+                            'accepted', inferrer.accepted,
+                            'rejected', inferrer.rejected))
+    if exemplars is not None:
+        __dumpexemplars__(options.exemplars, exemplars)
+    return inferrer.dtd(root)
+
+
+def __listen__(options, stats):
+    '''Infers the content models of the documents sent to the Unix socket
+    `options.listen` with an `IncrementalInferrer`, until
+    `options.documents` were read or the process is interrupted. Returns
+    the DTD'''
+    inferrer = IncrementalInferrer(options.engine,
+                                   dict((name, 'crx') for name in options.crx))
+    class Server(FeedServer):
+        due = 0.0
+        def handle_document(self, collector, error):
+            FeedServer.handle_document(self, collector, error)
+            if error is not None:
+                sys.stderr.write("malformed document: %s\n" % error)
+        def poll(self, timeout=0.0):
+            FeedServer.poll(self, timeout)
+            # Infer once no stream is open, or every REINFER seconds while
+            # they keep coming, rather than after every document
+            if inferrer.pending and (not len(self) or time() >= self.due):
+                inferrer.reinfer(stats)
+                self.due = time() + REINFER
+    # Subtrees, so a producer gone in the middle of a document leaves no
+    # samples behind
+    server = Server(inferrer, options.listen,
+                    saturation=options.saturation, subtrees=True,
+                    metrics=stats.metrics)
+    if stats.metrics is not None:
+        stats.metrics.gauge('idtd_pending_types', PENDING,
+                            function=lambda: len(inferrer.pending))
+    try:
+        try:
+            server.serve(options.documents)
+        except KeyboardInterrupt:
+            pass
+    finally:
+        server.close()
+    inferrer.reinfer(stats)
+    if options.timing:
+        sys.stderr.write("%-10s %9d\n%-10s %9d\n" % (
+                            'documents', server.documents,
+                            'malformed', len(server.errors)))
+    return inferrer.dtd(server.root)
+
+
+def main(arguments=None):
+    'Entry point of the `idtd` command'
+    options = OptionParser(usage="%prog [options] [FILE|DIRECTORY|-]...")
+    options.add_option("-j", "--jobs", type="int", default=1,
+                       help="number of worker processes [default: %default]")
+    options.add_option("-o", "--output", default="-",
+                       help="file to write the DTD to [default: stdout]")
+    options.add_option("-e", "--engine", type="choice", choices=ENGINES,
+                       default="soa",
+                       help="default inference engine: %s [default: %%default]"
+                            % ", ".join(ENGINES))
+    options.add_option("--crx", metavar="NAME", action="append", default=[],
+                       help="use CRX for the element type NAME")
+    options.add_option("--crx-above", metavar="N", type="int",
+                       help="use CRX for the element types with more than "
+                            "N distinct child sequences")
+    options.add_option("-i", "--incremental", action="store_true",
+                       default=False,
+                       help="infer while reading the documents, skipping "
+                            "the samples that already conform")
+    options.add_option("--saturation", metavar="N", type="int",
+                       help="stop collecting the samples of an element type "
+                            "after N samples in a row add nothing to its "
+                            "automaton")
+    options.add_option("--stop-saturated", action="store_true",
+                       default=False,
+                       help="stop parsing once every element type is "
+                            "saturated (requires --saturation)")
+    options.add_option("--skeletons", metavar="N", type="int",
+                       help="skip the documents with the same structure as "
+                            "one of the last N documents read")
+    options.add_option("--memory", metavar="MB", type="int",
+                       help="spill the samples of the least recently grown "
+                            "element types to disk beyond MB megabytes")
+    options.add_option("--exemplars", metavar="FILE",
+                       help="write where each edge of the automata was "
+                            "first found to FILE")
+    options.add_option("--listen", metavar="PATH",
+                       help="read the documents sent to the Unix socket "
+                            "PATH, one per connection, instead of files")
+    options.add_option("--documents", metavar="N", type="int",
+                       help="with --listen, stop after N documents "
+                            "[default: when interrupted]")
+    options.add_option("-t", "--timing", action="store_true", default=False,
+                       help="print per-phase timings to stderr")
+    options.add_option("-p", "--profile", action="store_true", default=False,
+                       help="print per-rule counters and timings to stderr")
+    options.add_option("--trace-memory", metavar="FILE",
+                       help="record the memory used by each phase and "
+                            "element type, and write it to FILE as JSON")
+    options.add_option("--trace-memory-top", action="store_true",
+                       default=False,
+                       help="with --trace-memory, also write the source "
+                            "lines that allocated the most (requires "
+                            "tracemalloc)")
+    options.add_option("--metrics", metavar="TARGET",
+                       help="export live metrics in the Prometheus text "
+                            "format to the file TARGET, or over HTTP if "
+                            "TARGET is HOST:PORT or :PORT")
+    options.add_option("--metrics-interval", metavar="SECONDS",
+                       type="float", default=INTERVAL,
+                       help="seconds between two writes of the --metrics "
+                            "file [default: %default]")
+    parser = options
+    options, arguments = options.parse_args(arguments)
+    if options.incremental and (options.jobs > 1 or
+                                options.crx_above is not None or
+                                options.memory is not None):
+        parser.error("--incremental can't be used with --jobs, --crx-above "
+                     "or --memory")
+    if options.stop_saturated and options.saturation is None:
+        parser.error("--stop-saturated requires --saturation")
+    if options.trace_memory_top and not options.trace_memory:
+        parser.error("--trace-memory-top requires --trace-memory")
+    if options.trace_memory_top and tracemalloc is None:
+        parser.error("--trace-memory-top requires the tracemalloc module")
+    if options.listen and (arguments or options.jobs > 1 or
+                           options.crx_above is not None or
+                           options.stop_saturated or
+                           options.skeletons is not None or
+                           options.memory is not None or
+                           options.exemplars is not None):
+        parser.error("--listen can't be used with files, --jobs, "
+                     "--crx-above, --stop-saturated, --skeletons, "
+                     "--memory or --exemplars")
+
+    start = time()
+    sources = list(__sources__(arguments))
+    stats = RuleStats()
+    if options.trace_memory:
+        if json is None:
+            parser.error("--trace-memory requires the json module")
+        stats.memory = MemoryStats(options.trace_memory_top)
+        stats.memory.start()
+    pool = None
+    if options.jobs > 1:
+        from multiprocessing import Pool
+        pool = Pool(options.jobs)
+    metrics = None
+    errors = []
+    try:
+        if options.metrics:
+            stats.metrics = Registry()
+            # Started after the workers are forked, so they don't hold its
+            # socket
+            metrics = exporter(stats.metrics, options.metrics,
+                               options.metrics_interval)
+        if options.listen:
+            dtd = __listen__(options, stats)
+        elif options.incremental:
+            dtd = __incremental__(options, sources, stats, errors)
+        else:
+            dtd = __batch__(options, sources, stats, errors, pool)
+    except UnmergeableDocuments, error:
+        sys.stderr.write("%s\n" % error)
+        return 2
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if metrics is not None:
+            metrics.stop()
+
+    if options.output == '-':
+        sys.stdout.write(dtd.encode('utf-8'))
+    else:
+        output = open(options.output, 'wb')
+        try:
+            output.write(dtd.encode('utf-8'))
+        finally:
+            output.close()
+
+    if options.timing:
+        for phase in PHASES:
+            sys.stderr.write("%-10s %9.3fs\n" % (phase,
+                                                 stats.phases.get(phase, 0.0)))
+        sys.stderr.write("%-10s %9.3fs\n" % ('total', time() - start))
+    if options.profile:
+        sys.stderr.write(stats.report())
+    if options.trace_memory:
+        output = open(options.trace_memory, 'w')
+        try:
+            json.dump(stats.memory.summary(), output, indent=2,
+                      sort_keys=True)
+        finally:
+            output.close()
+    if errors:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
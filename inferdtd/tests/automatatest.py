@@ -21,8 +21,11 @@
 
 import unittest
 from inferdtd.AutomataInferrer import infer_automata
+from inferdtd.AutomataInferrer import extend_automata
 from inferdtd.AutomataInferrer import StartNode
 from inferdtd.AutomataInferrer import EndNode
+from inferdtd.DOM import SymbolTable
+from inferdtd import AutomataInferrer
 
 class InferenceTest(unittest.TestCase):
     def setUp(self):
@@ -46,5 +49,31 @@ class InferenceTest(unittest.TestCase):
         self.assert_(("e", EndNode) in self.graph.edges)
         self.assertEqual(len(self.graph.edges), 11) # Those 11 edges
 
+    def testExtension(self):
+        self.assertEqual(extend_automata(self.graph, "bacde"), False)
+        self.assertEqual(extend_automata(self.graph, "bae"), True)
+        self.assert_(("a", "e") in self.graph.edges)
+        self.assertEqual(len(self.graph.edges), 12)
+
+class EncodedInferenceTest(unittest.TestCase):
+    def testSameAsNames(self):
+        samples = ["bacacdacde", "cbacdbacde", ""]
+        table = SymbolTable()
+        graph = infer_automata([table.encode(x) for x in samples], table)
+        expected = infer_automata(samples)
+        self.assertEqual(graph.nodes, expected.nodes)
+        self.assertEqual(sorted(graph.edges), sorted(expected.edges))
+
+    def testBulk(self):
+        if AutomataInferrer.numpy is None:
+            return
+        samples = ["bacacdacde", "cbacdbacde", "", "e"]
+        table = SymbolTable()
+        encoded = [table.encode(x) for x in samples]
+        graph = AutomataInferrer.__infer_bulk__(encoded, table)
+        expected = AutomataInferrer.__infer_encoded__(encoded, table)
+        self.assertEqual(graph.nodes, expected.nodes)
+        self.assertEqual(graph.edges, expected.edges)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import unittest
+from inferdtd.DOM import XmlParser
+from inferdtd.benchmark import random_sequences
+from inferdtd.benchmark import chain_sequences
+from inferdtd.benchmark import disjunction_sequences
+from inferdtd.benchmark import deep_document
+from inferdtd.benchmark import wide_document
+from inferdtd.benchmark import runseries
+from inferdtd.benchmark import compare
+
+class GeneratorsTests(unittest.TestCase):
+    def testReproducible(self):
+        self.assertEqual(random_sequences(10, 5), random_sequences(10, 5))
+        self.assertEqual(wide_document(10), wide_document(10))
+
+    def testRandomSequences(self):
+        sequences = random_sequences(10, count=5, length=7)
+        self.assertEqual(len(sequences), 5)
+        self.assert_(all(len(x) == 7 for x in sequences))
+        self.assert_(len(set(sum(sequences, []))) <= 10)
+
+    def testShapes(self):
+        self.assertEqual(len(chain_sequences(10)[0]), 10)
+        self.assertEqual(len(disjunction_sequences(10)), 10)
+        root, elements = XmlParser().parse(deep_document(5, breadth=3))
+        self.assertEqual(len(elements['level']), 5)
+        self.assertEqual(len(elements['leaf2']), 5)
+        root, elements = XmlParser().parse(wide_document(20))
+        self.assertEqual(len(elements['record']), 20)
+
+class RunnerTests(unittest.TestCase):
+    def testBudget(self):
+        series = [('noop', [1, 2, 3], lambda size: size, lambda x: None)]
+        results = runseries(series, repeat=1)
+        self.assertEqual([x['size'] for x in results], [1, 2, 3])
+        results = runseries(series, repeat=1, budget=-1)
+        self.assertEqual([x['size'] for x in results], [1])
+
+    def testCompare(self):
+        before = [{'benchmark': 'a', 'size': 1, 'seconds': 2.0}]
+        after = [{'benchmark': 'a', 'size': 1, 'seconds': 1.0},
+                 {'benchmark': 'b', 'size': 1, 'seconds': 1.0}]
+        self.assertEqual(list(compare(after, before)), [('a', 1, 1.0, 0.5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+from inferdtd.idtd import main
+
+class CommandTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, "out.dtd")
+        self.stderr = sys.stderr
+        sys.stderr = StringIO()
+
+    def tearDown(self):
+        sys.stderr = self.stderr
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        output = open(path, 'wb')
+        output.write(data)
+        output.close()
+        return path
+
+    def testMalformed(self):
+        paths = [self.write("1.xml", "<a><b/><c/></a>"),
+                 self.write("2.xml", "<a><b>"),
+                 self.write("3.xml", "<a><b/></a>")]
+        for options in ([], ['-i']):
+            sys.stderr.truncate(0)
+            self.assertEqual(main(options + ['-o', self.output] + paths), 1)
+            self.assert_(sys.stderr.getvalue().startswith(paths[1] + ": "))
+            self.assert_("<!ELEMENT a (b,c?)>" in open(self.output).read())
+
+    def testRoots(self):
+        paths = [self.write("1.xml", "<a><b/></a>"),
+                 self.write("2.xml", "<z/>")]
+        for options in ([], ['-i']):
+            sys.stderr.truncate(0)
+            self.assertEqual(main(options + ['-o', self.output] + paths), 2)
+            self.assertEqual(sys.stderr.getvalue(),
+                             "%s: the root element type is z, not a\n"
+                             % paths[1])
+
+    def testTraceMemoryTop(self):
+        from inferdtd import idtd
+        path = self.write("1.xml", "<a/>")
+        options = ['-o', self.output, '--trace-memory-top', path]
+        self.assertRaises(SystemExit, main, options)
+        self.assert_("requires --trace-memory" in sys.stderr.getvalue())
+        sys.stderr.truncate(0)
+        options[:0] = ['--trace-memory', os.path.join(self.directory, "m")]
+        if idtd.tracemalloc is None:
+            self.assertRaises(SystemExit, main, options)
+            self.assert_("requires the tracemalloc module"
+                         in sys.stderr.getvalue())
+        else:
+            self.assertEqual(main(options), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import unittest
+from inferdtd.DOM import SymbolTable
+from inferdtd.RE import Repeat
+from inferdtd.RE import Kleene
+from inferdtd.RE import Optional
+from inferdtd.RE import Conjunction
+from inferdtd.RE import Disjunction
+from inferdtd.AutomataInferrer import infer_automata
+from inferdtd.CRX import CRX
+from inferdtd.CRX import infer_crx
+from inferdtd.DTDInferrer import infer_contentmodel
+
+class CRXTests(unittest.TestCase):
+    def testFigure2(self):
+        # Strings in Figure 2 of [Bex2006]
+        expected = Conjunction([Repeat(Disjunction(list("abcd"))), 'e'])
+        samples = ["bacacdacde", "cbacdbacde"]
+        self.assertEqual(CRX(samples), expected)
+        self.assertEqual(infer_crx(infer_automata(samples)), expected)
+
+    def testCycle(self):
+        self.assertEqual(CRX(["abc", "bca", "cab"]),
+                         Repeat(Disjunction(list("abc"))))
+
+    def testMultiplicities(self):
+        self.assertEqual(CRX(["ab", "abb", ""]),
+                         Conjunction([Optional('a'), Kleene('b')]))
+        self.assertEqual(CRX(["abcd", "acd", "abd"]),
+                         Conjunction(['a', Optional('b'), Optional('c'), 'd']))
+
+    def testIncomparable(self):
+        self.assertEqual(CRX(["ab", "c"]),
+                         Conjunction([Disjunction(list("ac")), Optional('b')]))
+
+    def testGraphDoesNotChange(self):
+        graph = infer_automata(["abc", "ac"])
+        edges = list(graph.edges)
+        infer_crx(graph)
+        self.assertEqual(graph.edges, edges)
+
+    def testEmpty(self):
+        self.assertEqual(CRX(["", ""]), None)
+
+    def testEncoded(self):
+        for samples in (["bacacdacde", "cbacdbacde"], ["ab", "abb", ""],
+                        ["abcd", "acd", "abd"], ["ab", "c"], ["", ""]):
+            symbols = SymbolTable()
+            encoded = [symbols.encode(sample) for sample in samples]
+            self.assertEqual(CRX(encoded, symbols), CRX(samples))
+            self.assertEqual(infer_contentmodel(encoded, engine='crx',
+                                                symbols=symbols),
+                             CRX(samples))
+
+    def testEngineSelection(self):
+        samples = ["bacacdacde", "cbacdbacde"]
+        self.assertEqual(infer_contentmodel(samples, engine='crx'),
+                         CRX(samples))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from inferdtd.Daemon import InferenceDaemon
+from inferdtd.Daemon import request
+from inferdtd.DOM import SampleCollector
+from inferdtd.DTDInferrer import IncrementalInferrer
+
+DOCUMENTS = ["<list><book><title/></book></list>",
+             "<list><book><title/><author/></book></list>",
+             "<list><book n='1'><author/><title/></book><book/></list>"]
+
+class InferenceDaemonTests(unittest.TestCase):
+    jobs = 1
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.address = os.path.join(self.directory, 'socket')
+        self.daemon = InferenceDaemon(self.address, self.jobs)
+
+    def tearDown(self):
+        self.daemon.close()
+        shutil.rmtree(self.directory)
+
+    def ask(self, command, data=None):
+        '''Sends a request from another thread, serving it meanwhile.
+        Returns the reply'''
+        replies = []
+        client = threading.Thread(target=lambda: replies.append(
+                                        request(self.address, command, data)))
+        client.start()
+        while client.isAlive():
+            self.daemon.poll(0.01)
+        client.join()
+        return replies[0]
+
+    def expected(self):
+        'Returns the DTD of the `DOCUMENTS` as inferred by idtd'
+        inferrer = IncrementalInferrer()
+        collector = SampleCollector(inferrer)
+        for document in DOCUMENTS:
+            collector.parse(document)
+            inferrer.reinfer()
+        return inferrer.dtd('list').encode('utf-8')
+
+    def testDTD(self):
+        self.assertEqual(self.ask('DTD'), "")
+        for document in DOCUMENTS:
+            self.assertEqual(self.ask('SUBMIT', document), "OK\n")
+        while not self.daemon.settled():
+            self.daemon.poll(0.01)
+        self.assertEqual(self.ask('dtd'), self.expected())
+        status = dict(line.split() for line in self.ask('STATUS').splitlines())
+        self.assertEqual(status['documents'], '3')
+        self.assertEqual(status['queries'], '2')
+        self.assertEqual(status['settled'], '1')
+
+    def testErrors(self):
+        self.assert_(self.ask('SUBMIT', "<list><book></list>")
+                         .startswith("ERROR"))
+        self.assert_(self.ask('SUBMIT', "").startswith("ERROR"))
+        self.assert_(self.ask('INFER').startswith("ERROR unknown command"))
+        self.assertEqual(self.daemon.documents, 0)
+        self.assertEqual(len(self.daemon.errors), 2)
+
+class PooledDaemonTests(InferenceDaemonTests):
+    jobs = 2
+
+
+if __name__ == '__main__':
+    unittest.main()
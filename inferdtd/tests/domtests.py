@@ -0,0 +1,441 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import os
+import unittest
+from inferdtd.DOM import Document
+from inferdtd.DOM import XmlParser
+from inferdtd.DOM import mergedocs
+from inferdtd.DOM import SampleStore
+from inferdtd.DOM import SampleCollector
+from inferdtd.DOM import SymbolTable
+from inferdtd.DOM import SkeletonSet
+from inferdtd.DOM import skeleton
+from inferdtd.DOM import ExemplarIndex
+
+SAMPLE = """<?xml version="1.0"?>
+<example>
+    <book tip="1" lang="en">
+        <title>An example</title>
+    </book>
+    <book tip="2">
+        <title>Another example</title>
+    </book>
+</example>
+"""
+
+class AttributeStatsTests(unittest.TestCase):
+    def setUp(self):
+        self.parser = XmlParser()
+        self.parser.parse(SAMPLE)
+        self.stats = self.parser.attributes
+
+    def testOccurrences(self):
+        self.assertEqual(self.stats['example'].occurrences, 1)
+        self.assertEqual(self.stats['book'].occurrences, 2)
+        self.assertEqual(self.stats['title'].occurrences, 2)
+
+    def testCounters(self):
+        self.assertEqual(self.stats['book'].attributes, {'tip': 2, 'lang': 1})
+        self.assertEqual(self.stats['title'].attributes, {})
+
+    def testRequired(self):
+        self.assert_(self.stats['book'].isrequired('tip'))
+        self.assert_(not self.stats['book'].isrequired('lang'))
+        self.assert_(not self.stats['book'].isrequired('missing'))
+
+    def testMergedDocuments(self):
+        merged = mergedocs(Document(SAMPLE),
+                           Document('<example><book lang="es"/></example>'))
+        stats = merged.__attributes__['book']
+        self.assertEqual(stats.occurrences, 3)
+        self.assertEqual(stats.attributes, {'tip': 2, 'lang': 2})
+        self.assert_(not stats.isrequired('tip'))
+
+class SampleCollectorTests(unittest.TestCase):
+    def setUp(self):
+        self.store = SampleStore()
+        self.collector = SampleCollector(self.store)
+        self.collector.parse(SAMPLE)
+
+    def testRoot(self):
+        self.assertEqual(self.collector.root, 'example')
+
+    def testSamples(self):
+        self.assertEqual(self.store.counts('example'), {('book', 'book'): 1})
+        self.assertEqual(self.store.counts('book'), {('title',): 2})
+        self.assertEqual(self.store.counts('title'), {(): 2})
+
+    def testSameAsXmlParser(self):
+        store = SampleStore()
+        store.update(XmlParser().parse(SAMPLE)[1])
+        for name in store.names():
+            self.assertEqual(store.counts(name), self.store.counts(name))
+            self.assertEqual(store.attributes(name).attributes,
+                             self.store.attributes(name).attributes)
+
+class SymbolTableTests(unittest.TestCase):
+    def setUp(self):
+        self.table = SymbolTable()
+
+    def testIntern(self):
+        self.assertEqual(self.table.intern('a'), 0)
+        self.assertEqual(self.table.intern('b'), 1)
+        self.assertEqual(self.table.intern('a'), 0)
+        self.assertEqual(len(self.table), 2)
+        self.assertEqual(self.table.name(1), 'b')
+
+    def testEncoding(self):
+        encoded = self.table.encode(['a', 'b', 'a'])
+        self.assertEqual(list(encoded), [0, 1, 0])
+        self.assertEqual(self.table.decode(encoded), ['a', 'b', 'a'])
+
+class InternedStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.store = SampleStore(SymbolTable())
+        self.collector = SampleCollector(self.store, self.store.symbols)
+        self.collector.parse(SAMPLE)
+
+    def testSequences(self):
+        symbols = self.store.symbols
+        self.assertEqual([symbols.decode(x)
+                            for x in self.store.sequences('example')],
+                         [['book', 'book']])
+        self.assertEqual(map(list, self.store.sequences('title')), [[]])
+
+    def testMerge(self):
+        # A store with another symbol table must be re-encoded
+        other = SampleStore(SymbolTable())
+        other.add('book', ['author', 'title'])
+        other.add('book', ['title'])
+        self.store.merge(other)
+        counts = dict((tuple(self.store.__decodekey__(key)), count)
+                      for key, count in self.store.counts('book').iteritems())
+        self.assertEqual(counts, {('title',): 3, ('author', 'title'): 1})
+
+    def testSameAsPlainStore(self):
+        store = SampleStore()
+        SampleCollector(store).parse(SAMPLE)
+        symbols = self.store.symbols
+        for name in store.names():
+            self.assertEqual(sorted(store.sequences(name)),
+                             sorted(tuple(symbols.decode(x))
+                                    for x in self.store.sequences(name)))
+
+class SubtreeTests(unittest.TestCase):
+    def setUp(self):
+        records = ["<book><title/><ids><uri/><id/></ids></book>",
+                   "<book><title/><ids><uri/></ids></book>",
+                   "<book n='1'><title/><ids><uri/><id/></ids></book>"]
+        self.document = "<list>%s</list>" % "".join(records[i % 3 and 1]
+                                                    if i % 10 else records[2]
+                                                    for i in range(100))
+
+    def testSameSamples(self):
+        for symbols in (None, SymbolTable()):
+            plain, shared = SampleStore(symbols), SampleStore(symbols)
+            SampleCollector(plain, symbols).parse(self.document)
+            SampleCollector(shared, symbols, subtrees=True) \
+                .parse(self.document)
+            self.assertEqual(sorted(plain.names()), sorted(shared.names()))
+            for name in plain.names():
+                self.assertEqual(plain.counts(name), shared.counts(name))
+                self.assertEqual(plain.attributes(name).attributes,
+                                 shared.attributes(name).attributes)
+                self.assertEqual(plain.attributes(name).occurrences,
+                                 shared.attributes(name).occurrences)
+
+    def testCounted(self):
+        calls = []
+        class Sink(object):
+            def add(self, name, children, attributes=(), count=1):
+                calls.append((name, tuple(children), count))
+        collector = SampleCollector(Sink(), subtrees=True)
+        collector.parse(self.document)
+        self.assertEqual(collector.root, 'list')
+        # One call per distinct sample, but for the attributes
+        self.assertEqual(sorted(x for x in calls if x[0] == 'book'),
+                         [('book', ('title', 'ids'), 10),
+                          ('book', ('title', 'ids'), 30),
+                          ('book', ('title', 'ids'), 60)])
+        self.assertEqual(len(calls), 9)
+
+class BudgetTests(unittest.TestCase):
+    def setUp(self):
+        self.plain = SampleStore()
+        self.store = SampleStore(budget=4000)
+        for store in (self.plain, self.store):
+            for i in range(100):
+                for name in ('a', 'b', 'c'):
+                    store.add(name, [name] * (i % 40), ['n'])
+
+    def tearDown(self):
+        self.store.close()
+
+    def testSpilled(self):
+        self.assert_(self.store.spills > 0)
+        self.assert_(self.store.spilled())
+        self.assert_(self.store.size <= 4000)
+        for name in self.plain.names():
+            self.assertEqual(self.store.counts(name), self.plain.counts(name))
+            self.assertEqual(sorted(self.store.sequences(name)),
+                             sorted(self.plain.sequences(name)))
+            self.assertEqual(self.store.attributes(name).occurrences, 100)
+
+    def testMerge(self):
+        store = SampleStore(SymbolTable(), budget=2000)
+        store.merge(self.store)
+        store.merge(self.plain)
+        for name in self.plain.names():
+            counts = dict((tuple(store.__decodekey__(key)), count)
+                          for key, count in store.counts(name).iteritems())
+            self.assertEqual(counts, dict((key, 2 * count) for key, count
+                                          in self.plain.counts(name).items()))
+        store.close()
+
+    def testPickle(self):
+        import pickle
+        store = pickle.loads(pickle.dumps(self.store, 2))
+        self.assertEqual(store.spilled(), [])
+        for name in self.plain.names():
+            self.assertEqual(store.counts(name), self.plain.counts(name))
+
+    def testClose(self):
+        directory = self.store.directory
+        self.store.close()
+        self.assert_(not os.path.exists(directory))
+        self.assertEqual(self.store.spilled(), [])
+
+class ExemplarTests(unittest.TestCase):
+    def setUp(self):
+        self.document = ("\n  <list>\n<book><title/></book>\n"
+                         "<book><title/></book>\n"
+                         "<book><title/><author/></book></list>")
+
+    def testLocated(self):
+        for symbols in (None, SymbolTable()):
+            for subtrees in (False, True):
+                index = ExemplarIndex(symbols)
+                index.begin('list.xml')
+                SampleCollector(SampleStore(symbols), symbols,
+                                subtrees=subtrees, exemplars=index) \
+                    .parse(self.document)
+                # (^,title), (title,$), (title,author), (author,$), (^,book),
+                # (book,$), (book,book) and the empty title and author
+                self.assertEqual(len(index), 9)
+                first = self.document.index("<book>")
+                last = self.document.rindex("<book>")
+                self.assertEqual(index.locate('book', None, 'title'),
+                                 ('list.xml', first, 3))
+                self.assertEqual(index.locate('book', 'title', 'author'),
+                                 ('list.xml', last, 5))
+                self.assertEqual(index.locate('list', 'book', 'book'),
+                                 ('list.xml', self.document.index("<list>"),
+                                  2))
+                self.assertEqual(index.locate('book', 'author', 'title'),
+                                 None)
+
+    def testExcerpt(self):
+        import tempfile
+        fd, path = tempfile.mkstemp(suffix='.xml')
+        try:
+            os.write(fd, self.document)
+            os.close(fd)
+            index = ExemplarIndex()
+            index.begin(path)
+            SampleCollector(SampleStore(), exemplars=index) \
+                .parsefile(open(path, 'rb'))
+            self.assert_(index.excerpt('book', 'author', None)
+                         .startswith("<book><title/><author/></book>"))
+            self.assertEqual(index.excerpt('book', 'title', 'title'), None)
+        finally:
+            os.remove(path)
+
+    def testMerge(self):
+        indexes = []
+        for path, document in (('a.xml', "<a><b/></a>"),
+                               ('b.xml', "<a><c/><b/></a>")):
+            symbols = SymbolTable()
+            index = ExemplarIndex(symbols)
+            index.begin(path)
+            SampleCollector(SampleStore(symbols), symbols, exemplars=index) \
+                .parse(document)
+            indexes.append(index)
+        index = ExemplarIndex()
+        for other in indexes:
+            index.merge(other)
+        self.assertEqual(index.locate('a', 'b', None), ('a.xml', 0, 1))
+        self.assertEqual(index.locate('a', 'c', 'b'), ('b.xml', 0, 1))
+        self.assertEqual(index.files, ['a.xml', 'b.xml'])
+
+    def testDump(self):
+        from StringIO import StringIO
+        index = ExemplarIndex()
+        index.begin('a.xml')
+        SampleCollector(SampleStore(), exemplars=index).parse("<a><b/></a>")
+        output = StringIO()
+        index.dump(output)
+        self.assertEqual(output.getvalue(), "a\t\tb\ta.xml\t0\t1\n"
+                                            "a\tb\t\ta.xml\t0\t1\n"
+                                            "b\t\t\ta.xml\t3\t1\n")
+
+    def testDumpNonASCII(self):
+        from StringIO import StringIO
+        path = u"caf\xe9.xml".encode('utf-8')
+        index = ExemplarIndex()
+        index.begin(path)
+        SampleCollector(SampleStore(), exemplars=index) \
+            .parse(u"<\xe9><b/></\xe9>".encode('utf-8'))
+        output = StringIO()
+        index.dump(output)
+        self.assertEqual(output.getvalue().splitlines()[0],
+                         u"b\t\t\tcaf\xe9.xml\t4\t1".encode('utf-8'))
+        self.assertEqual(len(output.getvalue().splitlines()), 3)
+
+    def testStandardInput(self):
+        index = ExemplarIndex()
+        index.begin('-')
+        SampleCollector(SampleStore(), exemplars=index).parse("<a><b/></a>")
+        self.assertEqual(index.locate('a', 'b', None), ('-', 0, 1))
+        self.assertEqual(index.excerpt('a', 'b', None), None)
+
+class SaturationTests(unittest.TestCase):
+    def setUp(self):
+        books = ["<book><title/></book>", "<book><title/><author/></book>"]
+        self.document = "<list>%s</list>" % "".join(books[i % 2 == 0 and
+                                                         i < 20]
+                                                    for i in range(100))
+
+    def testSkipped(self):
+        store = SampleStore()
+        collector = SampleCollector(store, saturation=5)
+        collector.parse(self.document)
+        self.assertEqual(collector.saturated,
+                         set(['book', 'title', 'author']))
+        self.assertEqual(sorted(store.sequences('book')),
+                         [('title',), ('title', 'author')])
+        self.assert_(collector.skipped > 0)
+        self.assert_(not collector.stopped)
+        self.assertEqual(store.counts('list').values(), [1])
+
+    def testNewEdges(self):
+        # The last sample is new after many saturated ones; a threshold
+        # low enough misses it
+        store = SampleStore()
+        document = "<list>%s<book><author/></book></list>" % (
+                        "<book><title/></book>" * 20)
+        SampleCollector(store, saturation=10).parse(document)
+        self.assertEqual(store.sequences('book'), [('title',)])
+        store = SampleStore()
+        SampleCollector(store, saturation=50).parse(document)
+        self.assertEqual(sorted(store.sequences('book')),
+                         [('author',), ('title',)])
+
+    def testStop(self):
+        store = SampleStore()
+        collector = SampleCollector(store, saturation=5, stop=True)
+        collector.parse(self.document)
+        self.assert_(collector.stopped)
+        # The root is handed over with the books found so far
+        sequence, = store.sequences('list')
+        self.assert_(0 < len(sequence) < 100)
+
+    def testUnsaturated(self):
+        store = SampleStore()
+        collector = SampleCollector(store, saturation=1000, stop=True)
+        collector.parse(self.document)
+        self.assertEqual(collector.skipped, 0)
+        self.assert_(not collector.stopped)
+        self.assertEqual(sum(store.counts('book').values()), 100)
+
+class SkeletonTests(unittest.TestCase):
+    def setUp(self):
+        self.store = SampleStore()
+        self.skeletons = SkeletonSet(2)
+        self.collector = SampleCollector(self.store,
+                                         skeletons=self.skeletons)
+
+    def testSkeleton(self):
+        same = SAMPLE.replace("An example", "Some <![CDATA[<b>]]> text") \
+                     .replace('tip="1"', "tip = '>'") \
+                     .replace("<title>", "<!-- <b> --><title>")
+        self.assertEqual(skeleton(SAMPLE), skeleton(same))
+        self.assertNotEqual(skeleton(SAMPLE),
+                            skeleton(SAMPLE.replace(' lang="en"', '')))
+        self.assertNotEqual(skeleton('<a xmlns="#1"/>'),
+                            skeleton('<a xmlns="#2"/>'))
+        self.assertEqual(skeleton('<!DOCTYPE a [<!ENTITY b "<b/>">]>'
+                                  '<a>&b;</a>'),
+                         skeleton('<a><b/></a>'))
+        self.assertEqual(skeleton('<a>'), None)
+
+    def testQuotedText(self):
+        # A quote in character data doesn't hide the markup after it
+        first = '<r><p> x="</p><q a="1"/></r>'
+        second = '<r><p> x="</p><s a="1"/></r>'
+        self.assertNotEqual(skeleton(first), skeleton(second))
+        self.collector.parse(first)
+        self.collector.parse(second)
+        self.assertEqual(self.collector.duplicates, 0)
+        self.assert_('s' in self.store.names())
+
+    def testDuplicates(self):
+        self.collector.parse(SAMPLE)
+        self.collector.parse(SAMPLE.replace("An example", "Some text")
+                                   .replace('"1"', '"3"'))
+        self.assertEqual(self.collector.duplicates, 1)
+        self.assertEqual(self.collector.root, 'example')
+        self.assertEqual(self.store.counts('book'), {('title',): 2})
+        self.collector.parse(SAMPLE.replace(' lang="en"', ''))
+        self.assertEqual(self.collector.duplicates, 1)
+        self.assertEqual(self.store.attributes('book').occurrences, 4)
+
+    def testBounded(self):
+        documents = ["<a><b/></a>", "<a><c/></a>", "<a><d/></a>"]
+        for document in documents:
+            self.collector.parse(document)
+        self.assertEqual(len(self.skeletons), 2)
+        # The first one was forgotten
+        self.collector.parse(documents[0])
+        self.assertEqual(self.collector.duplicates, 0)
+        self.collector.parse(documents[2])
+        self.assertEqual(self.collector.duplicates, 1)
+        self.assertEqual(self.skeletons.hits, 1)
+
+    def testChunks(self):
+        from StringIO import StringIO
+        self.collector.parsefile(StringIO(SAMPLE))
+        self.collector.feed(SAMPLE[:40])
+        self.collector.feed(SAMPLE[40:])
+        self.collector.close()
+        self.assertEqual(self.collector.duplicates, 1)
+        self.assertEqual(self.collector.skeleton, skeleton(SAMPLE))
+        self.assertEqual(self.store.counts('book'), {('title',): 2})
+
+    def testShared(self):
+        SampleCollector(SampleStore(), skeletons=self.skeletons).parse(SAMPLE)
+        self.collector.parse(SAMPLE)
+        self.assertEqual(self.collector.duplicates, 1)
+        self.assertEqual(len(self.store), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
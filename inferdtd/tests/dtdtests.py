@@ -19,15 +19,100 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 #
 
+import os
 import unittest
-#from inferdtd.DTDInferrer import inter_dtd
+from inferdtd.RE import Repeat
+from inferdtd.RE import Kleene
+from inferdtd.RE import Optional
+from inferdtd.RE import Conjunction
+from inferdtd.RE import Disjunction
+from inferdtd.DOM import Document
+from inferdtd.DOM import SampleCollector
+from inferdtd.DTDInferrer import infer_dtd
+from inferdtd.DTDInferrer import infer_contentmodel
+from inferdtd.DTDInferrer import render_contentmodel
+from inferdtd.DTDInferrer import IncrementalInferrer
 
 class DTDTests(unittest.TestCase):
     def setUp(self):
-        self.sample = open('data.xml').read()
+        here = os.path.dirname(os.path.abspath(__file__))
+        self.sample = open(os.path.join(here, 'data.xml')).read()
 
     def testConformance(self):
-        pass
+        dtd = infer_dtd([Document(self.sample)])
+        lines = dtd.splitlines()
+        self.assertEqual(lines[0], "<!ELEMENT RDF (results,images)>")
+        self.assert_("<!ELEMENT profiles (profile+)>" in lines)
+        self.assert_("<!ELEMENT profile (link,size,metadata)>" in lines)
+        self.assert_("<!ATTLIST profile name CDATA #REQUIRED>" in lines)
+        self.assert_("<!ATTLIST metadata about CDATA #IMPLIED>" in lines)
+        self.assert_("<!ELEMENT size (#PCDATA)>" in lines)
+
+class ContentModelTests(unittest.TestCase):
+    def testEmpty(self):
+        self.assertEqual(infer_contentmodel([(), ()]), None)
+        self.assertEqual(render_contentmodel(None), "(#PCDATA)")
+
+    def testInferred(self):
+        self.assertEqual(infer_contentmodel(["ab", "abb"]),
+                         Conjunction(['a', Repeat('b')]))
+
+    def testRendering(self):
+        self.assertEqual(render_contentmodel('a'), "(a)")
+        self.assertEqual(render_contentmodel(Repeat('a')), "(a+)")
+        self.assertEqual(render_contentmodel(Repeat(Optional('a'))), "(a?)+")
+        self.assertEqual(render_contentmodel(Kleene(Disjunction(['a', 'b']))),
+                         "(a|b)*")
+        self.assertEqual(render_contentmodel(
+                            Conjunction([Optional('a'),
+                                         Disjunction(['b', Repeat('c')])])),
+                         "(a?,(b|c+))")
+
+class IncrementalInferrerTests(unittest.TestCase):
+    def setUp(self):
+        self.inferrer = IncrementalInferrer()
+
+    def testGating(self):
+        for sample in ["ab", "abb"]:
+            self.assertEqual(self.inferrer.add('x', sample), False)
+        self.assertEqual(self.inferrer.pending, set(['x']))
+        self.assertEqual(self.inferrer.reinfer(), ['x'])
+        self.assertEqual(self.inferrer.model('x'),
+                         Conjunction(['a', Repeat('b')]))
+        self.assertEqual(self.inferrer.add('x', "abbb"), True)
+        self.assertEqual(self.inferrer.pending, set())
+        self.assertEqual(self.inferrer.add('x', "b"), False)
+        self.assertEqual(self.inferrer.pending, set(['x']))
+        self.assertEqual(self.inferrer.model('x'),
+                         Conjunction([Optional('a'), Repeat('b')]))
+        self.assertEqual((self.inferrer.accepted, self.inferrer.rejected),
+                         (1, 3))
+
+    def testGraphUntouched(self):
+        self.inferrer.add('x', "ab")
+        self.inferrer.reinfer()
+        self.assertEqual(len(self.inferrer.graph('x').edges), 3)
+
+    def testSameAsBatch(self):
+        collector = SampleCollector(self.inferrer)
+        collector.parse(self.sample())
+        self.inferrer.reinfer()
+        collector.parse(self.sample())
+        self.assertEqual(self.inferrer.dtd(collector.root),
+                         infer_dtd([Document(self.sample())]))
+        self.assert_(self.inferrer.accepted > 0)
+
+    def testEngines(self):
+        inferrer = IncrementalInferrer(engines={'x': 'crx'})
+        for sample in ["bacacdacde", "cbacdbacde"]:
+            inferrer.add('x', sample)
+        self.assertEqual(inferrer.model('x'),
+                         Conjunction([Repeat(Disjunction(list("bacd"))), 'e']))
+
+    def sample(self):
+        here = os.path.dirname(os.path.abspath(__file__))
+        return open(os.path.join(here, 'data.xml')).read()
+
 
 if __name__ == '__main__':
     unittest.main()
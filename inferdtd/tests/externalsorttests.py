@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+from inferdtd.ExternalSort import write_run
+from inferdtd.ExternalSort import read_run
+from inferdtd.ExternalSort import merge_runs
+from inferdtd.ExternalSort import merge_files
+from inferdtd.DOM import SampleStore
+from inferdtd.DOM import SymbolTable
+from inferdtd.DTDInferrer import infer_contentmodel
+
+class RunTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.runs = []
+        for i in range(5):
+            run = os.path.join(self.directory, "%d.run" % i)
+            write_run(run, [(('a',) * j, 1) for j in range(i, i + 3)])
+            self.runs.append(run)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testRead(self):
+        self.assertEqual(list(read_run(self.runs[1])),
+                         [(('a',), 1), (('a', 'a'), 1), (('a', 'a', 'a'), 1)])
+
+    def testMerge(self):
+        merged = list(merge_runs(self.runs))
+        self.assertEqual([len(key) for key, count in merged], range(7))
+        self.assertEqual([count for key, count in merged],
+                         [1, 2, 3, 3, 3, 2, 1])
+
+    def testMergeFiles(self):
+        target = os.path.join(self.directory, "merged")
+        # Three passes with two runs at a time
+        self.assertEqual(merge_files(self.runs, target, fanin=2), 7)
+        self.assertEqual(list(read_run(target)), list(merge_runs(self.runs)))
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ["%d.run" % i for i in range(5)] + ["merged"])
+        merge_files(self.runs, target, fanin=2, remove=True)
+        self.assertEqual(os.listdir(self.directory), ["merged"])
+
+class StreamedStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.store = SampleStore(SymbolTable(), budget=1500)
+        self.plain = SampleStore()
+        for store in (self.store, self.plain):
+            for i in range(200):
+                store.add('a', ['b'] * (i % 30) + ['c'])
+                store.add('d', ['e'] * (i % 20))
+
+    def tearDown(self):
+        self.store.close()
+
+    def testDistinct(self):
+        self.assertEqual(sorted(self.store.spilled()), ['a', 'd'])
+        self.assertEqual(self.store.distinct('a'), 30)
+        self.assertEqual(self.store.distinct('d'), 20)
+        # Compacted into a single run, read in order
+        keys = [key for key, count in self.store.itercounts('a')]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(sum(count for key, count
+                             in self.store.itercounts('a')), 200)
+
+    def testSharedDirectory(self):
+        directory = tempfile.mkdtemp()
+        try:
+            stores = [SampleStore(SymbolTable(), budget=500,
+                                  directory=directory) for i in range(2)]
+            for i in range(100):
+                for store in stores:
+                    store.add('a', ['b'] * (i % 30))
+            for store in stores:
+                self.assertEqual(store.counts('a'),
+                                 stores[0].counts('a'))
+                self.assertEqual(sum(store.counts('a').values()), 100)
+            stores[0].close()
+            self.assertEqual(sum(stores[1].counts('a').values()), 100)
+            stores[1].close()
+        finally:
+            shutil.rmtree(directory)
+
+    def testStreamedInference(self):
+        symbols = self.store.symbols
+        for name in ('a', 'd'):
+            self.assertEqual(infer_contentmodel(
+                                self.store.itersequences(name),
+                                symbols=symbols),
+                             infer_contentmodel(self.plain.sequences(name)))
+
+
+if __name__ == '__main__':
+    unittest.main()
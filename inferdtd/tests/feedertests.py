@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+from xml.parsers import expat
+from inferdtd.DOM import SampleStore
+from inferdtd.DOM import SampleCollector
+from inferdtd.Feeder import FeedServer
+from inferdtd.DTDInferrer import IncrementalInferrer
+
+DOCUMENTS = ["<list><book><title/></book></list>",
+             "<list><book><title/><author/></book></list>",
+             "<list><book><author/><title/></book><book/></list>"]
+
+class FeedTests(unittest.TestCase):
+    def testChunks(self):
+        store = SampleStore()
+        collector = SampleCollector(store)
+        for document in DOCUMENTS:
+            for i in range(0, len(document), 5):
+                collector.feed(document[i:i + 5])
+            collector.close()
+        self.assertEqual(collector.root, 'list')
+        self.assertEqual(sum(store.counts('book').values()), 4)
+        self.assertEqual(sorted(store.sequences('book')),
+                         [(), ('author', 'title'), ('title',),
+                          ('title', 'author')])
+
+    def testIncomplete(self):
+        collector = SampleCollector(SampleStore())
+        collector.feed(DOCUMENTS[0][:-3])
+        self.assertRaises(expat.ExpatError, collector.close)
+        # The next chunk starts a new document
+        collector.feed(DOCUMENTS[0])
+        collector.close()
+
+class FeedServerTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.address = os.path.join(self.directory, 'socket')
+        self.inferrer = IncrementalInferrer()
+        self.server = FeedServer(self.inferrer, self.address)
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.directory)
+
+    def connect(self):
+        producer = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        producer.connect(self.address)
+        return producer
+
+    def testInterleaved(self):
+        producers = [self.connect() for document in DOCUMENTS]
+        for i in range(0, 60, 10):
+            for producer, document in zip(producers, DOCUMENTS):
+                if document[i:i + 10]:
+                    producer.sendall(document[i:i + 10])
+            for j in range(5):
+                self.server.poll(0.01)
+        self.assertEqual(len(self.server), 3)
+        self.assertEqual(self.server.documents, 0)
+        for producer in producers:
+            producer.close()
+        self.server.serve(len(DOCUMENTS))
+        self.assertEqual(self.server.documents, 3)
+        self.assertEqual(len(self.server), 0)
+        self.assertEqual(self.server.root, 'list')
+        self.inferrer.reinfer()
+        self.assert_('<!ELEMENT book' in self.inferrer.dtd('list'))
+
+    def testMalformed(self):
+        producer = self.connect()
+        producer.sendall("<list><book></list>")
+        producer.close()
+        empty = self.connect()
+        empty.close()
+        self.server.serve(2)
+        self.assertEqual(self.server.documents, 0)
+        self.assertEqual(len(self.server.errors), 2)
+
+    def testPipe(self):
+        read, write = os.pipe()
+        self.server.addpipe(read)
+        os.write(write, DOCUMENTS[1])
+        os.close(write)
+        self.server.serve(1)
+        self.assertEqual(self.server.documents, 1)
+        self.assertEqual(self.inferrer.accepted + self.inferrer.rejected, 4)
+        os.close(read)
+
+
+if __name__ == '__main__':
+    unittest.main()
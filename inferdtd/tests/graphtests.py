@@ -19,8 +19,12 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 #
 
+import random
 import unittest
+from inferdtd import Graph as GraphModule
 from inferdtd.Graph import Graph
+from inferdtd.Graph import findcomponents
+from inferdtd.Graph import extentsets
 #import inferdtd.Graph
 
 class NodesTests(unittest.TestCase):
@@ -203,6 +207,185 @@ class PredSuccTests(unittest.TestCase):
         self.graph.replacenode(4, self.eo4)
         self.assertEqual(self.graph.succ(self.eo3), set([self.eo4, self.eo5, 6]))
 
+class DenseTests(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(2006)
+        nodes = [generator.random() < 0.3 and EmptyObject(i) or i
+                 for i in range(40)]
+        edges = set((x, y) for x in nodes for y in nodes
+                    if generator.random() < 0.15)
+        self.graph = Graph.build(nodes, edges)
+        self.limits = GraphModule.DENSE_MIN, GraphModule.DENSITY
+
+    def tearDown(self):
+        GraphModule.DENSE_MIN, GraphModule.DENSITY = self.limits
+
+    def sets(self, dense):
+        if dense:
+            GraphModule.DENSE_MIN, GraphModule.DENSITY = 1, 0
+        else:
+            GraphModule.DENSE_MIN, GraphModule.DENSITY = 1, 2
+        self.assertEqual(self.graph.isdense(), dense)
+        return [(self.graph.pred(x), self.graph.succ(x))
+                for x in self.graph.nodes + ['missing']]
+
+    def testSameSets(self):
+        if GraphModule.numpy is None:
+            return
+        self.assertEqual(self.sets(True), self.sets(False))
+
+    def testChanges(self):
+        if GraphModule.numpy is None:
+            return
+        before = self.sets(True)
+        version = self.graph.version
+        savepoint = self.graph.savepoint()
+        self.graph.replacenode(self.graph.nodes[0], EmptyObject('x'))
+        self.graph.removenode(self.graph.nodes[1])
+        self.assert_(self.graph.version > version)
+        self.assertEqual(self.sets(True), self.sets(False))
+        version = self.graph.version
+        self.graph.rollback(savepoint)
+        self.assert_(self.graph.version > version)
+        self.assertEqual(self.sets(True), before)
+
+class ExtentsTests(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(2007)
+        self.nodes = range(30)
+        self.nullable = set(x for x in self.nodes if generator.random() < 0.5)
+        self.neighbours = dict((x, [y for y in self.nodes
+                                    if generator.random() < 0.06])
+                               for x in self.nodes)
+
+    def reached(self, node):
+        'The nodes reached from `node`, one at a time'
+        result, queue = set(), list(self.neighbours[node])
+        while queue:
+            which = queue.pop()
+            if which not in result:
+                result.add(which)
+                if which in self.nullable:
+                    queue.extend(self.neighbours[which])
+        return result
+
+    def testReached(self):
+        extents = extentsets(self.nodes, self.neighbours, self.nullable)
+        for node in self.nodes:
+            self.assertEqual(extents[node], self.reached(node))
+
+    def testShared(self):
+        # A cycle of nullable nodes reaches the same nodes
+        self.neighbours.update({0: [1], 1: [2], 2: [0, 3]})
+        self.nullable |= set([0, 1, 2])
+        extents = extentsets(self.nodes, self.neighbours, self.nullable)
+        self.assert_(extents[0] is extents[1] is extents[2])
+        self.assert_(set([0, 1, 2, 3]) <= extents[0])
+
+    def testCached(self):
+        graph = Graph(nodes=[1, 2, EmptyObject(3)])
+        graph.addedge((1, graph.nodes[2]))
+        graph.addedge((graph.nodes[2], 2))
+        self.assert_(not graph.cached())
+        pred, succ = graph.extents()
+        self.assert_(graph.cached())
+        self.assertEqual(succ[1], frozenset([graph.nodes[2], 2]))
+        self.assert_(graph.extents()[1] is succ)
+        # The copies returned by `succ` can be changed
+        graph.succ(1).clear()
+        self.assertEqual(graph.succ(1), set(succ[1]))
+        graph.removeedge((graph.nodes[2], 2))
+        self.assert_(not graph.cached())
+        self.assertEqual(graph.succ(1), set([graph.nodes[2]]))
+
+class ComponentsTests(unittest.TestCase):
+    def setUp(self):
+        self.graph = Graph(nodes = range(1, 8))
+        self.graph.addedge((1, 2))
+        self.graph.addedge((2, 3))
+        self.graph.addedge((3, 1))
+        self.graph.addedge((3, 4))
+        self.graph.addedge((4, 5))
+        self.graph.addedge((5, 4))
+        self.graph.addedge((6, 6))
+
+    def testComponents(self):
+        components = [set(x) for x in self.graph.components()]
+        self.assertEqual(len(components), 4)
+        for expected in ([1, 2, 3], [4, 5], [6], [7]):
+            self.assert_(set(expected) in components)
+
+    def testReverseTopologicalOrder(self):
+        components = [set(x) for x in self.graph.components()]
+        self.assert_(components.index(set([4, 5])) <
+                     components.index(set([1, 2, 3])))
+
+    def testInducedSubgraph(self):
+        components = [set(x) for x in self.graph.components([1, 2, 4, 5])]
+        self.assertEqual(sorted(map(sorted, components)), [[1], [2], [4, 5]])
+
+    def testLongChain(self):
+        size = 5000
+        components = findcomponents(range(size),
+                                    lambda x: x + 1 < size and [x + 1] or [])
+        self.assertEqual(len(components), size)
+        self.assertEqual(components[0], [size - 1])
+
+class UndoTests(unittest.TestCase):
+    def setUp(self):
+        self.graph = Graph(nodes=range(1, 6),
+                           edges=[(1, 2), (2, 3), (3, 4), (4, 5), (3, 3)])
+        self.nodes = list(self.graph.nodes)
+        self.edges = list(self.graph.edges)
+
+    def assertUntouched(self):
+        self.assertEqual(self.graph.nodes, self.nodes)
+        self.assertEqual(self.graph.edges, self.edges)
+
+    def testRollback(self):
+        savepoint = self.graph.savepoint()
+        self.graph.replacenode(3, 'x')
+        self.graph.removenode(1)
+        self.graph.addnode(6)
+        self.graph.createedge(6, 'x')
+        self.graph.removeedge((4, 5))
+        self.assertNotEqual(self.graph.edges, self.edges)
+        self.graph.rollback(savepoint)
+        self.assertUntouched()
+
+    def testNested(self):
+        outer = self.graph.savepoint()
+        self.graph.removenode(2)
+        inner = self.graph.savepoint()
+        self.graph.removenode(4)
+        self.graph.rollback(inner)
+        self.assert_(4 in self.graph.nodes)
+        self.assert_(2 not in self.graph.nodes)
+        self.graph.rollback(outer)
+        self.assertUntouched()
+
+    def testRelease(self):
+        savepoint = self.graph.savepoint()
+        self.graph.removenode(2)
+        self.graph.release(savepoint)
+        self.assert_(2 not in self.graph.nodes)
+        # Nothing is logged without a savepoint
+        self.graph.removenode(4)
+        savepoint = self.graph.savepoint()
+        self.assertEqual(savepoint, 0)
+
+    def testReleaseNested(self):
+        outer = self.graph.savepoint()
+        inner = self.graph.savepoint()
+        self.assertEqual((outer, inner), (0, 0))
+        self.graph.release(inner)
+        # Still logged for the outer savepoint
+        self.graph.removenode(2)
+        self.graph.rollback(outer)
+        self.assertUntouched()
+        self.graph.removenode(2)
+        self.assertEqual(self.graph.savepoint(), 0)
+
 
 if __name__ == '__main__':
     unittest.main()
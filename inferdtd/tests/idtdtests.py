@@ -27,6 +27,7 @@ from inferdtd.RE import Disjunction
 from inferdtd.Graph import Graph
 from inferdtd.AutomataInferrer import StartNode
 from inferdtd.AutomataInferrer import EndNode
+from inferdtd.AutomataInferrer import infer_automata
 from inferdtd.InferDTD import __enable_optional_for_node__
 from inferdtd.InferDTD import __enable_disjunction_for_nodes__
 from inferdtd.InferDTD import __enable_disjunction_case_b__
@@ -76,7 +77,22 @@ class IDTDTests(unittest.TestCase):
     def testEnableDisjunctionPreconditionB(self):
         self.assertEqual(__enable_disjunction_case_b__(self.tree), True)
         self.assert_(Disjunction(('a', 'c')) in self.tree.nodes)
-        self.assertEqual(__enable_disjunction_case_b__(self.cycle), False)
+        # No pair, but the whole cycle
+        self.assertEqual(__enable_disjunction_case_b__(self.cycle), True)
+        self.assert_(Disjunction(list('abc')) in self.cycle.nodes)
+
+    def testEnableDisjunctionGroups(self):
+        # Two disjoint cycles are repaired in a single step
+        graph = Graph(nodes="abcdef")
+        graph.addnode(StartNode)
+        graph.addnode(EndNode)
+        for edge in ["ab", "bc", "ca", "cd", "de", "ef", "fd"]:
+            graph.addedge(tuple(edge))
+        graph.addedge((StartNode, 'a'))
+        graph.addedge(('f', EndNode))
+        self.assertEqual(__enable_disjunction_case_b__(graph), True)
+        self.assert_(Disjunction(list('abc')) in graph.nodes)
+        self.assert_(Disjunction(list('def')) in graph.nodes)
 
     def testEnableDisjunctionPreconditionACycle(self):
         self.assertEqual(__enable_disjunction_case_a__(self.cycle), True)
@@ -101,6 +117,15 @@ class IDTDTests(unittest.TestCase):
                      Optional('c') in self.tree.nodes or
                      Optional('d') in self.tree.nodes)
 
+    def testEnableOptionalIndependent(self):
+        # b0 and b1 don't interfere, so both are repaired at once
+        graph = infer_automata([["a0", "b0", "c0", "a1", "b1", "c1"],
+                                ["x0", "b0", "y0", "x1", "b1", "y1"],
+                                ["a0", "c0", "a1", "c1"]])
+        self.assertEqual(__enable_optional_case_a__(graph), True)
+        self.assert_(Optional('b0') in graph.nodes)
+        self.assert_(Optional('b1') in graph.nodes)
+
     def testEnableOptionalPreconditionB(self):
         self.assertEqual(__enable_optional_case_b__(self.tree), True)
         self.assert_(Optional('e') in self.tree.nodes)
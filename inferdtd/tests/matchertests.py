@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import unittest
+from inferdtd.RE import Repeat
+from inferdtd.RE import Kleene
+from inferdtd.RE import Optional
+from inferdtd.RE import Conjunction
+from inferdtd.RE import Disjunction
+from inferdtd.AutomataInferrer import infer_automata
+from inferdtd.InferDTD import infer_soa
+from inferdtd.DTDInferrer import extract_re
+from inferdtd.Matcher import Matcher
+from inferdtd.Matcher import NonDeterministicExpression
+
+class MatcherTests(unittest.TestCase):
+    def testSymbol(self):
+        matcher = Matcher('a')
+        self.assert_(matcher.matches('a'))
+        self.assert_(not matcher.matches(''))
+        self.assert_(not matcher.matches('aa'))
+        self.assert_(not matcher.matches('b'))
+
+    def testEmpty(self):
+        matcher = Matcher(None)
+        self.assert_(matcher.matches(''))
+        self.assert_(not matcher.matches('a'))
+
+    def testOperators(self):
+        # (a?,(b|c)+,d*)
+        matcher = Matcher(Conjunction([Optional('a'),
+                                       Repeat(Disjunction(['b', 'c'])),
+                                       Kleene('d')]))
+        for sequence in ["b", "ab", "abcbc", "cdd", "acbd"]:
+            self.assert_(matcher.matches(sequence), sequence)
+        for sequence in ["", "a", "ad", "aab", "bda", "bdc"]:
+            self.assert_(not matcher.matches(sequence), sequence)
+
+    def testNestedRepeat(self):
+        # ((a,b?)+)?
+        matcher = Matcher(Optional(Repeat(Conjunction(['a', Optional('b')]))))
+        for sequence in ["", "a", "ab", "aab", "abab"]:
+            self.assert_(matcher.matches(sequence), sequence)
+        for sequence in ["b", "abb", "ba"]:
+            self.assert_(not matcher.matches(sequence), sequence)
+
+    def testInferredExpressionAcceptsSamples(self):
+        # Strings in Figure 2 of [Bex2006]
+        samples = ["bacacdacde", "cbacdbacde"]
+        gfa = infer_automata(samples)
+        self.assert_(infer_soa(gfa))
+        matcher = Matcher(extract_re(gfa))
+        self.assertEqual(matcher.matchall(samples), [True, True])
+        self.assertEqual(matcher.rejected(samples + ["cde", "e", "e"]),
+                         ["e"])
+
+    def testNonDeterministic(self):
+        self.assertRaises(NonDeterministicExpression, Matcher,
+                          Conjunction([Optional('a'), 'a']))
+
+    def testMatchAll(self):
+        matcher = Matcher(Repeat('a'))
+        self.assertEqual(matcher.matchall(["a", "", ["a", "a"], "a"]),
+                         [True, False, True, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
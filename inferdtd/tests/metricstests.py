@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import os
+import pickle
+import shutil
+import urllib2
+import tempfile
+import unittest
+from StringIO import StringIO
+from inferdtd.Metrics import Registry
+from inferdtd.Metrics import Histogram
+from inferdtd.Metrics import FileExporter
+from inferdtd.Metrics import HTTPExporter
+from inferdtd.Metrics import exporter
+from inferdtd.DOM import SampleStore
+from inferdtd.DOM import SampleCollector
+from inferdtd.AutomataInferrer import infer_automata
+from inferdtd.InferDTD import infer_soa
+from inferdtd.Profile import RuleStats
+
+class RegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def testCounter(self):
+        counter = self.registry.counter('docs_total', "Documents")
+        counter.inc()
+        counter.inc(2)
+        self.assert_(self.registry.counter('docs_total') is counter)
+        self.assertEqual(counter.value, 3)
+        other = self.registry.counter('docs_total', labels={'a': 'b'})
+        self.assert_(other is not counter)
+        self.assertEqual(len(self.registry.metrics()), 2)
+
+    def testQuantile(self):
+        histogram = Histogram('h', buckets=(1.0, 2.0, 4.0))
+        self.assertEqual(histogram.quantile(0.5), None)
+        for value in (0.5, 1.5, 1.5, 3.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [1, 2, 1, 0])
+        self.assertEqual(histogram.quantile(0.5), 1.5)
+        self.assertEqual(histogram.quantile(1.0), 4.0)
+        histogram.observe(10.0)
+        self.assertEqual(histogram.quantile(1.0), 4.0)
+
+    def testExposition(self):
+        self.registry.counter('docs_total', "Documents").inc(2)
+        self.registry.gauge('pending', function=lambda: 7)
+        histogram = self.registry.histogram('seconds', "Time",
+                                            {'phase': 'a"b'}, (1.0, 2.0))
+        histogram.observe(1.5)
+        lines = self.registry.exposition().splitlines()
+        self.assert_("# HELP docs_total Documents" in lines)
+        self.assert_("# TYPE docs_total counter" in lines)
+        self.assert_("docs_total 2" in lines)
+        self.assert_("pending 7" in lines)
+        self.assert_("# TYPE seconds histogram" in lines)
+        self.assert_('seconds_bucket{phase="a\\"b",le="1.0"} 0' in lines)
+        self.assert_('seconds_bucket{phase="a\\"b",le="2.0"} 1' in lines)
+        self.assert_('seconds_bucket{phase="a\\"b",le="+Inf"} 1' in lines)
+        self.assert_('seconds_count{phase="a\\"b"} 1' in lines)
+
+    def testMerge(self):
+        other = Registry()
+        self.registry.counter('docs_total').inc()
+        other.counter('docs_total').inc(2)
+        other.histogram('seconds').observe(0.1)
+        other.gauge('pending', function=len).set(3)
+        self.registry.merge(pickle.loads(pickle.dumps(other)))
+        self.assertEqual(self.registry.counter('docs_total').value, 3)
+        self.assertEqual(self.registry.histogram('seconds').count, 1)
+        self.assertEqual(self.registry.gauge('pending').value, 3)
+
+    def testRuleStats(self):
+        stats = RuleStats(metrics=self.registry)
+        infer_soa(infer_automata(["bacacdacde", "cbacdbacde"]), stats)
+        self.assertEqual(self.registry.histogram('idtd_infer_soa_seconds')
+                         .count, 1)
+        rewrites = self.registry.histogram('idtd_phase_seconds',
+                                           labels={'phase': 'rewrite'})
+        self.assert_(rewrites.count > 0)
+        self.assertEqual(rewrites.sum, stats.phases['rewrite'])
+        merged = RuleStats()
+        merged.merge(stats)
+        self.assertEqual(merged.metrics.histogram('idtd_infer_soa_seconds')
+                         .count, 1)
+
+
+class CollectorMetricsTests(unittest.TestCase):
+    document = "<a><b/><b><c/></b><b/></a>"
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def counts(self):
+        return [self.registry.counter(name).value
+                for name in ('idtd_documents_total', 'idtd_bytes_total',
+                             'idtd_elements_total')]
+
+    def testParse(self):
+        for subtrees in (False, True):
+            self.registry = Registry()
+            collector = SampleCollector(SampleStore(), subtrees=subtrees,
+                                        metrics=self.registry)
+            collector.parse(self.document)
+            collector.parsefile(StringIO(self.document))
+            self.assertEqual(collector.elements, 10)
+            self.assertEqual(self.counts(),
+                             [2, 2 * len(self.document), 10])
+
+    def testFeed(self):
+        collector = SampleCollector(SampleStore(), metrics=self.registry)
+        collector.feed(self.document[:10])
+        collector.feed(self.document[10:])
+        collector.close()
+        self.assertEqual(self.counts(), [1, len(self.document), 5])
+
+    def testWithoutMetrics(self):
+        collector = SampleCollector(SampleStore())
+        collector.parse(self.document)
+        self.assertEqual(collector.elements, 5)
+        self.assertEqual(len(self.registry.metrics()), 0)
+
+
+class ExporterTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.registry = Registry()
+        self.registry.counter('docs_total').inc(5)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testFile(self):
+        path = os.path.join(self.directory, "metrics.prom")
+        written = FileExporter(self.registry, path, interval=3600)
+        written.start()
+        written.stop()
+        self.assertEqual(open(path).read(), self.registry.exposition())
+        self.assertEqual(os.listdir(self.directory), ["metrics.prom"])
+
+    def testHTTP(self):
+        served = HTTPExporter(self.registry, ('127.0.0.1', 0))
+        served.start()
+        try:
+            reply = urllib2.urlopen("http://127.0.0.1:%d/metrics"
+                                    % served.address[1])
+            self.assert_(reply.info()['Content-Type'].startswith(
+                            "text/plain"))
+            self.assert_("docs_total 5" in reply.read().splitlines())
+        finally:
+            served.stop()
+
+    def testChoice(self):
+        path = os.path.join(self.directory, "metrics.prom")
+        chosen = exporter(self.registry, path)
+        chosen.stop()
+        self.assert_(isinstance(chosen, FileExporter))
+        chosen = exporter(self.registry, "127.0.0.1:0")
+        chosen.stop()
+        self.assert_(isinstance(chosen, HTTPExporter))
+
+
+if __name__ == '__main__':
+    unittest.main()
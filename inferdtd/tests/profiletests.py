@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#    Copyright (C) 2007  Manuel Vázquez Acosta <mva.led@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import unittest
+from inferdtd.AutomataInferrer import infer_automata
+from inferdtd.Rewrite import rewrite
+from inferdtd.InferDTD import infer_soa
+from inferdtd.Profile import RuleStats
+from inferdtd.Profile import MemoryStats
+from inferdtd.Profile import rss
+
+class RuleStatsTests(unittest.TestCase):
+    def setUp(self):
+        # Strings in Figure 2 of [Bex2006]
+        self.samples = ["bacacdacde", "cbacdbacde"]
+        self.stats = RuleStats()
+
+    def testSameResult(self):
+        plain = infer_automata(self.samples)
+        profiled = infer_automata(self.samples)
+        self.assertEqual(infer_soa(plain), infer_soa(profiled, self.stats))
+        self.assertEqual(plain.nodes[2:], profiled.nodes[2:])
+
+    def testRuleCounters(self):
+        infer_soa(infer_automata(self.samples), self.stats)
+        self.assert_(self.stats.attempts['optionalrule'] >= 1)
+        for name, applied in self.stats.applications.iteritems():
+            self.assert_(applied <= self.stats.attempts[name])
+        self.assert_(sum(self.stats.applications.values()) > 0)
+        self.assert_(self.stats.phases['rewrite'] > 0)
+
+    def testPredSuccCounters(self):
+        graph = infer_automata(self.samples)
+        rewrite(graph, self.stats)
+        # The rules sweeping every node get all the sets at once
+        self.assert_(self.stats.calls['extents'] > 0)
+        self.assert_(self.stats.hitrate('extents') > 0)
+        self.assert_('pred' not in vars(graph))
+        self.assert_('extents' not in vars(graph))
+
+    def testMerge(self):
+        infer_soa(infer_automata(self.samples), self.stats)
+        total = RuleStats()
+        total.merge(self.stats)
+        total.merge(self.stats)
+        self.assertEqual(total.calls['pred'], 2 * self.stats.calls['pred'])
+
+    def testHitRate(self):
+        self.assertEqual(self.stats.hitrate('closure'), None)
+        self.stats.hit('closure')
+        self.stats.hit('closure', False)
+        self.assertEqual(self.stats.hitrate('closure'), 0.5)
+
+class MemoryStatsTests(unittest.TestCase):
+    def setUp(self):
+        self.memory = MemoryStats()
+        self.stats = RuleStats(self.memory)
+
+    def testPhases(self):
+        infer_soa(infer_automata(["bacacdacde", "cbacdbacde"]), self.stats)
+        for phase in ('rewrite', 'repair'):
+            self.assert_(self.memory.phases[phase]['calls'] >= 1)
+            self.assert_(self.memory.phases[phase]['peak'] >= 0)
+        self.assert_('memory' in self.stats.summary())
+
+    def testGrowth(self):
+        kept = []
+        allocate = lambda size: kept.append("x" * size)
+        self.memory.elementtype('a', self.stats.timed, 'big', allocate,
+                                64 << 20)
+        self.assertEqual(self.memory.types['a']['calls'], 1)
+        self.assertEqual(self.memory.phases['big']['calls'], 1)
+        if self.memory.tracing or rss() is not None:
+            self.assert_(self.memory.phases['big']['growth'] >= 32 << 20)
+            self.assert_(self.memory.types['a']['growth'] >=
+                         self.memory.phases['big']['growth'] - (1 << 20))
+
+    def testMerge(self):
+        import pickle
+        self.memory.phase('parse', len, "")
+        other = RuleStats(MemoryStats())
+        other.memory.phase('parse', len, "")
+        other.memory.elementtype('a', len, "")
+        total = RuleStats()
+        total.merge(pickle.loads(pickle.dumps(self.stats, 2)))
+        total.merge(other)
+        self.assertEqual(total.memory.phases['parse']['calls'], 2)
+        self.assertEqual(total.memory.types['a']['calls'], 1)
+        summary = total.summary()['memory']
+        self.assertEqual(sorted(summary['phases']), ['parse'])
+        self.assert_(summary['source'] in ('tracemalloc', 'rusage'))
+        self.assert_(total.memory.report().splitlines()[1]
+                     .startswith('parse'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,8 +20,14 @@ setup(name='inferdtd',
           'setuptools',
           # -*- Extra requirements: -*-
       ],
+      extras_require={
+          # Builds the automata of large samples faster
+          'numpy': ['numpy'],
+      },
       entry_points="""
       # -*- Entry points: -*-
-      # idtd=inferdtd.idtd:main
+      [console_scripts]
+      idtd=inferdtd.idtd:main
+      idtd-daemon=inferdtd.Daemon:main
       """,
       )